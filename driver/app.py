@@ -56,35 +56,196 @@
 # 03-Jan-2025   rbd 1.1 Clarify devices vs device types at import site. Comment only,
 #               no logic changes.
 #
+import io
 import sys
+import socket
+import asyncio
 import traceback
 import inspect
-from wsgiref.simple_server import WSGIRequestHandler, make_server
+import threading
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler, ServerHandler, make_server
 from enum import IntEnum
 
 # -- isort wants the above line to be blank --
 # Controller classes (for routing)
-import discovery
-import exceptions
 from falcon import Request, Response, App, HTTPInternalServerError
 import management
 import setup
 import log
 from config import Config
-from discovery import DiscoveryResponder
-from shr import set_shr_logger
+from shr import RequestTracing, TRACE_KEY
 
 ##############################
 # FOR EACH ASCOM DEVICE TYPE #
 ##############################
 import camera
+import liveview
+import metrics
 
 #--------------
 API_VERSION = 1
 #--------------
 
+# -----------------------------------
+# Thread pool WSGI server, keep-alive
+# -----------------------------------
+class ThreadingWSGIServer(WSGIServer):
+    """The wsgiref server with a thread per connection and a cap on concurrent requests
+
+    The plain wsgiref server handles one request at a time, so a client
+    pulling a large ``imagearray`` would stall every ``camerastate`` poll
+    behind it. Here the listener thread only accepts, and each connection
+    gets a thread of its own that waits for the client's next request
+    (keep-alive). An idle connection only costs that waiting thread, the
+    requests themselves run ``Config.max_workers`` at a time, see
+    ``LoggingWSGIRequestHandler.handle_one_request()``.
+    """
+    request_queue_size = 64         # Listen backlog, the socketserver default is 5
+    daemon_threads = True
+
+    def __init__(self, server_address, RequestHandlerClass, bind_and_activate=True):
+        self.workers = threading.BoundedSemaphore(Config.max_workers)
+        WSGIServer.__init__(self, server_address, RequestHandlerClass, bind_and_activate)
+
+    def process_request(self, request, client_address):
+        t = threading.Thread(target=self._process_request_thread, args=(request, client_address),
+                             name=f'HTTP-{client_address[0]}:{client_address[1]}', daemon=True)
+        t.start()
+
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+class KeepAliveServerHandler(ServerHandler):
+    """wsgiref ServerHandler answering HTTP/1.1 so the connection can be reused
+
+    Keep-alive needs the client to find the end of the body. Falcon sets
+    a Content-Length for ``resp.text`` and ``resp.data``. A streamed
+    response without one (compressed images) goes out with chunked
+    Transfer-Encoding to an HTTP/1.1 client, otherwise the connection is
+    closed after it.
+    """
+    http_version = '1.1'
+    chunked = False
+
+    def cleanup_headers(self):
+        ServerHandler.cleanup_headers(self)         # Adds Content-Length if it can
+        if 'Content-Length' not in self.headers:
+            if self.request_handler.request_version == 'HTTP/1.1':
+                self.headers['Transfer-Encoding'] = 'chunked'
+                self.chunked = True
+            else:
+                self.request_handler.close_connection = True
+        if self.request_handler.close_connection:
+            self.headers['Connection'] = 'close'
+
+    def write(self, data):
+        """As wsgiref's but framing each write as a chunk if chunked"""
+        if type(data) is not bytes:
+            raise TypeError('write() argument must be a bytes instance')
+        if not self.status:
+            raise AssertionError('write() before start_response()')
+        if not self.headers_sent:
+            self.bytes_sent = len(data)
+            self.send_headers()                     # Decides chunked
+        else:
+            self.bytes_sent += len(data)
+        if not self.chunked:
+            self._write(data)
+        elif data:                                  # An empty chunk would end the body
+            self._write(b'%x\r\n' % len(data))
+            self._write(data)
+            self._write(b'\r\n')
+        self._flush()
+
+    def handle_error(self):
+        if self.headers_sent:                       # Body cut short, the client can't find its end
+            self.request_handler.close_connection = True
+        ServerHandler.handle_error(self)
+
+    def close(self):
+        """End the request, and the write phase of its trace if any"""
+        trace = None if self.environ is None else self.environ.get(TRACE_KEY)
+        try:
+            ServerHandler.close(self)
+        finally:
+            if not trace is None:
+                trace.finish()
+
+    def finish_content(self):
+        if self.chunked:
+            self._write(b'0\r\n\r\n')
+            self._flush()
+        else:
+            ServerHandler.finish_content(self)
+
 class LoggingWSGIRequestHandler(WSGIRequestHandler):
-    """Subclass of  WSGIRequestHandler allowing us to control WSGI server's logging"""
+    """Subclass of  WSGIRequestHandler allowing us to control WSGI server's logging
+
+    Also serves successive requests on one connection (HTTP/1.1 keep-alive)
+    until the client closes it or it sits idle for ``Config.keepalive_timeout``
+    seconds. Request bodies over ``Config.max_request_body`` bytes are refused
+    with 413 before they are read.
+    """
+    protocol_version = 'HTTP/1.1'
+    timeout = Config.keepalive_timeout
+    disable_nagle_algorithm = True      # Headers and body go out in separate writes
+
+    def handle(self):
+        """Handle requests on this connection until it is to be closed"""
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection:
+            self.handle_one_request()
+
+    def handle_one_request(self):
+        """Handle a single HTTP request, as wsgiref does but on a kept-alive socket
+
+        The request body is read up front (Alpaca bodies are small forms) so
+        that a responder which does not read it cannot leave stray bytes in
+        front of the next request on this connection.
+        """
+        try:
+            self.raw_requestline = self.rfile.readline(65537)
+        except (socket.timeout, ConnectionError):
+            self.close_connection = True
+            return
+        if not self.raw_requestline:
+            self.close_connection = True
+            return
+        if len(self.raw_requestline) > 65536:
+            self.requestline = ''
+            self.request_version = ''
+            self.command = ''
+            self.send_error(414)
+            self.close_connection = True
+            return
+        if not self.parse_request():                # An error code has been sent, just exit
+            self.close_connection = True
+            return
+        if self.headers.get('Transfer-Encoding'):   # Chunked request bodies are not supported
+            self.close_connection = True
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            self.send_error(400, 'Bad Content-Length')
+            self.close_connection = True
+            return
+        if length > Config.max_request_body:        # Refused unread, so the connection can't be reused
+            self.send_error(413, f'Request body over {Config.max_request_body} bytes')
+            self.close_connection = True
+            return
+        body = io.BytesIO(self.rfile.read(length) if length > 0 else b'')
+        handler = KeepAliveServerHandler(body, self.wfile, self.get_stderr(), self.get_environ(),
+                                         multithread=True)
+        handler.request_handler = self              # backpointer for logging and keep-alive
+        with self.server.workers:                   # Only the request itself counts against max_workers
+            handler.run(self.server.get_app())
+        self.wfile.flush()
 
     def log_message(self, format: str, *args):
         """Log a message from within the Python **wsgiref** simple server
@@ -213,70 +374,50 @@ def falcon_uncaught_exception_handler(req: Request, resp: Response, ex: BaseExce
     custom_excepthook(exc[0], exc[1], exc[2])
     raise HTTPInternalServerError('Internal Server Error', 'Alpaca endpoint responder failed. See logfile.')
 
-# ===========
-# APP STARTUP
-# ===========
-def main():
-    """ Application startup"""
+# ======================
+# ALPACA HTTP/REST SERVER
+# ======================
+async def alpaca_httpd(logger, on_listening = None):
+    """Build the Falcon app and serve it from the thread pool server
 
-    logger = log.init_logging()
-    # Share this logger throughout
-    log.logger = logger
-    exceptions.logger = logger
-    rotator.start_rot_device(logger)
-    discovery.logger = logger
-    set_shr_logger(logger)
-
-    #########################
-    # FOR EACH ASCOM DEVICE #
-    #########################
-    rotator.logger = logger
-
-    # -----------------------------
-    # Last-Chance Exception Handler
-    # -----------------------------
-    sys.excepthook = custom_excepthook
-
-    # ---------
-    # DISCOVERY
-    # ---------
-    _DSC = DiscoveryResponder(Config.ip_address, Config.port)
-
-    # ----------------------------------
-    # MAIN HTTP/REST API ENGINE (FALCON)
-    # ----------------------------------
+    The blocking ``serve_forever()`` loop runs in the event loop's default
+    executor so that it can sit in ``main.py``'s ``asyncio.gather()``
+    alongside the device engine. ``on_listening()``, if given, is called
+    once the server socket is accepting connections.
+    """
     # falcon.App instances are callable WSGI apps
-    falc_app = App()
+    falc_app = App(middleware=[metrics.RequestMetrics(), RequestTracing()])
     #
     # Initialize routes for each endpoint the magic way
     #
     #########################
     # FOR EACH ASCOM DEVICE #
     #########################
-    init_routes(falc_app, 'rotator', rotator)
+    init_routes(falc_app, 'camera', camera)
+    falc_app.add_route(f'/api/v{API_VERSION}/camera/{{devnum:int(min=0)}}/liveview',
+                       liveview.mjpeg(camera.cameras))
     #
     # Initialize routes for Alpaca support endpoints
     falc_app.add_route('/management/apiversions', management.apiversions())
     falc_app.add_route(f'/management/v{API_VERSION}/description', management.description())
     falc_app.add_route(f'/management/v{API_VERSION}/configureddevices', management.configureddevices())
+    falc_app.add_route(f'/management/v{API_VERSION}/profile', management.profile())
+    falc_app.add_route('/metrics', metrics.metrics())
     falc_app.add_route('/setup', setup.svrsetup())
-    falc_app.add_route(f'/setup/v{API_VERSION}/rotator/{{devnum}}/setup', setup.devsetup())
-
+    falc_app.add_route(f'/setup/v{API_VERSION}/camera/{{devnum}}/setup', setup.devsetup())
     #
     # Install the unhandled exception processor. See above,
     #
     falc_app.add_error_handler(Exception, falcon_uncaught_exception_handler)
 
-    # ------------------
-    # SERVER APPLICATION
-    # ------------------
-    # Using the lightweight built-in Python wsgi.simple_server
-    with make_server(Config.ip_address, Config.port, falc_app, handler_class=LoggingWSGIRequestHandler) as httpd:
-        logger.info(f'==STARTUP== Serving on {Config.ip_address}:{Config.port}. Time stamps are UTC.')
-        # Serve until process is killed
-        httpd.serve_forever()
-
-# ========================
-if __name__ == '__main__':
-    main()
-# ========================
+    with make_server(Config.ip_address, Config.port, falc_app,
+                     server_class=ThreadingWSGIServer,
+                     handler_class=LoggingWSGIRequestHandler) as httpd:
+        logger.info(f'==STARTUP== Serving on {Config.ip_address}:{Config.port} with '
+                    f'up to {Config.max_workers} requests at once. Time stamps are UTC.')
+        if not on_listening is None:
+            on_listening()
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, httpd.serve_forever)
+        finally:
+            httpd.shutdown()
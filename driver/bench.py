@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# bench.py - Benchmark of the Alpaca HTTP surface on the simulated camera
+# -----------------------------------------------------------------------------
+#
+# ASCOM Camera driver for Fujifilm Mirrorless Camera
+#
+# Description:	Implements ASCOM driver for Fujifilm Mirrorless camera.
+#				Communicates using USB connection.
+#
+# Implements:	ASCOM Standard iCamera V4 interface
+# Author:		(2025) Tony Veinberg <tony.veinberg@gmail.com>
+#
+# Python Compatibility: Requires Python 3.7 or later
+# GitHub: https://github.com/tonyveinberg/alpaca-fujifilm-cameras
+#
+# ---------------------------------------------------------------------------------
+# MIT License
+#
+# Copyright (c) 2024
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# ----------------------------------------------------------------------------------
+
+#
+# Usage (from the driver folder):
+#
+#   python bench.py [--models TINY X-T4] [--concurrency 1 4 16]
+#                   [--duration 3] [--output results.json]
+#                   [--compare baseline.json] [--tolerance 0.25]
+#                   [--startup-target 1500]
+#
+# For each camera model a server is started as a subprocess, running
+# main.py (the driver as installed, discovery included) against the
+# simulated camera (no USB latency, no readout time, so the HTTP surface
+# itself is measured). It is driven by client threads, each with its own keep-alive
+# connection, for --duration seconds per test and concurrency level:
+#
+#   * Property GETs: static (cameraxsize), engine state (camerastate,
+#     devicestate) and cached camera property (gain)
+#   * Method PUTs: driver-side (binx) and a camera round trip (gain)
+#   * ImageArray as ImageBytes, once per model (frame size)
+#
+# Each server's startup is timed too, from launch of the interpreter to
+# the first answer of main.py (GET /management/apiversions), the whole
+# cold start. The exit status is 1 if that takes
+# longer than --startup-target ms.
+#
+# Results (p50/p99 latency in ms, requests/sec, MB/s) go to stdout as a
+# table and to --output as JSON. With --compare, each result is checked
+# against a previous JSON run, and the exit status is 1 if any p50 got
+# slower, any requests/sec or startup got worse by more than --tolerance.
+#
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import http.client
+
+DEVICE = '/api/v1/camera/0'
+
+PROPERTY_TESTS = [
+    ('GET cameraxsize',     'GET', 'cameraxsize', None),
+    ('GET camerastate',     'GET', 'camerastate', None),
+    ('GET devicestate',     'GET', 'devicestate', None),
+    ('GET gain',            'GET', 'gain', None),
+    ('PUT binx',            'PUT', 'binx', 'BinX=1'),
+    ('PUT gain',            'PUT', 'gain', 'Gain=0')
+]
+
+_form = {'Content-Type': 'application/x-www-form-urlencoded'}
+_imagebytes = {'Accept': 'application/imagebytes'}
+
+# ------------------------------
+# Server side (the subprocess)
+# ------------------------------
+# main.py, the driver's own entry point, on the simulated camera. Run
+# with -c, so the subprocess imports nothing main.py doesn't and the
+# startup timed is all main.py's. Arguments: driver folder, port, model.
+SERVE = '''
+import sys, runpy
+here, port, model = sys.argv[1:]
+sys.path.insert(0, here)
+from config import Config
+Config.ip_address = '127.0.0.1'
+Config.port = int(port)
+Config.transport = 'simulator'
+Config.sim_model = model
+Config.sim_readout_time = 0.0
+Config.sim_usb_mbps = 0.0
+Config.sim_fault_rate = 0.0
+Config.sim_disconnect_after = 0
+sys.argv = [here + '/main.py']
+runpy.run_path(sys.argv[0], run_name='__main__')
+'''
+
+def start_server(model: str):
+    """Start a server subprocess (logging into a scratch folder)
+
+    Returns (process, port, seconds from launch to its first answer).
+    """
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    here = os.path.dirname(os.path.abspath(__file__))
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, '-c', SERVE, here, str(port), model],
+                            cwd=tempfile.mkdtemp(prefix='alpaca-bench-'),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/management/apiversions')
+            if conn.getresponse().status == 200:
+                conn.close()
+                return proc, port, time.perf_counter() - t0
+        except (OSError, http.client.HTTPException):
+            if proc.poll() is not None:
+                break
+            time.sleep(0.005)
+    proc.kill()
+    raise RuntimeError(f'Benchmark server for {model} did not start')
+
+# ------------
+# Client side
+# ------------
+def request(conn: http.client.HTTPConnection, method: str, name: str, body: str = None, headers = {}) -> bytes:
+    conn.request(method, f'{DEVICE}/{name}', body, dict(headers, **_form) if body else headers)
+    resp = conn.getresponse()
+    data = resp.read()
+    if resp.status != 200:
+        raise RuntimeError(f'{method} {name}: HTTP {resp.status}')
+    return data
+
+def value(conn: http.client.HTTPConnection, name: str):
+    return json.loads(request(conn, 'GET', name))['Value']
+
+def prepare(port: int):
+    """Connect the camera and take one frame, so ImageArray has something to serve"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    request(conn, 'PUT', 'connect', 'ClientTransactionID=1')
+    while not value(conn, 'connected'):
+        time.sleep(0.1)
+    request(conn, 'PUT', 'startexposure', 'Duration=0&Light=true')
+    while not value(conn, 'imageready'):
+        time.sleep(0.1)
+    conn.close()
+
+def measure(port: int, method: str, name: str, body: str, headers: dict,
+            concurrency: int, duration: float) -> dict:
+    """Hammer one endpoint from concurrency threads for duration seconds"""
+    latencies = [[] for _ in range(concurrency)]
+    nbytes = [0] * concurrency
+    errors = [0] * concurrency
+    start = threading.Barrier(concurrency + 1)
+
+    def client(i: int):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        start.wait()
+        end = time.perf_counter() + duration
+        while True:
+            t0 = time.perf_counter()
+            if t0 >= end:
+                break
+            try:
+                nbytes[i] += len(request(conn, method, name, body, headers))
+                latencies[i].append(time.perf_counter() - t0)
+            except Exception:
+                errors[i] += 1
+                conn.close()
+        conn.close()
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    start.wait()
+    t0 = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    lat = sorted(x for per in latencies for x in per)
+    n = len(lat)
+    return {
+        'requests':     n,
+        'errors':       sum(errors),
+        'rps':          round(n / elapsed, 1),
+        'p50_ms':       round(lat[n // 2] * 1000, 3) if n else None,
+        'p99_ms':       round(lat[min(n - 1, int(n * 0.99))] * 1000, 3) if n else None,
+        'mb_per_sec':   round(sum(nbytes) / elapsed / 1e6, 1)
+    }
+
+def run(args) -> tuple:
+    """Return (results, startups)"""
+    results = []
+    startups = []
+    for i, model in enumerate(args.models):
+        proc, port, seconds = start_server(model)
+        startups.append({'model': model, 'first_response_ms': round(seconds * 1000, 1)})
+        print(f"{'startup':18} {model:8} first response after {seconds * 1000:.0f} ms "
+              f"(target {args.startup_target:.0f} ms)", flush=True)
+        try:
+            prepare(port)
+            tests = [('GET imagearray', 'GET', 'imagearray', None, _imagebytes)]
+            if i == 0:                          # Not frame size dependent
+                tests = [t + ({},) for t in PROPERTY_TESTS] + tests
+            for test, method, name, body, headers in tests:
+                for c in args.concurrency:
+                    r = measure(port, method, name, body, headers, c, args.duration)
+                    r = dict(test=test, model=model if name == 'imagearray' else None, concurrency=c, **r)
+                    results.append(r)
+                    print(f"{test:18} {model if r['model'] else '':8} c={c:<3} {r['rps']:>9} req/s  "
+                          f"p50 {r['p50_ms']} ms  p99 {r['p99_ms']} ms  {r['mb_per_sec']} MB/s  "
+                          f"errors {r['errors']}", flush=True)
+        finally:
+            proc.terminate()
+            proc.wait(10)
+    return results, startups
+
+def compare(results: list, startups: list, baseline_file: str, tolerance: float) -> list:
+    """Return a message for each result that regressed beyond tolerance"""
+    with open(baseline_file) as f:
+        report = json.load(f)
+    baseline = {(r['test'], r['model'], r['concurrency']): r for r in report['results']}
+    regressions = []
+    base_startups = {s['model']: s['first_response_ms'] for s in report.get('startup', [])}
+    for s in startups:
+        b = base_startups.get(s['model'])
+        if not b is None and s['first_response_ms'] > b * (1 + tolerance):
+            regressions.append(f"startup {s['model']}: first response {b} -> {s['first_response_ms']} ms")
+    for r in results:
+        b = baseline.get((r['test'], r['model'], r['concurrency']))
+        if b is None or not r['requests'] or not b['requests']:
+            continue
+        key = f"{r['test']} {r['model'] or ''} c={r['concurrency']}"
+        if r['p50_ms'] > b['p50_ms'] * (1 + tolerance):
+            regressions.append(f"{key}: p50 {b['p50_ms']} -> {r['p50_ms']} ms")
+        if r['rps'] < b['rps'] * (1 - tolerance):
+            regressions.append(f"{key}: {b['rps']} -> {r['rps']} req/s")
+    return regressions
+
+# ==================================================================
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Alpaca Fujifilm driver HTTP benchmark.')
+    parser.add_argument('--models', nargs='+', default=['TINY', 'X-T4'],
+                        help='Simulated camera models, sets the ImageArray frame size')
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 4, 16],
+                        help='Client threads (connections) per test')
+    parser.add_argument('--duration', type=float, default=3.0, help='Seconds per test and concurrency')
+    parser.add_argument('--output', type=str, help='Write the results to this JSON file')
+    parser.add_argument('--compare', type=str, help='Baseline results JSON to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed regression, 0.25 = 25%%')
+    parser.add_argument('--startup-target', type=float, default=1500.0,
+                        help='Longest acceptable ms from launch to the first response')
+    args = parser.parse_args()
+
+    from camera import CameraMetadata
+    results, startups = run(args)
+    report = {
+        'driver_version':   CameraMetadata.Version,
+        'python':           platform.python_version(),
+        'platform':         platform.platform(),
+        'cpus':             os.cpu_count(),
+        'time':             time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'duration':         args.duration,
+        'startup_target_ms': args.startup_target,
+        'startup':          startups,
+        'results':          results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    failed = False
+    for s in startups:
+        if s['first_response_ms'] > args.startup_target:
+            print(f"SLOW STARTUP {s['model']}: first response after {s['first_response_ms']} ms, "
+                  f"target {args.startup_target:.0f} ms")
+            failed = True
+    if args.compare:
+        regressions = compare(results, startups, args.compare, args.tolerance)
+        for msg in regressions:
+            print(f'REGRESSION {msg}')
+        failed = failed or bool(regressions)
+    sys.exit(1 if failed else 0)
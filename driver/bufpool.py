@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# bufpool.py - Pool of reference counted frame buffers in shared memory
+# -----------------------------------------------------------------------------
+#
+# ASCOM Camera driver for Fujifilm Mirrorless Camera
+#
+# Description:	Implements ASCOM driver for Fujifilm Mirrorless camera.
+#				Communicates using USB connection.
+#
+# Implements:	ASCOM Standard iCamera V4 interface
+# Author:		(2025) Tony Veinberg <tony.veinberg@gmail.com>
+#
+# Python Compatibility: Requires Python 3.7 or later
+# GitHub: https://github.com/tonyveinberg/alpaca-fujifilm-cameras
+#
+# ---------------------------------------------------------------------------------
+# MIT License
+#
+# Copyright (c) 2024
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# ----------------------------------------------------------------------------------
+
+from threading import Lock
+from multiprocessing import shared_memory
+from logging import Logger
+
+MiB = 1 << 20
+
+class FrameBuffer:
+    """One pooled buffer, a shared memory block the decode workers can attach to
+
+    Holders take a reference with :py:meth:`acquire` and give it back with
+    :py:meth:`release`. When the last reference goes, the buffer returns to
+    its pool. Anything viewing the memory (memoryviews, numpy arrays) must
+    be done with it by then.
+    """
+    __slots__ = ('pool', 'shm', 'capacity', 'refs')
+
+    def __init__(self, pool: 'BufferPool', capacity: int):
+        self.pool = pool
+        self.shm = shared_memory.SharedMemory(create=True, size=capacity)
+        self.capacity = capacity
+        self.refs = 0
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def buf(self) -> memoryview:
+        return self.shm.buf
+
+    def array(self, shape: tuple, dtype) -> 'np.ndarray':
+        """A numpy array (C order) on the start of the buffer"""
+        import numpy as np
+        return np.ndarray(shape, dtype=dtype, buffer=self.shm.buf)
+
+    def acquire(self) -> 'FrameBuffer':
+        with self.pool._lock:
+            self.refs += 1
+        return self
+
+    def release(self):
+        self.pool._release(self)
+
+class BufferPool:
+    """Preallocated frame buffers, keyed by size, reused frame after frame
+
+    Each exposure needs a buffer for the RAF as downloaded, one for the
+    decoded frame and maybe one for a subframe or binned copy. Rather
+    than allocating (and fragmenting) hundreds of MB per frame, buffers
+    come from here. :py:meth:`reserve` preallocates them from the sensor
+    geometry at connect. :py:meth:`get` hands out the smallest free
+    buffer that is big enough, and only allocates (rounded up to a MiB)
+    when none is free.
+    """
+    def __init__(self, logger: Logger):
+        self.logger = logger
+        self._lock = Lock()
+        self._free = {}                 # capacity -> [FrameBuffer]
+        self._all = []
+
+    def reserve(self, sizes: dict):
+        """Make sure {size: count} buffers exist, free idle ones of other sizes"""
+        with self._lock:
+            for capacity in [c for c in self._free if c not in sizes]:
+                for fb in self._free.pop(capacity):
+                    self._destroy(fb)
+            for size, count in sizes.items():
+                have = sum(1 for fb in self._all if fb.capacity == size)
+                for _ in range(count - have):
+                    fb = FrameBuffer(self, size)
+                    self._all.append(fb)
+                    self._free.setdefault(size, []).append(fb)
+        self.logger.info(f'Frame buffer pool: {len(self._all)} buffers, '
+                         f'{sum(fb.capacity for fb in self._all) / MiB:.0f} MiB')
+
+    def get(self, size: int) -> FrameBuffer:
+        """A buffer of at least size bytes, holding one reference"""
+        with self._lock:
+            fits = [c for c, free in self._free.items() if c >= size and free]
+            if fits:
+                fb = self._free[min(fits)].pop()
+            else:
+                fb = FrameBuffer(self, -(-size // MiB) * MiB)
+                self._all.append(fb)
+                self.logger.info(f'Frame buffer pool grew to {len(self._all)} buffers ({fb.capacity / MiB:.0f} MiB more)')
+            fb.refs = 1
+            return fb
+
+    def usage(self) -> dict:
+        """{'busy'|'idle': (buffers, bytes)}"""
+        with self._lock:
+            busy = [fb.capacity for fb in self._all if fb.refs > 0]
+            idle = [fb.capacity for fb in self._all if fb.refs <= 0]
+        return {'busy': (len(busy), sum(busy)), 'idle': (len(idle), sum(idle))}
+
+    def _release(self, fb: FrameBuffer):
+        with self._lock:
+            fb.refs -= 1
+            if fb.refs == 0:
+                self._free.setdefault(fb.capacity, []).append(fb)
+
+    def _destroy(self, fb: FrameBuffer):
+        self._all.remove(fb)
+        fb.shm.unlink()
+        try:
+            fb.shm.close()
+        except BufferError:
+            pass                        # A stale view is still around, unmapped when it goes
+
+    def close(self):
+        """Free all idle buffers (those in use are left alone)"""
+        with self._lock:
+            for free in self._free.values():
+                for fb in free:
+                    self._destroy(fb)
+            self._free.clear()
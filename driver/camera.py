@@ -47,13 +47,23 @@
 #
 # ----------------------------------------------------------------------------------
 
-from falcon import Request, Response, HTTPBadRequest, before
+from falcon import Request, Response, before
 from logging import Logger
 from shr import PropertyResponse, MethodResponse, PreProcessRequest, \
-                StateValue, get_request_field, to_bool
+                StaticPropertyResponse, StateValue, get_request_field, to_bool, \
+                ImageArrayResponse, accepts_imagebytes, IMAGEBYTES_MIME
 from exceptions import *        # Nothing but exception classes
-from fujifilm import Fujifilm
-import asyncio
+from fujifilm import Fujifilm, CAMERA_IDLE
+from decoder import RAFDecoder
+from log import DeviceLogger
+from config import Config
+import compression
+import metrics
+from sensors import iso_values
+import datetime
+import json
+import time
+import uuid
 
 logger: Logger = None
 
@@ -65,7 +75,7 @@ logger: Logger = None
 # which instance of the device (0-based) is being called by the client. Leave this
 # set to 0 for the simple case of controlling only one instance of this device type.
 #
-maxdev = 0                      # Single instance
+maxdev = len(Config.cameras) - 1    # One device per [device] cameras entry
 
 # -----------
 # DEVICE INFO
@@ -116,23 +126,129 @@ class ImageArrayElementTypes(IntEnum):
     Int64           = 7,
     UInt16          = 8
 
-# --------------------------------------------------------------------
-# Create an instance of the Fujifilm Class to simulate an ASCOM camera
-# --------------------------------------------------------------------
-fujifilm = None
+# ------------------------------------------------------------------
+# One Fujifilm engine per configured camera, indexed by device number.
+# Each has its own USB handle, command queue and I/O thread, so one
+# camera's download never waits on another's. They share the decoder.
+# ------------------------------------------------------------------
+cameras: list = []
 def start_fujifilm(logger: Logger):
-    global fujifilm
-    fujifilm = Fujifilm(logger)
+    decoder = RAFDecoder(logger)
+    cameras[:] = [Fujifilm(logger if maxdev == 0 else DeviceLogger(logger, f'camera {devnum}'),
+                           serial=serial, devnum=devnum, decoder=decoder)
+                  for devnum, serial in enumerate(Config.cameras)]
+
+# Engine state for /metrics, read only when scraped
+metrics.Sampled('alpaca_frame_memory_buffers', 'Frame buffers (shared memory) and spooled frames',
+                ('camera', 'state'), lambda: [((cam.devnum, state), n)
+                                               for cam in cameras
+                                               for state, (n, _) in cam.memory_usage().items()])
+metrics.Sampled('alpaca_frame_memory_bytes', 'Bytes in frame buffers (shared memory) and the spool',
+                ('camera', 'state'), lambda: [((cam.devnum, state), nbytes)
+                                               for cam in cameras
+                                               for state, (_, nbytes) in cam.memory_usage().items()])
+metrics.Sampled('alpaca_queue_depth', 'Device engine queue lengths', ('camera', 'queue'),
+                lambda: [((cam.devnum, queue), n) for cam in cameras for queue, n in cam.queue_depths().items()])
+metrics.Sampled('alpaca_usb_bytes_per_second', 'Transfer rate of the last download', ('camera',),
+                lambda: [((cam.devnum,), cam.download_mbps * 1e6) for cam in cameras])
+metrics.Sampled('alpaca_compression_bytes_total', 'ImageArray bytes into and out of the compressor',
+                ('encoding', 'direction'), lambda: [((t['encoding'], direction), t[key])
+                                                     for t in compression.stats.snapshot()['totals']
+                                                     for direction, key in (('in', 'bytes_in'), ('out', 'bytes_out'))],
+                kind='counter')
+
+def unique_id(devnum: int) -> str:
+    """UniqueID of a device, device 0 keeps the original DeviceID"""
+    if devnum == 0:
+        return CameraMetadata.DeviceID
+    return str(uuid.uuid5(uuid.UUID(CameraMetadata.DeviceID), str(devnum)))
+
+def device_name(devnum: int) -> str:
+    return CameraMetadata.Name if maxdev == 0 else f'{CameraMetadata.Name} {devnum}'
+
+# ------------------------------------------------------------------
+# Properties fixed for the session, serialized once per connection
+# (fujifilm.session), then answered with only the transaction IDs
+# spliced in. Conform and NINA poll these constantly.
+# ------------------------------------------------------------------
+_static = {}                        # devnum: (session, {name: StaticPropertyResponse})
+
+def static_property(name: str, req: Request, devnum: int) -> str:
+    fujifilm = cameras[devnum]
+    session, table = _static.get(devnum, (-1, None))
+    if session != fujifilm.session:
+        session = fujifilm.session
+        sensor = fujifilm.sensor
+        table = {name: StaticPropertyResponse(value) for name, value in {
+                    'bayeroffsetx':     0,
+                    'bayeroffsety':     0,
+                    'canabortexposure': True,
+                    'canasymmetricbin': True,
+                    'canstopexposure':  True,
+                    'cameraxsize':      sensor.width,
+                    'cameraysize':      sensor.height,
+                    'gains':            [f'ISO {iso}' for iso in iso_values(sensor)],
+                    'maxbinx':          fujifilm.max_bin,
+                    'maxbiny':          fujifilm.max_bin,
+                    'pixelsizex':       sensor.pixel_size,
+                    'pixelsizey':       sensor.pixel_size,
+                    'readoutmodes':     ['RAW'],
+                    'sensorname':       fujifilm.model,
+                    # X-Trans has no ASCOM SensorType, its raw mosaic is served as mono
+                    'sensortype':       SensorType.RGGB if sensor.bayer else SensorType.Monochrome
+                }.items()}
+        _static[devnum] = (session, table)
+    return table[name].text(req)
+
+# -------
+# Actions
+# -------
+def _compression_stats(devnum: int, parameters: str) -> str:
+    """Compression ratio and time of the last image sent and totals per encoding"""
+    return json.dumps(compression.stats.snapshot())
+
+def _save_frames(devnum: int, parameters: str) -> str:
+    """Parameters true/false switches saving every frame to disk, empty
+    just reports. Returns the frame writer status."""
+    writer = cameras[devnum].writer
+    switch = parameters.strip().lower()
+    if switch in ('true', 'on', '1'):
+        writer.enable(True)
+    elif switch in ('false', 'off', '0'):
+        writer.enable(False)
+    elif switch:
+        raise ValueError(f'SaveFrames Parameters must be true, false or empty, not "{parameters}"')
+    return json.dumps(writer.status())
+
+# Action name -> function(device number, Parameters string) -> result string
+ACTIONS = {
+    'CompressionStats': _compression_stats,
+    'SaveFrames': _save_frames,
+}
 
 # --------------------
 # RESOURCE CONTROLLERS
 # --------------------
 
-#@before(PreProcessRequest(maxdev))
-#class action:
-#    def on_put(self, req: Request, resp: Response, devnum: int):
-#        resp.text = MethodResponse(req, NotImplementedException()).json
-#
+@before(PreProcessRequest(maxdev))
+class action:
+
+    def on_put(self, req: Request, resp: Response, devnum: int):
+        actionname = get_request_field('Action', req)      # Raises 400 bad request if missing
+        parameters = get_request_field('Parameters', req, default='')
+        for name, func in ACTIONS.items():
+            if name.lower() == actionname.lower():          # Action names are caseless
+                break
+        else:
+            resp.text = MethodResponse(req, ActionNotImplementedException(
+                            f'Action {actionname} is not implemented by this driver.')).json
+            return
+        try:
+            resp.text = MethodResponse(req, value=func(devnum, parameters)).json
+        except Exception as ex:
+            resp.text = MethodResponse(req,
+                            DriverException(0x500, f'Camera.Action {actionname} failed', ex)).json
+
 #@before(PreProcessRequest(maxdev))
 #class commandblind:
 #    def on_put(self, req: Request, resp: Response, devnum: int):
@@ -148,90 +264,91 @@ def start_fujifilm(logger: Logger):
 #    def on_put(self, req: Request, resp: Response, devnum: int):
 #        resp.text = MethodResponse(req, NotImplementedException()).json
 #
-#@before(PreProcessRequest(maxdev))
-#class connect:
-#    def on_put(self, req: Request, resp: Response, devnum: int):
-#        try:
-#            # ------------------------
-#            ### CONNECT THE DEVICE ###
-#            # ------------------------
-#            resp.text = MethodResponse(req).json
-#        except Exception as ex:
-#            resp.text = MethodResponse(req,
-#                            DriverException(0x500, 'Camera.Connect failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class connected:
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        try:
-#            # -------------------------------------
-#            is_conn = ### READ CONN STATE ###
-#            # -------------------------------------
-#            resp.text = PropertyResponse(is_conn, req).json
-#        except Exception as ex:
-#            resp.text = MethodResponse(req, DriverException(0x500, 'Camera.Connected failed', ex)).json
-#
-#    def on_put(self, req: Request, resp: Response, devnum: int):
-#        conn_str = get_request_field('Connected', req)
-#        conn = to_bool(conn_str)              # Raises 400 Bad Request if str to bool fails
-#
-#        try:
-#            # --------------------------------------
-#            ### CONNECT OR DISCONNECT THE DEVICE ###
-#            # --------------------------------------
-#            resp.text = MethodResponse(req).json
-#        except Exception as ex:
-#            resp.text = MethodResponse(req, # Put is actually like a method :-(
-#                            DriverException(0x500, 'Camera.Connected failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class connecting:
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        try:
-#            # ------------------------------
-#            val = ## GET CONNECTING STATE ##
-#            # ------------------------------
-#            resp.text = PropertyResponse(val, req).json
-#        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Connecting failed', ex)).json
-#
+@before(PreProcessRequest(maxdev))
+class connect:
+    def on_put(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        try:
+            # Asynchronous, Connecting is true until the engine is done
+            fujifilm.connecting = True
+            fujifilm.command_nowait('connect')
+            resp.text = MethodResponse(req).json
+        except Exception as ex:
+            fujifilm.connecting = False
+            resp.text = MethodResponse(req,
+                            DriverException(0x500, 'Camera.Connect failed', ex)).json
+
+@before(PreProcessRequest(maxdev))
+class connected:
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        try:
+            resp.text = PropertyResponse(fujifilm.connected, req).json
+        except Exception as ex:
+            resp.text = MethodResponse(req, DriverException(0x500, 'Camera.Connected failed', ex)).json
+
+    def on_put(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        conn_str = get_request_field('Connected', req)
+        conn = to_bool(conn_str)              # Raises 400 Bad Request if str to bool fails
+
+        try:
+            if Config.sync_write_connected:
+                fujifilm.command('connect' if conn else 'disconnect')
+            else:
+                fujifilm.command_nowait('connect' if conn else 'disconnect')
+            resp.text = MethodResponse(req).json
+        except Exception as ex:
+            resp.text = MethodResponse(req, # Put is actually like a method :-(
+                            DriverException(0x500, 'Camera.Connected failed', ex)).json
+
+@before(PreProcessRequest(maxdev))
+class connecting:
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        try:
+            resp.text = PropertyResponse(fujifilm.connecting, req).json
+        except Exception as ex:
+            resp.text = PropertyResponse(None, req,
+                            DriverException(0x500, 'Camera.Connecting failed', ex)).json
+
 #@before(PreProcessRequest(maxdev))
 #class description:
 #    def on_get(self, req: Request, resp: Response, devnum: int):
 #        resp.text = PropertyResponse(CameraMetadata.Description, req).json
 #
-#@before(PreProcessRequest(maxdev))
-#class devicestate:
-#
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        if not ##IS DEV CONNECTED##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        try:
-#            # ----------------------
-#            val = []
-#            # val.append(StateValue('## NAME ##', ## GET VAL ##))
-#            # Repeat for each of the operational states per the device spec
-#            # ----------------------
-#            resp.text = PropertyResponse(val, req).json
-#        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'camera.Devicestate failed', ex)).json
-#
-#
-#class disconnect:
-#    def on_put(self, req: Request, resp: Response, devnum: int):
-#        try:
-#            # ---------------------------
-#            ### DISCONNECT THE DEVICE ###
-#            # ---------------------------
-#            resp.text = MethodResponse(req).json
-#        except Exception as ex:
-#            resp.text = MethodResponse(req,
-#                            DriverException(0x500, 'Camera.Disconnect failed', ex)).json
-#
+@before(PreProcessRequest(maxdev))
+class devicestate:
+
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        try:
+            # All from memory, nothing goes to the camera
+            val = []
+            val.append(StateValue('CameraState', fujifilm.camera_state))
+            val.append(StateValue('ImageReady', fujifilm.image_ready))
+            val.append(StateValue('PercentCompleted', fujifilm.percent_completed))
+            val.append(StateValue('TimeStamp', datetime.datetime.utcnow().isoformat()))
+            resp.text = PropertyResponse(val, req).json
+        except Exception as ex:
+            resp.text = PropertyResponse(None, req,
+                            DriverException(0x500, 'camera.Devicestate failed', ex)).json
+
+@before(PreProcessRequest(maxdev))
+class disconnect:
+    def on_put(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        try:
+            fujifilm.command_nowait('disconnect')
+            resp.text = MethodResponse(req).json
+        except Exception as ex:
+            resp.text = MethodResponse(req,
+                            DriverException(0x500, 'Camera.Disconnect failed', ex)).json
+
 #@before(PreProcessRequest(maxdev))
 #class driverinfo:
 #    def on_get(self, req: Request, resp: Response, devnum: int):
@@ -252,13 +369,176 @@ def start_fujifilm(logger: Logger):
 #    def on_get(self, req: Request, resp: Response, devnum: int):
 #        resp.text = PropertyResponse(CameraMetadata.Name, req).json
 #
+@before(PreProcessRequest(maxdev))
+class supportedactions:
+
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        resp.text = PropertyResponse(list(ACTIONS), req).json
+
+@before(PreProcessRequest(maxdev))
+class bayeroffsetx:
+
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        if not fujifilm.sensor.bayer:
+            resp.text = PropertyResponse(None, req,
+                            NotImplementedException('Bayeroffsetx is only for Bayer sensors (SensorType RGGB).')).json
+            return
+        
+        resp.text = static_property('bayeroffsetx', req, devnum)
+
+@before(PreProcessRequest(maxdev))
+class bayeroffsety:
+
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        if not fujifilm.sensor.bayer:
+            resp.text = PropertyResponse(None, req,
+                            NotImplementedException('Bayeroffsety is only for Bayer sensors (SensorType RGGB).')).json
+            return
+        
+        resp.text = static_property('bayeroffsety', req, devnum)
+
+@before(PreProcessRequest(maxdev))
+class binx:
+
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        resp.text = PropertyResponse(fujifilm.bin_x, req).json
+
+    def on_put(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        binxstr = get_request_field('BinX', req)      # Raises 400 bad request if missing
+        try:
+            binx = int(binxstr)
+        except:
+            resp.text = MethodResponse(req,
+                            InvalidValueException(f'BinX {binxstr} not a valid integer.')).json
+            return
+        if not 1 <= binx <= fujifilm.max_bin:
+            resp.text = MethodResponse(req,
+                            InvalidValueException(f'BinX {binx} must be 1 to {fujifilm.max_bin}.')).json
+            return
+        fujifilm.bin_x = binx
+        resp.text = MethodResponse(req).json
+
+@before(PreProcessRequest(maxdev))
+class biny:
+
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        resp.text = PropertyResponse(fujifilm.bin_y, req).json
+
+    def on_put(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        binystr = get_request_field('BinY', req)      # Raises 400 bad request if missing
+        try:
+            biny = int(binystr)
+        except:
+            resp.text = MethodResponse(req,
+                            InvalidValueException(f'BinY {binystr} not a valid integer.')).json
+            return
+        if not 1 <= biny <= fujifilm.max_bin:
+            resp.text = MethodResponse(req,
+                            InvalidValueException(f'BinY {biny} must be 1 to {fujifilm.max_bin}.')).json
+            return
+        fujifilm.bin_y = biny
+        resp.text = MethodResponse(req).json
+
+@before(PreProcessRequest(maxdev))
+class camerastate:
+
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        try:
+            resp.text = PropertyResponse(fujifilm.camera_state, req).json
+        except Exception as ex:
+            resp.text = PropertyResponse(None, req,
+                            DriverException(0x500, 'Camera.Camerastate failed', ex)).json
+
+@before(PreProcessRequest(maxdev))
+class cameraxsize:
+
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        resp.text = static_property('cameraxsize', req, devnum)
+
+@before(PreProcessRequest(maxdev))
+class cameraysize:
+
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        resp.text = static_property('cameraysize', req, devnum)
+
+@before(PreProcessRequest(maxdev))
+class canabortexposure:
+
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        resp.text = static_property('canabortexposure', req, devnum)
+
+@before(PreProcessRequest(maxdev))
+class canasymmetricbin:
+
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        resp.text = static_property('canasymmetricbin', req, devnum)
+
 #@before(PreProcessRequest(maxdev))
-#class supportedactions:
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        resp.text = PropertyResponse([], req).json  # Not PropertyNotImplemented
-#
-#@before(PreProcessRequest(maxdev))
-#class bayeroffsetx:
+#class canfastreadout:
 #
 #    def on_get(self, req: Request, resp: Response, devnum: int):
 #        if not ##IS DEV CONNECTED##:
@@ -273,10 +553,10 @@ def start_fujifilm(logger: Logger):
 #            resp.text = PropertyResponse(val, req).json
 #        except Exception as ex:
 #            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Bayeroffsetx failed', ex)).json
+#                            DriverException(0x500, 'Camera.Canfastreadout failed', ex)).json
 #
 #@before(PreProcessRequest(maxdev))
-#class bayeroffsety:
+#class cangetcoolerpower:
 #
 #    def on_get(self, req: Request, resp: Response, devnum: int):
 #        if not ##IS DEV CONNECTED##:
@@ -291,10 +571,10 @@ def start_fujifilm(logger: Logger):
 #            resp.text = PropertyResponse(val, req).json
 #        except Exception as ex:
 #            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Bayeroffsety failed', ex)).json
+#                            DriverException(0x500, 'Camera.Cangetcoolerpower failed', ex)).json
 #
 #@before(PreProcessRequest(maxdev))
-#class binx:
+#class canpulseguide:
 #
 #    def on_get(self, req: Request, resp: Response, devnum: int):
 #        if not ##IS DEV CONNECTED##:
@@ -309,33 +589,48 @@ def start_fujifilm(logger: Logger):
 #            resp.text = PropertyResponse(val, req).json
 #        except Exception as ex:
 #            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Binx failed', ex)).json
+#                            DriverException(0x500, 'Camera.Canpulseguide failed', ex)).json
 #
-#    def on_put(self, req: Request, resp: Response, devnum: int):
-#        if not ## IS DEV CONNECTED ##:
+#@before(PreProcessRequest(maxdev))
+#class cansetccdtemperature:
+#
+#    def on_get(self, req: Request, resp: Response, devnum: int):
+#        if not ##IS DEV CONNECTED##:
 #            resp.text = PropertyResponse(None, req,
 #                            NotConnectedException()).json
 #            return
 #        
-#        binxstr = get_request_field('BinX', req)      # Raises 400 bad request if missing
-#        try:
-#            binx = int(binxstr)
-#        except:
-#            resp.text = MethodResponse(req,
-#                            InvalidValueException(f'BinX {binxstr} not a valid integer.')).json
-#            return
-#        ### RANGE CHECK AS NEEDED ###  # Raise Alpaca InvalidValueException with details!
 #        try:
-#            # -----------------------------
-#            ### DEVICE OPERATION(PARAM) ###
-#            # -----------------------------
-#            resp.text = MethodResponse(req).json
+#            # ----------------------
+#            val = ## GET PROPERTY ##
+#            # ----------------------
+#            resp.text = PropertyResponse(val, req).json
 #        except Exception as ex:
-#            resp.text = MethodResponse(req,
-#                            DriverException(0x500, 'Camera.Binx failed', ex)).json
+#            resp.text = PropertyResponse(None, req,
+#                            DriverException(0x500, 'Camera.Cansetccdtemperature failed', ex)).json
 #
+@before(PreProcessRequest(maxdev))
+class canstopexposure:
+
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        resp.text = static_property('canstopexposure', req, devnum)
+
+@before(PreProcessRequest(maxdev))
+class ccdtemperature:
+
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        # Fujifilm bodies do not report the sensor temperature over PTP
+        resp.text = PropertyResponse(None, req,
+                        NotImplementedException('Camera.CCDTemperature is not available from Fujifilm cameras.')).json
+
 #@before(PreProcessRequest(maxdev))
-#class biny:
+#class cooleron:
 #
 #    def on_get(self, req: Request, resp: Response, devnum: int):
 #        if not ##IS DEV CONNECTED##:
@@ -350,7 +645,7 @@ def start_fujifilm(logger: Logger):
 #            resp.text = PropertyResponse(val, req).json
 #        except Exception as ex:
 #            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Biny failed', ex)).json
+#                            DriverException(0x500, 'Camera.Cooleron failed', ex)).json
 #
 #    def on_put(self, req: Request, resp: Response, devnum: int):
 #        if not ## IS DEV CONNECTED ##:
@@ -358,14 +653,14 @@ def start_fujifilm(logger: Logger):
 #                            NotConnectedException()).json
 #            return
 #        
-#        binystr = get_request_field('BinY', req)      # Raises 400 bad request if missing
+#        cooleronstr = get_request_field('CoolerOn', req)      # Raises 400 bad request if missing
 #        try:
-#            biny = int(binystr)
+#            cooleron = to_bool(cooleronstr)
 #        except:
 #            resp.text = MethodResponse(req,
-#                            InvalidValueException(f'BinY {binystr} not a valid integer.')).json
+#                            InvalidValueException(f'CoolerOn {cooleronstr} not a valid boolean.')).json
 #            return
-#        ### RANGE CHECK AS NEEDED ###  # Raise Alpaca InvalidValueException with details!
+#
 #        try:
 #            # -----------------------------
 #            ### DEVICE OPERATION(PARAM) ###
@@ -373,10 +668,10 @@ def start_fujifilm(logger: Logger):
 #            resp.text = MethodResponse(req).json
 #        except Exception as ex:
 #            resp.text = MethodResponse(req,
-#                            DriverException(0x500, 'Camera.Biny failed', ex)).json
+#                            DriverException(0x500, 'Camera.Cooleron failed', ex)).json
 #
 #@before(PreProcessRequest(maxdev))
-#class camerastate:
+#class coolerpower:
 #
 #    def on_get(self, req: Request, resp: Response, devnum: int):
 #        if not ##IS DEV CONNECTED##:
@@ -391,10 +686,10 @@ def start_fujifilm(logger: Logger):
 #            resp.text = PropertyResponse(val, req).json
 #        except Exception as ex:
 #            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Camerastate failed', ex)).json
+#                            DriverException(0x500, 'Camera.Coolerpower failed', ex)).json
 #
 #@before(PreProcessRequest(maxdev))
-#class cameraxsize:
+#class electronsperadu:
 #
 #    def on_get(self, req: Request, resp: Response, devnum: int):
 #        if not ##IS DEV CONNECTED##:
@@ -409,10 +704,10 @@ def start_fujifilm(logger: Logger):
 #            resp.text = PropertyResponse(val, req).json
 #        except Exception as ex:
 #            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Cameraxsize failed', ex)).json
+#                            DriverException(0x500, 'Camera.Electronsperadu failed', ex)).json
 #
 #@before(PreProcessRequest(maxdev))
-#class cameraysize:
+#class exposuremax:
 #
 #    def on_get(self, req: Request, resp: Response, devnum: int):
 #        if not ##IS DEV CONNECTED##:
@@ -427,10 +722,10 @@ def start_fujifilm(logger: Logger):
 #            resp.text = PropertyResponse(val, req).json
 #        except Exception as ex:
 #            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Cameraysize failed', ex)).json
+#                            DriverException(0x500, 'Camera.Exposuremax failed', ex)).json
 #
 #@before(PreProcessRequest(maxdev))
-#class canabortexposure:
+#class exposuremin:
 #
 #    def on_get(self, req: Request, resp: Response, devnum: int):
 #        if not ##IS DEV CONNECTED##:
@@ -445,10 +740,10 @@ def start_fujifilm(logger: Logger):
 #            resp.text = PropertyResponse(val, req).json
 #        except Exception as ex:
 #            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Canabortexposure failed', ex)).json
+#                            DriverException(0x500, 'Camera.Exposuremin failed', ex)).json
 #
 #@before(PreProcessRequest(maxdev))
-#class canasymmetricbin:
+#class exposureresolution:
 #
 #    def on_get(self, req: Request, resp: Response, devnum: int):
 #        if not ##IS DEV CONNECTED##:
@@ -463,10 +758,10 @@ def start_fujifilm(logger: Logger):
 #            resp.text = PropertyResponse(val, req).json
 #        except Exception as ex:
 #            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Canasymmetricbin failed', ex)).json
+#                            DriverException(0x500, 'Camera.Exposureresolution failed', ex)).json
 #
 #@before(PreProcessRequest(maxdev))
-#class canfastreadout:
+#class fastreadout:
 #
 #    def on_get(self, req: Request, resp: Response, devnum: int):
 #        if not ##IS DEV CONNECTED##:
@@ -481,28 +776,33 @@ def start_fujifilm(logger: Logger):
 #            resp.text = PropertyResponse(val, req).json
 #        except Exception as ex:
 #            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Canfastreadout failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class cangetcoolerpower:
+#                            DriverException(0x500, 'Camera.Fastreadout failed', ex)).json
 #
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        if not ##IS DEV CONNECTED##:
+#    def on_put(self, req: Request, resp: Response, devnum: int):
+#        if not ## IS DEV CONNECTED ##:
 #            resp.text = PropertyResponse(None, req,
 #                            NotConnectedException()).json
 #            return
 #        
+#        fastreadoutstr = get_request_field('FastReadout', req)      # Raises 400 bad request if missing
 #        try:
-#            # ----------------------
-#            val = ## GET PROPERTY ##
-#            # ----------------------
-#            resp.text = PropertyResponse(val, req).json
+#            fastreadout = to_bool(fastreadoutstr)
+#        except:
+#            resp.text = MethodResponse(req,
+#                            InvalidValueException(f'FastReadout {fastreadoutstr} not a valid boolean.')).json
+#            return
+#
+#        try:
+#            # -----------------------------
+#            ### DEVICE OPERATION(PARAM) ###
+#            # -----------------------------
+#            resp.text = MethodResponse(req).json
 #        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Cangetcoolerpower failed', ex)).json
+#            resp.text = MethodResponse(req,
+#                            DriverException(0x500, 'Camera.Fastreadout failed', ex)).json
 #
 #@before(PreProcessRequest(maxdev))
-#class canpulseguide:
+#class fullwellcapacity:
 #
 #    def on_get(self, req: Request, resp: Response, devnum: int):
 #        if not ##IS DEV CONNECTED##:
@@ -517,10 +817,54 @@ def start_fujifilm(logger: Logger):
 #            resp.text = PropertyResponse(val, req).json
 #        except Exception as ex:
 #            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Canpulseguide failed', ex)).json
+#                            DriverException(0x500, 'Camera.Fullwellcapacity failed', ex)).json
 #
+@before(PreProcessRequest(maxdev))
+class gain:
+
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        try:
+            isos = iso_values(fujifilm.sensor)      # Index into Gains, nearest setting
+            val = min(range(len(isos)), key=lambda i: abs(isos[i] - fujifilm.iso))
+            resp.text = PropertyResponse(val, req).json
+        except Exception as ex:
+            resp.text = PropertyResponse(None, req,
+                            DriverException(0x500, 'Camera.Gain failed', ex)).json
+
+    def on_put(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        gainstr = get_request_field('Gain', req)      # Raises 400 bad request if missing
+        try:
+            gain = int(gainstr)
+        except:
+            resp.text = MethodResponse(req,
+                            InvalidValueException(f'Gain {gainstr} not a valid integer.')).json
+            return
+        isos = iso_values(fujifilm.sensor)
+        if not 0 <= gain < len(isos):
+            resp.text = MethodResponse(req,
+                            InvalidValueException(f'Gain {gain} must be 0 to {len(isos) - 1}.')).json
+            return
+        try:
+            fujifilm.command('set_iso', isos[gain])
+            resp.text = MethodResponse(req).json
+        except Exception as ex:
+            resp.text = MethodResponse(req,
+                            DriverException(0x500, 'Camera.Gain failed', ex)).json
+
 #@before(PreProcessRequest(maxdev))
-#class cansetccdtemperature:
+#class gainmax:
 #
 #    def on_get(self, req: Request, resp: Response, devnum: int):
 #        if not ##IS DEV CONNECTED##:
@@ -535,10 +879,10 @@ def start_fujifilm(logger: Logger):
 #            resp.text = PropertyResponse(val, req).json
 #        except Exception as ex:
 #            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Cansetccdtemperature failed', ex)).json
+#                            DriverException(0x500, 'Camera.Gainmax failed', ex)).json
 #
 #@before(PreProcessRequest(maxdev))
-#class canstopexposure:
+#class gainmin:
 #
 #    def on_get(self, req: Request, resp: Response, devnum: int):
 #        if not ##IS DEV CONNECTED##:
@@ -553,10 +897,22 @@ def start_fujifilm(logger: Logger):
 #            resp.text = PropertyResponse(val, req).json
 #        except Exception as ex:
 #            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Canstopexposure failed', ex)).json
+#                            DriverException(0x500, 'Camera.Gainmin failed', ex)).json
 #
+@before(PreProcessRequest(maxdev))
+class gains:
+
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        resp.text = static_property('gains', req, devnum)
+
 #@before(PreProcessRequest(maxdev))
-#class ccdtemperature:
+#class hasshutter:
 #
 #    def on_get(self, req: Request, resp: Response, devnum: int):
 #        if not ##IS DEV CONNECTED##:
@@ -571,10 +927,10 @@ def start_fujifilm(logger: Logger):
 #            resp.text = PropertyResponse(val, req).json
 #        except Exception as ex:
 #            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Ccdtemperature failed', ex)).json
+#                            DriverException(0x500, 'Camera.Hasshutter failed', ex)).json
 #
 #@before(PreProcessRequest(maxdev))
-#class cooleron:
+#class heatsinktemperature:
 #
 #    def on_get(self, req: Request, resp: Response, devnum: int):
 #        if not ##IS DEV CONNECTED##:
@@ -589,33 +945,110 @@ def start_fujifilm(logger: Logger):
 #            resp.text = PropertyResponse(val, req).json
 #        except Exception as ex:
 #            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Cooleron failed', ex)).json
-#
-#    def on_put(self, req: Request, resp: Response, devnum: int):
-#        if not ## IS DEV CONNECTED ##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        cooleronstr = get_request_field('CoolerOn', req)      # Raises 400 bad request if missing
-#        try:
-#            cooleron = to_bool(cooleronstr)
-#        except:
-#            resp.text = MethodResponse(req,
-#                            InvalidValueException(f'CoolerOn {cooleronstr} not a valid boolean.')).json
-#            return
-#
-#        try:
-#            # -----------------------------
-#            ### DEVICE OPERATION(PARAM) ###
-#            # -----------------------------
-#            resp.text = MethodResponse(req).json
-#        except Exception as ex:
-#            resp.text = MethodResponse(req,
-#                            DriverException(0x500, 'Camera.Cooleron failed', ex)).json
+#                            DriverException(0x500, 'Camera.Heatsinktemperature failed', ex)).json
 #
+# ---------------------------------------------------------------
+# Send an image as ImageBytes if the client asked for it, else JSON
+# ---------------------------------------------------------------
+SHUFFLE_HEADER = 'Alpaca-Byte-Shuffle'
+
+def send_image(req: Request, resp: Response, image, err = Success(), buffer = None):
+    """Send the image (or error) as ImageBytes or JSON
+
+    ImageBytes is streamed from the image in place and the reference on
+    ``buffer`` (if any) is released once the response has gone out. An
+    image is compressed if the client's Accept-Encoding allows, and its
+    pixels byte-shuffled too if it also sends ``Alpaca-Byte-Shuffle: true``.
+    """
+    release = None if buffer is None else buffer.release
+    t0 = time.perf_counter()
+    try:
+        ir = ImageArrayResponse(image, req, err)
+        encoding = None
+        if not image is None:
+            encoding = compression.negotiate(req.get_header('Accept-Encoding'))
+            resp.vary = ('Accept-Encoding',)
+        if accepts_imagebytes(req):
+            shuffle = (not encoding is None and Config.image_byte_shuffle and
+                       (req.get_header(SHUFFLE_HEADER) or '').lower() in ('true', '1'))
+            body = ir.imagestream(Config.image_chunk_size, release, shuffle)
+            release = None                          # Now the body's to release
+            resp.content_type = IMAGEBYTES_MIME
+            if shuffle:
+                resp.set_header(SHUFFLE_HEADER, str(body.chunk_size))
+            if encoding is None:
+                resp.content_length = len(body)
+        elif encoding is None:
+            resp.text = ir.json
+            metrics.SERIALIZE_SECONDS.observe(time.perf_counter() - t0, ('json',))
+            return
+        else:
+            body = [ir.json.encode('utf-8')]
+        if not encoding is None:
+            body = compression.CompressedStream(body, encoding, logger)
+            resp.set_header('Content-Encoding', encoding)
+        fmt = 'imagebytes' if accepts_imagebytes(req) else 'json'
+        # The body is built as it is sent, so it is timed until the server is done with it
+        resp.stream = metrics.TimedBody(body, lambda: metrics.SERIALIZE_SECONDS.observe(
+                                            time.perf_counter() - t0, (fmt,)))
+    finally:
+        if not release is None:
+            release()
+
+@before(PreProcessRequest(maxdev))
+class imagearray:
+
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            send_image(req, resp, None, NotConnectedException())
+            return
+        if not fujifilm.image_ready:
+            send_image(req, resp, None, InvalidOperationException('No image available.'))
+            return
+        try:
+            image, buffer = fujifilm.fetch_image()
+            send_image(req, resp, image, buffer=buffer)
+        except Exception as ex:
+            send_image(req, resp, None,
+                            DriverException(0x500, 'Camera.Imagearray failed', ex))
+
+@before(PreProcessRequest(maxdev))
+class imagearrayvariant:
+
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            send_image(req, resp, None, NotConnectedException())
+            return
+        if not fujifilm.image_ready:
+            send_image(req, resp, None, InvalidOperationException('No image available.'))
+            return
+        try:
+            image, buffer = fujifilm.fetch_image()
+            send_image(req, resp, image, buffer=buffer)
+        except Exception as ex:
+            send_image(req, resp, None,
+                            DriverException(0x500, 'Camera.Imagearrayvariant failed', ex))
+
+@before(PreProcessRequest(maxdev))
+class imageready:
+
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        try:
+            resp.text = PropertyResponse(fujifilm.image_ready, req).json
+        except Exception as ex:
+            resp.text = PropertyResponse(None, req,
+                            DriverException(0x500, 'Camera.Imageready failed', ex)).json
+
 #@before(PreProcessRequest(maxdev))
-#class coolerpower:
+#class ispulseguiding:
 #
 #    def on_get(self, req: Request, resp: Response, devnum: int):
 #        if not ##IS DEV CONNECTED##:
@@ -630,10 +1063,10 @@ def start_fujifilm(logger: Logger):
 #            resp.text = PropertyResponse(val, req).json
 #        except Exception as ex:
 #            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Coolerpower failed', ex)).json
+#                            DriverException(0x500, 'Camera.Ispulseguiding failed', ex)).json
 #
 #@before(PreProcessRequest(maxdev))
-#class electronsperadu:
+#class lastexposureduration:
 #
 #    def on_get(self, req: Request, resp: Response, devnum: int):
 #        if not ##IS DEV CONNECTED##:
@@ -648,10 +1081,10 @@ def start_fujifilm(logger: Logger):
 #            resp.text = PropertyResponse(val, req).json
 #        except Exception as ex:
 #            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Electronsperadu failed', ex)).json
+#                            DriverException(0x500, 'Camera.Lastexposureduration failed', ex)).json
 #
 #@before(PreProcessRequest(maxdev))
-#class exposuremax:
+#class lastexposurestarttime:
 #
 #    def on_get(self, req: Request, resp: Response, devnum: int):
 #        if not ##IS DEV CONNECTED##:
@@ -666,10 +1099,117 @@ def start_fujifilm(logger: Logger):
 #            resp.text = PropertyResponse(val, req).json
 #        except Exception as ex:
 #            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Exposuremax failed', ex)).json
+#                            DriverException(0x500, 'Camera.Lastexposurestarttime failed', ex)).json
 #
+@before(PreProcessRequest(maxdev))
+class maxadu:
+    """The largest pixel value in ImageArray at the current binning
+
+    A binned pixel is the sum of its BinX x BinY block (as read out, not
+    averaged), so it saturates at BinX * BinY times the sensor's
+    full-scale value.
+    """
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        full_scale = (1 << fujifilm.sensor.bits) - 1
+        resp.text = PropertyResponse(full_scale * fujifilm.bin_x * fujifilm.bin_y, req).json
+
+@before(PreProcessRequest(maxdev))
+class maxbinx:
+
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        resp.text = static_property('maxbinx', req, devnum)
+
+@before(PreProcessRequest(maxdev))
+class maxbiny:
+
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        resp.text = static_property('maxbiny', req, devnum)
+
+@before(PreProcessRequest(maxdev))
+class numx:
+
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        resp.text = PropertyResponse(fujifilm.num_x, req).json
+
+    def on_put(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        numxstr = get_request_field('NumX', req)      # Raises 400 bad request if missing
+        try:
+            numx = int(numxstr)
+        except:
+            resp.text = MethodResponse(req,
+                            InvalidValueException(f'NumX {numxstr} not a valid integer.')).json
+            return
+        if numx < 1:
+            resp.text = MethodResponse(req,
+                            InvalidValueException(f'NumX {numx} must be at least 1.')).json
+            return
+        fujifilm.num_x = numx
+        resp.text = MethodResponse(req).json
+
+@before(PreProcessRequest(maxdev))
+class numy:
+
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        resp.text = PropertyResponse(fujifilm.num_y, req).json
+
+    def on_put(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        numystr = get_request_field('NumY', req)      # Raises 400 bad request if missing
+        try:
+            numy = int(numystr)
+        except:
+            resp.text = MethodResponse(req,
+                            InvalidValueException(f'NumY {numystr} not a valid integer.')).json
+            return
+        if numy < 1:
+            resp.text = MethodResponse(req,
+                            InvalidValueException(f'NumY {numy} must be at least 1.')).json
+            return
+        fujifilm.num_y = numy
+        resp.text = MethodResponse(req).json
+
 #@before(PreProcessRequest(maxdev))
-#class exposuremin:
+#class offset:
 #
 #    def on_get(self, req: Request, resp: Response, devnum: int):
 #        if not ##IS DEV CONNECTED##:
@@ -684,626 +1224,7 @@ def start_fujifilm(logger: Logger):
 #            resp.text = PropertyResponse(val, req).json
 #        except Exception as ex:
 #            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Exposuremin failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class exposureresolution:
-#
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        if not ##IS DEV CONNECTED##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        try:
-#            # ----------------------
-#            val = ## GET PROPERTY ##
-#            # ----------------------
-#            resp.text = PropertyResponse(val, req).json
-#        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Exposureresolution failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class fastreadout:
-#
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        if not ##IS DEV CONNECTED##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        try:
-#            # ----------------------
-#            val = ## GET PROPERTY ##
-#            # ----------------------
-#            resp.text = PropertyResponse(val, req).json
-#        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Fastreadout failed', ex)).json
-#
-#    def on_put(self, req: Request, resp: Response, devnum: int):
-#        if not ## IS DEV CONNECTED ##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        fastreadoutstr = get_request_field('FastReadout', req)      # Raises 400 bad request if missing
-#        try:
-#            fastreadout = to_bool(fastreadoutstr)
-#        except:
-#            resp.text = MethodResponse(req,
-#                            InvalidValueException(f'FastReadout {fastreadoutstr} not a valid boolean.')).json
-#            return
-#
-#        try:
-#            # -----------------------------
-#            ### DEVICE OPERATION(PARAM) ###
-#            # -----------------------------
-#            resp.text = MethodResponse(req).json
-#        except Exception as ex:
-#            resp.text = MethodResponse(req,
-#                            DriverException(0x500, 'Camera.Fastreadout failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class fullwellcapacity:
-#
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        if not ##IS DEV CONNECTED##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        try:
-#            # ----------------------
-#            val = ## GET PROPERTY ##
-#            # ----------------------
-#            resp.text = PropertyResponse(val, req).json
-#        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Fullwellcapacity failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class gain:
-#
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        if not ##IS DEV CONNECTED##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        try:
-#            # ----------------------
-#            val = ## GET PROPERTY ##
-#            # ----------------------
-#            resp.text = PropertyResponse(val, req).json
-#        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Gain failed', ex)).json
-#
-#    def on_put(self, req: Request, resp: Response, devnum: int):
-#        if not ## IS DEV CONNECTED ##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        gainstr = get_request_field('Gain', req)      # Raises 400 bad request if missing
-#        try:
-#            gain = int(gainstr)
-#        except:
-#            resp.text = MethodResponse(req,
-#                            InvalidValueException(f'Gain {gainstr} not a valid integer.')).json
-#            return
-#        ### RANGE CHECK AS NEEDED ###  # Raise Alpaca InvalidValueException with details!
-#        try:
-#            # -----------------------------
-#            ### DEVICE OPERATION(PARAM) ###
-#            # -----------------------------
-#            resp.text = MethodResponse(req).json
-#        except Exception as ex:
-#            resp.text = MethodResponse(req,
-#                            DriverException(0x500, 'Camera.Gain failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class gainmax:
-#
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        if not ##IS DEV CONNECTED##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        try:
-#            # ----------------------
-#            val = ## GET PROPERTY ##
-#            # ----------------------
-#            resp.text = PropertyResponse(val, req).json
-#        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Gainmax failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class gainmin:
-#
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        if not ##IS DEV CONNECTED##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        try:
-#            # ----------------------
-#            val = ## GET PROPERTY ##
-#            # ----------------------
-#            resp.text = PropertyResponse(val, req).json
-#        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Gainmin failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class gains:
-#
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        if not ##IS DEV CONNECTED##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        try:
-#            # ----------------------
-#            val = ## GET PROPERTY ##
-#            # ----------------------
-#            resp.text = PropertyResponse(val, req).json
-#        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Gains failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class hasshutter:
-#
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        if not ##IS DEV CONNECTED##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        try:
-#            # ----------------------
-#            val = ## GET PROPERTY ##
-#            # ----------------------
-#            resp.text = PropertyResponse(val, req).json
-#        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Hasshutter failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class heatsinktemperature:
-#
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        if not ##IS DEV CONNECTED##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        try:
-#            # ----------------------
-#            val = ## GET PROPERTY ##
-#            # ----------------------
-#            resp.text = PropertyResponse(val, req).json
-#        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Heatsinktemperature failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class imagearray:
-#
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        if not ##IS DEV CONNECTED##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        try:
-#            # ----------------------
-#            val = ## GET PROPERTY ##
-#            # ----------------------
-#            resp.text = PropertyResponse(val, req).json
-#        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Imagearray failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class imagearrayvariant:
-#
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        if not ##IS DEV CONNECTED##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        try:
-#            # ----------------------
-#            val = ## GET PROPERTY ##
-#            # ----------------------
-#            resp.text = PropertyResponse(val, req).json
-#        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Imagearrayvariant failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class imageready:
-#
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        if not ##IS DEV CONNECTED##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        try:
-#            # ----------------------
-#            val = ## GET PROPERTY ##
-#            # ----------------------
-#            resp.text = PropertyResponse(val, req).json
-#        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Imageready failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class ispulseguiding:
-#
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        if not ##IS DEV CONNECTED##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        try:
-#            # ----------------------
-#            val = ## GET PROPERTY ##
-#            # ----------------------
-#            resp.text = PropertyResponse(val, req).json
-#        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Ispulseguiding failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class lastexposureduration:
-#
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        if not ##IS DEV CONNECTED##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        try:
-#            # ----------------------
-#            val = ## GET PROPERTY ##
-#            # ----------------------
-#            resp.text = PropertyResponse(val, req).json
-#        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Lastexposureduration failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class lastexposurestarttime:
-#
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        if not ##IS DEV CONNECTED##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        try:
-#            # ----------------------
-#            val = ## GET PROPERTY ##
-#            # ----------------------
-#            resp.text = PropertyResponse(val, req).json
-#        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Lastexposurestarttime failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class maxadu:
-#
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        if not ##IS DEV CONNECTED##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        try:
-#            # ----------------------
-#            val = ## GET PROPERTY ##
-#            # ----------------------
-#            resp.text = PropertyResponse(val, req).json
-#        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Maxadu failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class maxbinx:
-#
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        if not ##IS DEV CONNECTED##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        try:
-#            # ----------------------
-#            val = ## GET PROPERTY ##
-#            # ----------------------
-#            resp.text = PropertyResponse(val, req).json
-#        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Maxbinx failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class maxbiny:
-#
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        if not ##IS DEV CONNECTED##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        try:
-#            # ----------------------
-#            val = ## GET PROPERTY ##
-#            # ----------------------
-#            resp.text = PropertyResponse(val, req).json
-#        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Maxbiny failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class numx:
-#
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        if not ##IS DEV CONNECTED##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        try:
-#            # ----------------------
-#            val = ## GET PROPERTY ##
-#            # ----------------------
-#            resp.text = PropertyResponse(val, req).json
-#        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Numx failed', ex)).json
-#
-#    def on_put(self, req: Request, resp: Response, devnum: int):
-#        if not ## IS DEV CONNECTED ##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        numxstr = get_request_field('NumX', req)      # Raises 400 bad request if missing
-#        try:
-#            numx = int(numxstr)
-#        except:
-#            resp.text = MethodResponse(req,
-#                            InvalidValueException(f'NumX {numxstr} not a valid integer.')).json
-#            return
-#        ### RANGE CHECK AS NEEDED ###  # Raise Alpaca InvalidValueException with details!
-#        try:
-#            # -----------------------------
-#            ### DEVICE OPERATION(PARAM) ###
-#            # -----------------------------
-#            resp.text = MethodResponse(req).json
-#        except Exception as ex:
-#            resp.text = MethodResponse(req,
-#                            DriverException(0x500, 'Camera.Numx failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class numy:
-#
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        if not ##IS DEV CONNECTED##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        try:
-#            # ----------------------
-#            val = ## GET PROPERTY ##
-#            # ----------------------
-#            resp.text = PropertyResponse(val, req).json
-#        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Numy failed', ex)).json
-#
-#    def on_put(self, req: Request, resp: Response, devnum: int):
-#        if not ## IS DEV CONNECTED ##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        numystr = get_request_field('NumY', req)      # Raises 400 bad request if missing
-#        try:
-#            numy = int(numystr)
-#        except:
-#            resp.text = MethodResponse(req,
-#                            InvalidValueException(f'NumY {numystr} not a valid integer.')).json
-#            return
-#        ### RANGE CHECK AS NEEDED ###  # Raise Alpaca InvalidValueException with details!
-#        try:
-#            # -----------------------------
-#            ### DEVICE OPERATION(PARAM) ###
-#            # -----------------------------
-#            resp.text = MethodResponse(req).json
-#        except Exception as ex:
-#            resp.text = MethodResponse(req,
-#                            DriverException(0x500, 'Camera.Numy failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class offset:
-#
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        if not ##IS DEV CONNECTED##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        try:
-#            # ----------------------
-#            val = ## GET PROPERTY ##
-#            # ----------------------
-#            resp.text = PropertyResponse(val, req).json
-#        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Offset failed', ex)).json
-#
-#    def on_put(self, req: Request, resp: Response, devnum: int):
-#        if not ## IS DEV CONNECTED ##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        offsetstr = get_request_field('Offset', req)      # Raises 400 bad request if missing
-#        try:
-#            offset = int(offsetstr)
-#        except:
-#            resp.text = MethodResponse(req,
-#                            InvalidValueException(f'Offset {offsetstr} not a valid integer.')).json
-#            return
-#        ### RANGE CHECK AS NEEDED ###  # Raise Alpaca InvalidValueException with details!
-#        try:
-#            # -----------------------------
-#            ### DEVICE OPERATION(PARAM) ###
-#            # -----------------------------
-#            resp.text = MethodResponse(req).json
-#        except Exception as ex:
-#            resp.text = MethodResponse(req,
-#                            DriverException(0x500, 'Camera.Offset failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class offsetmax:
-#
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        if not ##IS DEV CONNECTED##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        try:
-#            # ----------------------
-#            val = ## GET PROPERTY ##
-#            # ----------------------
-#            resp.text = PropertyResponse(val, req).json
-#        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Offsetmax failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class offsetmin:
-#
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        if not ##IS DEV CONNECTED##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        try:
-#            # ----------------------
-#            val = ## GET PROPERTY ##
-#            # ----------------------
-#            resp.text = PropertyResponse(val, req).json
-#        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Offsetmin failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class offsets:
-#
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        if not ##IS DEV CONNECTED##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        try:
-#            # ----------------------
-#            val = ## GET PROPERTY ##
-#            # ----------------------
-#            resp.text = PropertyResponse(val, req).json
-#        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Offsets failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class percentcompleted:
-#
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        if not ##IS DEV CONNECTED##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        try:
-#            # ----------------------
-#            val = ## GET PROPERTY ##
-#            # ----------------------
-#            resp.text = PropertyResponse(val, req).json
-#        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Percentcompleted failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class pixelsizex:
-#
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        if not ##IS DEV CONNECTED##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        try:
-#            # ----------------------
-#            val = ## GET PROPERTY ##
-#            # ----------------------
-#            resp.text = PropertyResponse(val, req).json
-#        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Pixelsizex failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class pixelsizey:
-#
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        if not ##IS DEV CONNECTED##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        try:
-#            # ----------------------
-#            val = ## GET PROPERTY ##
-#            # ----------------------
-#            resp.text = PropertyResponse(val, req).json
-#        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Pixelsizey failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class readoutmode:
-#
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        if not ##IS DEV CONNECTED##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        try:
-#            # ----------------------
-#            val = ## GET PROPERTY ##
-#            # ----------------------
-#            resp.text = PropertyResponse(val, req).json
-#        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Readoutmode failed', ex)).json
+#                            DriverException(0x500, 'Camera.Offset failed', ex)).json
 #
 #    def on_put(self, req: Request, resp: Response, devnum: int):
 #        if not ## IS DEV CONNECTED ##:
@@ -1311,12 +1232,12 @@ def start_fujifilm(logger: Logger):
 #                            NotConnectedException()).json
 #            return
 #        
-#        readoutmodestr = get_request_field('ReadoutMode', req)      # Raises 400 bad request if missing
+#        offsetstr = get_request_field('Offset', req)      # Raises 400 bad request if missing
 #        try:
-#            readoutmode = int(readoutmodestr)
+#            offset = int(offsetstr)
 #        except:
 #            resp.text = MethodResponse(req,
-#                            InvalidValueException(f'ReadoutMode {readoutmodestr} not a valid integer.')).json
+#                            InvalidValueException(f'Offset {offsetstr} not a valid integer.')).json
 #            return
 #        ### RANGE CHECK AS NEEDED ###  # Raise Alpaca InvalidValueException with details!
 #        try:
@@ -1326,10 +1247,10 @@ def start_fujifilm(logger: Logger):
 #            resp.text = MethodResponse(req).json
 #        except Exception as ex:
 #            resp.text = MethodResponse(req,
-#                            DriverException(0x500, 'Camera.Readoutmode failed', ex)).json
+#                            DriverException(0x500, 'Camera.Offset failed', ex)).json
 #
 #@before(PreProcessRequest(maxdev))
-#class readoutmodes:
+#class offsetmax:
 #
 #    def on_get(self, req: Request, resp: Response, devnum: int):
 #        if not ##IS DEV CONNECTED##:
@@ -1344,10 +1265,10 @@ def start_fujifilm(logger: Logger):
 #            resp.text = PropertyResponse(val, req).json
 #        except Exception as ex:
 #            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Readoutmodes failed', ex)).json
+#                            DriverException(0x500, 'Camera.Offsetmax failed', ex)).json
 #
 #@before(PreProcessRequest(maxdev))
-#class sensorname:
+#class offsetmin:
 #
 #    def on_get(self, req: Request, resp: Response, devnum: int):
 #        if not ##IS DEV CONNECTED##:
@@ -1362,10 +1283,10 @@ def start_fujifilm(logger: Logger):
 #            resp.text = PropertyResponse(val, req).json
 #        except Exception as ex:
 #            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Sensorname failed', ex)).json
+#                            DriverException(0x500, 'Camera.Offsetmin failed', ex)).json
 #
 #@before(PreProcessRequest(maxdev))
-#class sensortype:
+#class offsets:
 #
 #    def on_get(self, req: Request, resp: Response, devnum: int):
 #        if not ##IS DEV CONNECTED##:
@@ -1380,8 +1301,116 @@ def start_fujifilm(logger: Logger):
 #            resp.text = PropertyResponse(val, req).json
 #        except Exception as ex:
 #            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Sensortype failed', ex)).json
+#                            DriverException(0x500, 'Camera.Offsets failed', ex)).json
 #
+@before(PreProcessRequest(maxdev))
+class percentcompleted:
+
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        try:
+            resp.text = PropertyResponse(fujifilm.percent_completed, req).json
+        except Exception as ex:
+            resp.text = PropertyResponse(None, req,
+                            DriverException(0x500, 'Camera.Percentcompleted failed', ex)).json
+
+@before(PreProcessRequest(maxdev))
+class pixelsizex:
+
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        resp.text = static_property('pixelsizex', req, devnum)
+
+@before(PreProcessRequest(maxdev))
+class pixelsizey:
+
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        resp.text = static_property('pixelsizey', req, devnum)
+
+@before(PreProcessRequest(maxdev))
+class readoutmode:
+
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        resp.text = PropertyResponse(0, req).json   # The one RAW mode
+
+    def on_put(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        readoutmodestr = get_request_field('ReadoutMode', req)      # Raises 400 bad request if missing
+        try:
+            readoutmode = int(readoutmodestr)
+        except:
+            resp.text = MethodResponse(req,
+                            InvalidValueException(f'ReadoutMode {readoutmodestr} not a valid integer.')).json
+            return
+        if readoutmode != 0:
+            resp.text = MethodResponse(req,
+                            InvalidValueException(f'ReadoutMode {readoutmode} must be 0.')).json
+            return
+        resp.text = MethodResponse(req).json
+
+@before(PreProcessRequest(maxdev))
+class readoutmodes:
+
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        resp.text = static_property('readoutmodes', req, devnum)
+
+@before(PreProcessRequest(maxdev))
+class sensorname:
+
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        resp.text = static_property('sensorname', req, devnum)
+
+@before(PreProcessRequest(maxdev))
+class sensortype:
+
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        resp.text = static_property('sensortype', req, devnum)
+
 #@before(PreProcessRequest(maxdev))
 #class setccdtemperature:
 #
@@ -1423,88 +1452,72 @@ def start_fujifilm(logger: Logger):
 #            resp.text = MethodResponse(req,
 #                            DriverException(0x500, 'Camera.Setccdtemperature failed', ex)).json
 #
-#@before(PreProcessRequest(maxdev))
-#class startx:
-#
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        if not ##IS DEV CONNECTED##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        try:
-#            # ----------------------
-#            val = ## GET PROPERTY ##
-#            # ----------------------
-#            resp.text = PropertyResponse(val, req).json
-#        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Startx failed', ex)).json
-#
-#    def on_put(self, req: Request, resp: Response, devnum: int):
-#        if not ## IS DEV CONNECTED ##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        startxstr = get_request_field('StartX', req)      # Raises 400 bad request if missing
-#        try:
-#            startx = int(startxstr)
-#        except:
-#            resp.text = MethodResponse(req,
-#                            InvalidValueException(f'StartX {startxstr} not a valid integer.')).json
-#            return
-#        ### RANGE CHECK AS NEEDED ###  # Raise Alpaca InvalidValueException with details!
-#        try:
-#            # -----------------------------
-#            ### DEVICE OPERATION(PARAM) ###
-#            # -----------------------------
-#            resp.text = MethodResponse(req).json
-#        except Exception as ex:
-#            resp.text = MethodResponse(req,
-#                            DriverException(0x500, 'Camera.Startx failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class starty:
-#
-#    def on_get(self, req: Request, resp: Response, devnum: int):
-#        if not ##IS DEV CONNECTED##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        try:
-#            # ----------------------
-#            val = ## GET PROPERTY ##
-#            # ----------------------
-#            resp.text = PropertyResponse(val, req).json
-#        except Exception as ex:
-#            resp.text = PropertyResponse(None, req,
-#                            DriverException(0x500, 'Camera.Starty failed', ex)).json
-#
-#    def on_put(self, req: Request, resp: Response, devnum: int):
-#        if not ## IS DEV CONNECTED ##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        startystr = get_request_field('StartY', req)      # Raises 400 bad request if missing
-#        try:
-#            starty = int(startystr)
-#        except:
-#            resp.text = MethodResponse(req,
-#                            InvalidValueException(f'StartY {startystr} not a valid integer.')).json
-#            return
-#        ### RANGE CHECK AS NEEDED ###  # Raise Alpaca InvalidValueException with details!
-#        try:
-#            # -----------------------------
-#            ### DEVICE OPERATION(PARAM) ###
-#            # -----------------------------
-#            resp.text = MethodResponse(req).json
-#        except Exception as ex:
-#            resp.text = MethodResponse(req,
-#                            DriverException(0x500, 'Camera.Starty failed', ex)).json
-#
+@before(PreProcessRequest(maxdev))
+class startx:
+
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        resp.text = PropertyResponse(fujifilm.start_x, req).json
+
+    def on_put(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        startxstr = get_request_field('StartX', req)      # Raises 400 bad request if missing
+        try:
+            startx = int(startxstr)
+        except:
+            resp.text = MethodResponse(req,
+                            InvalidValueException(f'StartX {startxstr} not a valid integer.')).json
+            return
+        if startx < 0:
+            resp.text = MethodResponse(req,
+                            InvalidValueException(f'StartX {startx} must not be negative.')).json
+            return
+        fujifilm.start_x = startx
+        resp.text = MethodResponse(req).json
+
+@before(PreProcessRequest(maxdev))
+class starty:
+
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        resp.text = PropertyResponse(fujifilm.start_y, req).json
+
+    def on_put(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        startystr = get_request_field('StartY', req)      # Raises 400 bad request if missing
+        try:
+            starty = int(startystr)
+        except:
+            resp.text = MethodResponse(req,
+                            InvalidValueException(f'StartY {startystr} not a valid integer.')).json
+            return
+        if starty < 0:
+            resp.text = MethodResponse(req,
+                            InvalidValueException(f'StartY {starty} must not be negative.')).json
+            return
+        fujifilm.start_y = starty
+        resp.text = MethodResponse(req).json
+
 #@before(PreProcessRequest(maxdev))
 #class subexposureduration:
 #
@@ -1546,24 +1559,23 @@ def start_fujifilm(logger: Logger):
 #            resp.text = MethodResponse(req,
 #                            DriverException(0x500, 'Camera.Subexposureduration failed', ex)).json
 #
-#@before(PreProcessRequest(maxdev))
-#class abortexposure:
-#
-#    def on_put(self, req: Request, resp: Response, devnum: int):
-#        if not ## IS DEV CONNECTED ##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        try:
-#            # -----------------------------
-#            ### DEVICE OPERATION(PARAM) ###
-#            # -----------------------------
-#            resp.text = MethodResponse(req).json
-#        except Exception as ex:
-#            resp.text = MethodResponse(req,
-#                            DriverException(0x500, 'Camera.Abortexposure failed', ex)).json
-#
+@before(PreProcessRequest(maxdev))
+class abortexposure:
+
+    def on_put(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        try:
+            fujifilm.command('abort_exposure')
+            resp.text = MethodResponse(req).json
+        except Exception as ex:
+            resp.text = MethodResponse(req,
+                            DriverException(0x500, 'Camera.Abortexposure failed', ex)).json
+
 #@before(PreProcessRequest(maxdev))
 #class pulseguide:
 #
@@ -1602,55 +1614,68 @@ def start_fujifilm(logger: Logger):
 #            resp.text = MethodResponse(req,
 #                            DriverException(0x500, 'Camera.Pulseguide failed', ex)).json
 #
-#@before(PreProcessRequest(maxdev))
-#class startexposure:
-#
-#    def on_put(self, req: Request, resp: Response, devnum: int):
-#        if not ## IS DEV CONNECTED ##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        durationstr = get_request_field('Duration', req)      # Raises 400 bad request if missing
-#        try:
-#            duration = float(durationstr)
-#        except:
-#            resp.text = MethodResponse(req,
-#                            InvalidValueException(f'Duration {durationstr} not a valid number.')).json
-#            return
-#        ### RANGE CHECK AS NEEDED ###  # Raise Alpaca InvalidValueException with details!
-#        lightstr = get_request_field('Light', req)      # Raises 400 bad request if missing
-#        try:
-#            light = to_bool(lightstr)
-#        except:
-#            resp.text = MethodResponse(req,
-#                            InvalidValueException(f'Light {lightstr} not a valid boolean.')).json
-#            return
-#
-#        try:
-#            # -----------------------------
-#            ### DEVICE OPERATION(PARAM) ###
-#            # -----------------------------
-#            resp.text = MethodResponse(req).json
-#        except Exception as ex:
-#            resp.text = MethodResponse(req,
-#                            DriverException(0x500, 'Camera.Startexposure failed', ex)).json
-#
-#@before(PreProcessRequest(maxdev))
-#class stopexposure:
-#
-#    def on_put(self, req: Request, resp: Response, devnum: int):
-#        if not ## IS DEV CONNECTED ##:
-#            resp.text = PropertyResponse(None, req,
-#                            NotConnectedException()).json
-#            return
-#        
-#        try:
-#            # -----------------------------
-#            ### DEVICE OPERATION(PARAM) ###
-#            # -----------------------------
-#            resp.text = MethodResponse(req).json
-#        except Exception as ex:
-#            resp.text = MethodResponse(req,
-#                            DriverException(0x500, 'Camera.Stopexposure failed', ex)).json
+@before(PreProcessRequest(maxdev))
+class startexposure:
+
+    def on_put(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        durationstr = get_request_field('Duration', req)      # Raises 400 bad request if missing
+        try:
+            duration = float(durationstr)
+        except:
+            resp.text = MethodResponse(req,
+                            InvalidValueException(f'Duration {durationstr} not a valid number.')).json
+            return
+        if duration < 0:
+            resp.text = MethodResponse(req,
+                            InvalidValueException(f'Duration {duration} must not be negative.')).json
+            return
+        lightstr = get_request_field('Light', req)      # Raises 400 bad request if missing
+        try:
+            light = to_bool(lightstr)
+        except:
+            resp.text = MethodResponse(req,
+                            InvalidValueException(f'Light {lightstr} not a valid boolean.')).json
+            return
+        if fujifilm.camera_state != CAMERA_IDLE:
+            resp.text = MethodResponse(req,
+                            InvalidOperationException('An exposure is already in progress.')).json
+            return
+        if fujifilm.camera_x_size > 0:                 # Else unknown until the first frame
+            from imaging import check_subframe
+            why = check_subframe(fujifilm.camera_x_size, fujifilm.camera_y_size,
+                                 fujifilm.start_x, fujifilm.start_y, fujifilm.num_x, fujifilm.num_y,
+                                 fujifilm.bin_x, fujifilm.bin_y)
+            if why:
+                resp.text = MethodResponse(req,
+                                InvalidValueException(f'{why}.')).json
+                return
+
+        try:
+            fujifilm.command('start_exposure', duration, light)
+            resp.text = MethodResponse(req).json
+        except Exception as ex:
+            resp.text = MethodResponse(req,
+                            DriverException(0x500, 'Camera.Startexposure failed', ex)).json
+
+@before(PreProcessRequest(maxdev))
+class stopexposure:
 
+    def on_put(self, req: Request, resp: Response, devnum: int):
+        fujifilm = cameras[devnum]
+        if not fujifilm.connected:
+            resp.text = PropertyResponse(None, req,
+                            NotConnectedException()).json
+            return
+        
+        try:
+            fujifilm.command('stop_exposure')
+            resp.text = MethodResponse(req).json
+        except Exception as ex:
+            resp.text = MethodResponse(req,
+                            DriverException(0x500, 'Camera.Stopexposure failed', ex)).json
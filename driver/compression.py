@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# compression.py - Negotiated HTTP compression for image downloads
+# -----------------------------------------------------------------------------
+#
+# ASCOM Camera driver for Fujifilm Mirrorless Camera
+#
+# Description:	Implements ASCOM driver for Fujifilm Mirrorless camera.
+#				Communicates using USB connection.
+#
+# Implements:	ASCOM Standard iCamera V4 interface
+# Author:		(2025) Tony Veinberg <tony.veinberg@gmail.com>
+#
+# Python Compatibility: Requires Python 3.7 or later
+# GitHub: https://github.com/tonyveinberg/alpaca-fujifilm-cameras
+#
+# ---------------------------------------------------------------------------------
+# MIT License
+#
+# Copyright (c) 2024
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# ----------------------------------------------------------------------------------
+
+import zlib
+import time
+from queue import Queue, Empty, Full
+from threading import Thread, Lock
+from logging import Logger
+from config import Config
+
+try:                                # Optional, used if installed
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+# -----------------------------------------
+# Encoders, each gives a streaming compressor
+# -----------------------------------------
+
+class _LZ4Compressor:
+    """lz4.frame compressor with the zlib-like compress()/flush() interface"""
+    def __init__(self, level: int):
+        self._comp = lz4.frame.LZ4FrameCompressor(compression_level=level)
+        self._head = self._comp.begin()
+
+    def compress(self, data) -> bytes:
+        head, self._head = self._head, b''
+        return head + self._comp.compress(data)
+
+    def flush(self) -> bytes:
+        head, self._head = self._head, b''
+        return head + self._comp.flush()
+
+def _gzip(level: int):
+    return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+def _deflate(level: int):
+    return zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS)    # HTTP deflate is zlib format
+
+def _zstd(level: int):
+    return zstandard.ZstdCompressor(level=level).compressobj()
+
+ENCODERS = {'gzip': _gzip, 'deflate': _deflate}
+if zstandard is not None:
+    ENCODERS['zstd'] = _zstd
+if lz4 is not None:
+    ENCODERS['lz4'] = _LZ4Compressor
+
+def available() -> list:
+    """Encodings this server will offer, in order of preference"""
+    return [e for e in Config.image_encodings if e in ENCODERS]
+
+def negotiate(accept_encoding: str) -> str:
+    """Pick a content coding for a response from the client's Accept-Encoding
+
+    Returns the best of :py:func:`available` the client accepts with a
+    non-zero q-value (``*`` counts for all of them), or None to send the
+    response as is.
+    """
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for item in accept_encoding.lower().split(','):
+        name, _, params = item.partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip()] = q
+    wildcard = accepted.get('*', 0.0)
+    for encoding in available():
+        if accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+# -----------------
+# Compression stats
+# -----------------
+
+class CompressionStats:
+    """Per encoding totals and the most recent frame, shared by all requests"""
+    def __init__(self):
+        self._lock = Lock()
+        self._totals = {}           # encoding -> [frames, bytes_in, bytes_out, seconds]
+        self.last = None            # dict for the last frame compressed
+
+    def record(self, encoding: str, bytes_in: int, bytes_out: int, seconds: float):
+        with self._lock:
+            t = self._totals.setdefault(encoding, [0, 0, 0, 0.0])
+            t[0] += 1
+            t[1] += bytes_in
+            t[2] += bytes_out
+            t[3] += seconds
+            self.last = self._entry(encoding, 1, bytes_in, bytes_out, seconds)
+
+    @staticmethod
+    def _entry(encoding, frames, bytes_in, bytes_out, seconds) -> dict:
+        return {'encoding': encoding, 'frames': frames,
+                'bytes_in': bytes_in, 'bytes_out': bytes_out,
+                'ratio': round(bytes_in / bytes_out, 3) if bytes_out else 0.0,
+                'seconds': round(seconds, 4)}
+
+    def snapshot(self) -> dict:
+        """The last frame and the totals per encoding"""
+        with self._lock:
+            return {'last': self.last,
+                    'totals': [self._entry(e, *t) for e, t in self._totals.items()]}
+
+stats = CompressionStats()
+
+# -----------------
+# Compressed stream
+# -----------------
+
+_END = object()
+
+class CompressedStream():
+    """WSGI body compressing another body's chunks on a worker thread
+
+    The worker pulls chunks from ``source``, compresses them and hands
+    them over through a short queue. zlib and zstd release the GIL while
+    they work, so compressing the next chunk overlaps sending the last.
+    ``close()`` stops the worker, closes ``source`` and records the stats
+    for the frame.
+    """
+    def __init__(self, source, encoding: str, logger: Logger):
+        self._source = source
+        self.encoding = encoding
+        self._logger = logger
+        self._queue = Queue(maxsize=Config.image_compression_queue)
+        self._closed = False
+        self._thread = None
+        self._bytes_in = 0
+        self._bytes_out = 0
+        self._seconds = 0.0
+        self._done = False
+
+    def __iter__(self):
+        self._thread = Thread(target=self._compress, name='compress', daemon=True)
+        self._thread.start()
+        while True:
+            item = self._queue.get()
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    def _put(self, item) -> bool:
+        """Queue an item for the sender, False if the stream was closed"""
+        while not self._closed:
+            try:
+                self._queue.put(item, timeout=0.5)
+                return not self._closed
+            except Full:
+                pass
+        return False
+
+    def _compress(self):
+        try:
+            comp = ENCODERS[self.encoding](Config.image_compression_levels.get(self.encoding, 1))
+            for chunk in self._source:
+                t = time.perf_counter()
+                out = comp.compress(chunk)
+                self._seconds += time.perf_counter() - t
+                self._bytes_in += len(chunk)
+                if out:
+                    self._bytes_out += len(out)
+                    if not self._put(out):
+                        return
+            t = time.perf_counter()
+            out = comp.flush()
+            self._seconds += time.perf_counter() - t
+            self._bytes_out += len(out)
+            if out and not self._put(out):
+                return
+            self._done = True
+            self._put(_END)
+        except Exception as ex:
+            self._put(ex)
+
+    def close(self):
+        """Stop the worker, close the source and record the frame's stats"""
+        self._closed = True
+        if self._thread is not None:
+            try:
+                while True:                         # Unblock a waiting put
+                    self._queue.get_nowait()
+            except Empty:
+                pass
+            self._thread.join()
+        if hasattr(self._source, 'close'):
+            self._source.close()
+        if self._done:
+            stats.record(self.encoding, self._bytes_in, self._bytes_out, self._seconds)
+            self._logger.info('Image compressed %s %d -> %d bytes (%.2fx) in %.3f sec',
+                              self.encoding, self._bytes_in, self._bytes_out,
+                              self._bytes_in / max(self._bytes_out, 1), self._seconds)
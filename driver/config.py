@@ -42,19 +42,29 @@
 # 20-Ferb-2024  rbd 0.7 Add sync_write_connected to control sync/async
 #               write-Connected behavior.
 #
-import sys
-import toml
+import os
 import logging
+try:
+    import tomllib                  # Python 3.11+, quicker to import and parse than toml
+except ImportError:
+    tomllib = None
+    import toml
+
+def _load(path: str) -> dict:
+    if tomllib is None:
+        return toml.load(path)
+    with open(path, 'rb') as f:
+        return tomllib.load(f)
 
 _dict = {}
-_dict = toml.load(f'{sys.path[0]}/config.toml')    # Errors here are fatal.
+_dict = _load(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.toml'))    # Errors here are fatal.
 _dict2 = {}
 try:
     # ltf - this file, if it exists can override or supplement definitions
     # in the normal config.toml. This facilitates putting the driver in a
     # docker container where installation specific configuration can be
     # put in a file that isn't pulled from a repository
-    _dict2 = toml.load('/alpyca/config.toml')
+    _dict2 = _load('/alpyca/config.toml')
 except:
     _dict2 = {}
     # file is optional so it's ok if it isn't there
@@ -82,11 +92,28 @@ class Config:
     # ---------------
     ip_address: str = get_toml('network', 'ip_address')
     port: int = get_toml('network', 'port')
+    discovery_ipv6: bool = get_toml('network', 'discovery_ipv6')
+    discovery_rate: float = get_toml('network', 'discovery_rate')
+    discovery_burst: float = get_toml('network', 'discovery_burst')
     # --------------
     # Server Section
     # --------------
     location: str = get_toml('server', 'location')
     verbose_driver_exceptions: bool = get_toml('server', 'verbose_driver_exceptions')
+    max_workers: int = get_toml('server', 'max_workers')
+    keepalive_timeout: float = get_toml('server', 'keepalive_timeout')
+    max_request_body: int = get_toml('server', 'max_request_body')
+    image_chunk_size: int = get_toml('server', 'image_chunk_size')
+    image_encodings: list = get_toml('server', 'image_encodings')
+    image_compression_levels: dict = get_toml('server', 'image_compression_levels')
+    image_compression_queue: int = get_toml('server', 'image_compression_queue')
+    image_byte_shuffle: bool = get_toml('server', 'image_byte_shuffle')
+    server_timing: bool = get_toml('server', 'server_timing')
+    trace_sample_rate: float = get_toml('server', 'trace_sample_rate')
+    trace_slow_ms: float = get_toml('server', 'trace_slow_ms')
+    profile_seconds: float = get_toml('server', 'profile_seconds')
+    profile_max_seconds: float = get_toml('server', 'profile_max_seconds')
+    profile_interval_ms: float = get_toml('server', 'profile_interval_ms')
     # --------------
     # Device Section
     # --------------
@@ -94,6 +121,41 @@ class Config:
     step_size: float = get_toml('device', 'step_size')
     steps_per_sec: int = get_toml('device', 'steps_per_sec')
     sync_write_connected: bool = get_toml('device', 'sync_write_connected')
+    transport: str = get_toml('device', 'transport')
+    cameras: list = get_toml('device', 'cameras')
+    command_queue_size: int = get_toml('device', 'command_queue_size')
+    command_timeout: float = get_toml('device', 'command_timeout')
+    download_timeout: float = get_toml('device', 'download_timeout')
+    usb_timeout_ms: int = get_toml('device', 'usb_timeout_ms')
+    usb_transfer_size: int = get_toml('device', 'usb_transfer_size')
+    usb_queue_depth: int = get_toml('device', 'usb_queue_depth')
+    pipeline: bool = get_toml('device', 'pipeline')
+    pipeline_depth: int = get_toml('device', 'pipeline_depth')
+    partial_object_size: int = get_toml('device', 'partial_object_size')
+    spool_dir: str = get_toml('device', 'spool_dir')
+    spool_max_mb: int = get_toml('device', 'spool_max_mb')
+    save_frames: bool = get_toml('device', 'save_frames')
+    save_dir: str = get_toml('device', 'save_dir')
+    save_format: str = get_toml('device', 'save_format')
+    save_queue: int = get_toml('device', 'save_queue')
+    liveview_max_fps: float = get_toml('device', 'liveview_max_fps')
+    liveview_max_viewers: int = get_toml('device', 'liveview_max_viewers')
+    liveview_timeout: float = get_toml('device', 'liveview_timeout')
+    decode_workers: int = get_toml('device', 'decode_workers')
+    decode_strip_rows: int = get_toml('device', 'decode_strip_rows')
+    decode_parallel_min_mpix: float = get_toml('device', 'decode_parallel_min_mpix')
+    max_bin: int = get_toml('device', 'max_bin')
+    poll_interval: float = get_toml('device', 'poll_interval')
+    state_ttl: dict = get_toml('device', 'state_ttl')
+    # -----------------
+    # Simulator Section
+    # -----------------
+    sim_model: str = get_toml('simulator', 'model')
+    sim_readout_time: float = get_toml('simulator', 'readout_time')
+    sim_usb_link: str = get_toml('simulator', 'usb_link')
+    sim_usb_mbps: float = get_toml('simulator', 'usb_mbps')
+    sim_fault_rate: float = get_toml('simulator', 'fault_rate')
+    sim_disconnect_after: int = get_toml('simulator', 'disconnect_after')
     # ---------------
     # Logging Section
     # ---------------
@@ -101,3 +163,5 @@ class Config:
     log_to_stdout: str = get_toml('logging', 'log_to_stdout')
     max_size_mb: int = get_toml('logging', 'max_size_mb')
     num_keep_logs: int = get_toml('logging', 'num_keep_logs')
+    log_queue_size: int = get_toml('logging', 'log_queue_size')
+    log_value_max: int = get_toml('logging', 'log_value_max')
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# decoder.py - Parallel RAF decode stage (process pool, shared memory)
+# -----------------------------------------------------------------------------
+#
+# ASCOM Camera driver for Fujifilm Mirrorless Camera
+#
+# Description:	Implements ASCOM driver for Fujifilm Mirrorless camera.
+#				Communicates using USB connection.
+#
+# Implements:	ASCOM Standard iCamera V4 interface
+# Author:		(2025) Tony Veinberg <tony.veinberg@gmail.com>
+#
+# Python Compatibility: Requires Python 3.7 or later
+# GitHub: https://github.com/tonyveinberg/alpaca-fujifilm-cameras
+#
+# ---------------------------------------------------------------------------------
+# MIT License
+#
+# Copyright (c) 2024
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# ----------------------------------------------------------------------------------
+
+import os
+import multiprocessing
+import concurrent.futures
+from multiprocessing import shared_memory
+from threading import Lock
+from logging import Logger
+from config import Config
+from bufpool import BufferPool, FrameBuffer
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Attach to a shared memory block from a worker
+
+    The pool processes share the parent's resource tracker, so the parent
+    unlinking the block is all the bookkeeping needed.
+    """
+    return shared_memory.SharedMemory(name=name)
+
+# -------------------------------------------
+# Worker side (run in the decode pool processes)
+# -------------------------------------------
+def _decode_strip(in_name: str, offset: int, width: int, height: int, out_name: str, r0: int, r1: int):
+    """Unpack raw rows r0..r1 into the ASCOM [x][y] output, transposing the strip"""
+    import numpy as np
+    src_shm = _attach(in_name)
+    dst_shm = _attach(out_name)
+    try:
+        src = np.ndarray((height, width), dtype='<u2', buffer=src_shm.buf, offset=offset)
+        dst = np.ndarray((width, height), dtype=np.uint16, buffer=dst_shm.buf)
+        dst[:, r0:r1] = src[r0:r1, :].T
+        del src, dst
+    finally:
+        src_shm.close()
+        dst_shm.close()
+
+def _decode_libraw(in_name: str, size: int, out_name: str) -> tuple:
+    """Decode a compressed or packed RAF with LibRaw (rawpy), return the image shape"""
+    import raf
+    src_shm = _attach(in_name)
+    dst_shm = _attach(out_name)
+    try:
+        img = raf.decode(src_shm.buf[:size], dst_shm.buf)
+        shape = img.shape
+        del img
+        return shape
+    finally:
+        src_shm.close()
+        dst_shm.close()
+
+# -----------------
+# Parent side stage
+# -----------------
+class RAFDecoder:
+    """RAF decode stage running on all cores, off the GIL of the server process
+
+    The RAF arrives in a pooled shared memory buffer (see
+    :py:mod:`bufpool`), straight from the USB download. It is split into
+    strips of ``Config.decode_strip_rows`` rows, and each strip is
+    unpacked and transposed to ASCOM ``[x][y]`` order by a worker
+    process, straight into a second pooled buffer. The result is a numpy
+    view on that buffer, so nothing is pickled or copied on the way.
+    Compressed RAFs are decoded whole by LibRaw in a worker. Frames
+    smaller than ``Config.decode_parallel_min_mpix`` megapixels are
+    decoded inline.
+    """
+    def __init__(self, logger: Logger):
+        self.logger = logger
+        self._pool: concurrent.futures.ProcessPoolExecutor = None
+        self._lock = Lock()                 # Cameras connecting at once share one pool
+
+    def start(self):
+        """Start the worker processes (spawned, safe with our threads)"""
+        with self._lock:
+            if not self._pool is None:
+                return
+            workers = Config.decode_workers or os.cpu_count()
+            self._pool = concurrent.futures.ProcessPoolExecutor(
+                            max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            for f in [self._pool.submit(os.getpid) for _ in range(workers)]:
+                f.result()                          # Warm up now, not on the first frame
+            self.logger.info(f'RAF decoder started with {workers} worker processes')
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is None:
+                return
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    def decode(self, raw: FrameBuffer, size: int, buffers: BufferPool) -> tuple:
+        """Decode the RAF in raw (size bytes) to UINT16 in ASCOM [x][y] order (blocking)
+
+        Returns the image and the pooled buffer it lives in, holding one
+        reference for the caller.
+        """
+        import raf                          # numpy with it, loaded on the first frame
+        data = raw.buf[:size]
+        info = raf.parse(data)
+        npix = info.width * info.height
+        out = buffers.get(npix * 2)
+        try:
+            if not info.compressed and npix < Config.decode_parallel_min_mpix * 1e6:
+                return raf.decode(data, out.buf), out
+            self.start()
+            if info.compressed:
+                shape = self._pool.submit(_decode_libraw, raw.name, size, out.name).result()
+            else:
+                shape = (info.width, info.height)
+                step = Config.decode_strip_rows
+                for f in [self._pool.submit(_decode_strip, raw.name, info.data_offset, info.width, info.height,
+                                            out.name, r0, min(r0 + step, info.height))
+                          for r0 in range(0, info.height, step)]:
+                    f.result()
+            return out.array(shape, 'uint16'), out
+        except Exception:
+            out.release()
+            raise
+        finally:
+            del data
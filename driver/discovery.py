@@ -42,66 +42,198 @@
 # 27-Dec-2022   rbd 0.1 MIT license and module header. No mcast on device, duh!
 #
 import os
-import socket                                           # for discovery responder
-from threading import Thread                            # Same here
+import time
+import socket
+import struct
+import asyncio
 from logging import Logger
+from config import Config
 
 logger: Logger = None
 def set_disc_logger(lgr) -> logger:
     global logger
     logger = lgr
 
-class DiscoveryResponder(Thread):
-    """Alpaca device discovery responder """
-
-    def __init__(self, ADDR, PORT):
-        """ The Alpaca Discovery responder runs in a separate thread and is invoked
-        by a 1-line call during app startup::
-
-            _DSC = DiscoveryResponder(ip_address, port)
-
-        where the ``ip_address`` and ``port`` come from the :doc:`/config`
-        ``Config`` object and ultimately from the config file ``config.toml``.
-        """
-        Thread.__init__(self, name='Discovery')
-        # TODO See https://stackoverflow.com/a/32372627/159508
-        # It's a sledge hammer technique to bind to ' ' for sending multicast
-        # The right way is to bind to the broadcast address for the current
-        # subnet.
-        self.device_address = (ADDR, 32227)    # Listen at multicast address, not ' '
-        self.alpaca_response  = "{\"AlpacaPort\": " + str(PORT) + "}"
-        self.rsock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.rsock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  #share address
+DISCOVERY_PORT = 32227
+DISCOVERY_GROUP_V6 = 'ff12::a1:9aca'        # Alpaca IPv6 discovery multicast group
+DISCOVERY_PROBE = b'alpacadiscovery1'
+STORM_REPORT_INTERVAL = 10.0                # Seconds between reports of dropped probes
+
+class ProbeLimiter:
+    """Token buckets limiting discovery answers, per client host and overall
+
+    A host may ask ``burst`` times at once, then ``rate`` times a
+    second. All hosts together get ten times that, so a probe storm
+    (or spoofed probes from many addresses) costs a few dict lookups
+    per packet and no replies.
+    """
+    MAX_HOSTS = 4096
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}                  # host -> (tokens, last time), None for all hosts
+
+    def _take(self, key, rate: float, burst: float, now: float) -> bool:
+        tokens, last = self._buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - last) * rate)
+        allowed = tokens >= 1.0
+        self._buckets[key] = (tokens - 1.0 if allowed else tokens, now)
+        return allowed
+
+    def allow(self, host: str) -> bool:
+        now = time.monotonic()
+        if len(self._buckets) > self.MAX_HOSTS:
+            self._buckets = {None: self._buckets[None]} if None in self._buckets else {}
+        return (self._take(host, self.rate, self.burst, now) and
+                self._take(None, self.rate * 10, self.burst * 10, now))
+
+class DiscoveryProtocol(asyncio.DatagramProtocol):
+    """Answers Alpaca discovery probes arriving on one socket
+
+    The answer is the precomputed ``{"AlpacaPort": n}`` bytes, sent
+    back from the same socket, so it leaves by the interface the probe
+    came in on. Answered probes are logged at DEBUG, dropped ones are
+    only counted and reported every ``STORM_REPORT_INTERVAL`` seconds.
+    """
+    def __init__(self, name: str, response: bytes, limiter: ProbeLimiter):
+        self.name = name
+        self.response = response
+        self.limiter = limiter
+        self.transport: asyncio.DatagramTransport = None
+        self.dropped = 0
+        self._report_at = 0.0
+
+    def connection_made(self, transport: asyncio.DatagramTransport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr: tuple):
+        if not DISCOVERY_PROBE in data:
+            return
+        if self.limiter.allow(addr[0]):
+            self.transport.sendto(self.response, addr)
+            logger.debug('Discovery probe on %s from %s', self.name, addr[0])
+            return
+        self.dropped += 1
+        now = time.monotonic()
+        if now >= self._report_at:
+            self._report_at = now + STORM_REPORT_INTERVAL
+            logger.warning(f'Discovery on {self.name}: {self.dropped} probes dropped by the rate limit')
+            self.dropped = 0
+
+    def error_received(self, exc: Exception):
+        logger.debug(f'Discovery socket on {self.name}: {exc}')
+
+def _socket(family: int, device: str = None) -> socket.socket:
+    """A discovery socket sharing the port with other Alpaca servers on
+    this host, tied to one network interface if ``device``"""
+    sock = socket.socket(family, socket.SOCK_DGRAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         if os.name != 'nt':
             # needed on Linux and OSX to share port with net core. Remove on windows
-            self.rsock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        if family == socket.AF_INET6:
+            sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 1)
+        if not device is None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BINDTODEVICE, device.encode())
+        sock.setblocking(False)
+        return sock
+    except:
+        sock.close()
+        raise
+
+def _join_v6(sock: socket.socket, ifindex: int):
+    group = socket.inet_pton(socket.AF_INET6, DISCOVERY_GROUP_V6)
+    sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_JOIN_GROUP, group + struct.pack('@I', ifindex))
+
+def _device_socket(family: int, name: str, ifindex: int) -> socket.socket:
+    sock = _socket(family, name)
+    try:
+        if family == socket.AF_INET6:
+            sock.bind(('::', DISCOVERY_PORT))
+            _join_v6(sock, ifindex)
+        else:
+            sock.bind(('', DISCOVERY_PORT))
+        return sock
+    except:
+        sock.close()
+        raise
+
+def _interface_sockets(ipv6: bool) -> list:
+    """[(name, socket)], one per interface and address family
+
+    Each socket is bound to the wildcard address and tied to its
+    interface (SO_BINDTODEVICE), so it gets that interface's broadcasts
+    and multicasts, and its answers go out the same way. Where sockets
+    can't be tied to an interface (not Linux, or too old a kernel
+    without privileges), one wildcard socket per family answers for all
+    of them.
+    """
+    interfaces = socket.if_nameindex()
+    families = [(socket.AF_INET, '')] + ([(socket.AF_INET6, ' (IPv6)')] if ipv6 else [])
+    sockets = []
+    if hasattr(socket, 'SO_BINDTODEVICE'):
         try:
-            self.rsock.bind(self.device_address)
-        except:
-            logger.error('Discovery responder: failure to bind receive socket')
-            self.rsock.close()
-            self.rsock = 0
-            raise
+            for ifindex, name in interfaces:
+                for family, suffix in families:
+                    try:
+                        sockets.append((name + suffix, _device_socket(family, name, ifindex)))
+                    except PermissionError:
+                        raise
+                    except OSError as ex:        # Family or multicast not on this interface
+                        logger.debug(f'Discovery: no socket on {name}{suffix}: {ex}')
+        except PermissionError:
+            for _, sock in sockets:
+                sock.close()
+            sockets = []
+    if not any(s.family == socket.AF_INET for _, s in sockets):
+        sock = _socket(socket.AF_INET)
+        sock.bind(('', DISCOVERY_PORT))
+        sockets.append(('all interfaces', sock))
+    if ipv6 and not any(s.family == socket.AF_INET6 for _, s in sockets):
+        sock = None
+        try:
+            sock = _socket(socket.AF_INET6)
+            sock.bind(('::', DISCOVERY_PORT))
+            for ifindex, name in interfaces:
+                try:
+                    _join_v6(sock, ifindex)
+                except OSError:
+                    pass                    # No IPv6 or no multicast there
+            sockets.append(('all interfaces (IPv6)', sock))
+        except OSError as ex:
+            if not sock is None:
+                sock.close()
+            logger.warning(f'Discovery: no IPv6 socket: {ex}')
+    return sockets
+
+async def start_discovery(address: str, port: int) -> list:
+    """Start answering Alpaca discovery on the running event loop
 
-        self.tsock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.tsock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  #share address
+    With ``address`` '' (any) there is a socket per network interface,
+    IPv4 broadcast plus the IPv6 group if ``discovery_ipv6``. With a
+    specific address, only that one is listened on. Returns the
+    transports, close them to stop.
+    """
+    loop = asyncio.get_running_loop()
+    response = b'{"AlpacaPort": %d}' % port
+    limiter = ProbeLimiter(Config.discovery_rate, Config.discovery_burst)
+    if address:
+        sock = _socket(socket.AF_INET6 if ':' in address else socket.AF_INET)
         try:
-             self.tsock.bind((ADDR, 0))
-        except:
-            logger.error('Discovery responder: failure to bind send socket')
-            self.tsock.close()
-            self.tsock = 0
+            sock.bind((address, DISCOVERY_PORT))
+        except OSError:
+            logger.error('Discovery responder: failure to bind receive socket')
+            sock.close()
             raise
-
-        # OK start the listener
-        self.daemon = True
-        self.start()
-
-    def run(self):
-        """Discovery responder forever loop"""
-        while True:
-            data, addr = self.rsock.recvfrom(1024)
-            datascii = str(data, 'ascii')
-            logger.info(f'Disc rcv {datascii} from {str(addr)}')
-            if 'alpacadiscovery1' in datascii:
-                self.tsock.sendto(self.alpaca_response.encode(), addr)
+        sockets = [(address, sock)]
+    else:
+        sockets = _interface_sockets(Config.discovery_ipv6)
+    transports = []
+    for name, sock in sockets:
+        transport, _ = await loop.create_datagram_endpoint(
+                            lambda name=name: DiscoveryProtocol(name, response, limiter), sock=sock)
+        transports.append(transport)
+    logger.info(f'==STARTUP== Discovery on {", ".join(name for name, _ in sockets)}')
+    return transports
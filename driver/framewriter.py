@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# framewriter.py - Background FITS/XISF writer for finished frames
+# -----------------------------------------------------------------------------
+#
+# ASCOM Camera driver for Fujifilm Mirrorless Camera
+#
+# Description:	Implements ASCOM driver for Fujifilm Mirrorless camera.
+#				Communicates using USB connection.
+#
+# Implements:	ASCOM Standard iCamera V4 interface
+# Author:		(2025) Tony Veinberg <tony.veinberg@gmail.com>
+#
+# Python Compatibility: Requires Python 3.7 or later
+# GitHub: https://github.com/tonyveinberg/alpaca-fujifilm-cameras
+#
+# ---------------------------------------------------------------------------------
+# MIT License
+#
+# Copyright (c) 2024
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# ----------------------------------------------------------------------------------
+
+
+import datetime
+import os
+import queue
+import threading
+from logging import Logger
+
+FITS_BLOCK = 2880
+FITS_CARD = 80
+BAND_BYTES = 1 << 20            # Pixel bytes converted per write
+XISF_CREATOR = 'Alpaca Fujifilm camera driver'
+
+def _fits_value(value) -> str:
+    if isinstance(value, bool):
+        return f'{"T" if value else "F":>20}'
+    if isinstance(value, int):
+        return f'{value:>20}'
+    if isinstance(value, float):
+        return f'{repr(value).upper():>20}'
+    text = str(value).replace("'", "''")
+    return f"'{text:<8}'"
+
+def fits_card(key: str, value = None, comment: str = '') -> bytes:
+    """One 80 character header card, ``key = value / comment``"""
+    card = f'{key:<8}'
+    if not value is None:
+        card += '= ' + _fits_value(value)
+        if comment:
+            card += ' / ' + comment
+    return card[:FITS_CARD].ljust(FITS_CARD).encode('ascii', 'replace')
+
+def fits_header(image, cards: list) -> bytes:
+    """Primary header for image (only its shape and dtype are used) plus
+    ``cards``, a list of (key, value, comment), padded to whole blocks"""
+    nx, ny = image.shape
+    u16 = image.dtype == 'uint16'
+    head = [fits_card('SIMPLE', True, 'conforms to FITS standard'),
+            fits_card('BITPIX', 16 if u16 else 32, 'array data type'),
+            fits_card('NAXIS', 2, 'number of array dimensions'),
+            fits_card('NAXIS1', nx),
+            fits_card('NAXIS2', ny)]
+    if u16:
+        head += [fits_card('BZERO', 32768, 'offset data range to that of unsigned short'),
+                 fits_card('BSCALE', 1, 'default scaling factor')]
+    head += [fits_card(*card) for card in cards if not card[1] is None]
+    head.append(fits_card('END'))
+    header = b''.join(head)
+    return header + b' ' * (-len(header) % FITS_BLOCK)
+
+def _bands(image, dtype: str):
+    """The ASCOM [x][y] image as FITS/XISF rows (x fastest), a band of
+    rows at a time in ``dtype``, through one small scratch array"""
+    import numpy as np
+    nx, ny = image.shape
+    rows = max(1, BAND_BYTES // (nx * np.dtype(dtype).itemsize))
+    scratch = np.empty((rows, nx), dtype)
+    for y0 in range(0, ny, rows):
+        band = image[:, y0:y0 + rows].T
+        out = scratch[:band.shape[0]]
+        if image.dtype == 'uint16' and dtype[0] == '>':
+            np.bitwise_xor(band, 0x8000, out=out)   # Less BZERO, as 16-bit two's complement
+        else:
+            out[...] = band
+        yield out
+
+def write_fits(f, image, cards: list):
+    """Write image (ASCOM [x][y], UINT16 or INT32) and cards as FITS"""
+    f.write(fits_header(image, cards))
+    nbytes = 0
+    for band in _bands(image, '>u2' if image.dtype == 'uint16' else '>i4'):
+        f.write(band)
+        nbytes += band.nbytes
+    f.write(b'\0' * (-nbytes % FITS_BLOCK))
+
+def _xml_attr(value) -> str:
+    return str(value).replace('&', '&amp;').replace('"', '&quot;').replace('<', '&lt;')
+
+def write_xisf(f, image, cards: list):
+    """Write image (ASCOM [x][y], UINT16 or INT32) and cards as XISF 1.0,
+    the FITS cards going in as FITSKeyword elements, with the
+    CreationTime and CreatorApplication metadata the format requires"""
+    nx, ny = image.shape
+    u16 = image.dtype == 'uint16'
+    keywords = ''.join(f'<FITSKeyword name="{key}" value="{_xml_attr(_fits_value(value).strip())}" '
+                       f'comment="{_xml_attr(comment)}"/>'
+                       for key, value, comment in cards if not value is None)
+    created = datetime.datetime.utcnow().isoformat(timespec='milliseconds') + 'Z'
+    metadata = ('<Metadata>'
+                f'<Property id="XISF:CreationTime" type="TimePoint" value="{created}"/>'
+                f'<Property id="XISF:CreatorApplication" type="String" value="{_xml_attr(XISF_CREATOR)}"/>'
+                '</Metadata>')
+    nbytes = nx * ny * (2 if u16 else 4)
+    def xml(position: int) -> bytes:
+        return ('<?xml version="1.0" encoding="UTF-8"?>'
+                '<xisf version="1.0" xmlns="http://www.pixinsight.com/xisf">'
+                f'<Image geometry="{nx}:{ny}:1" sampleFormat="{"UInt16" if u16 else "UInt32"}" '
+                f'colorSpace="Gray" location="attachment:{position}:{nbytes}">'
+                f'{keywords}</Image>{metadata}</xisf>').encode('utf-8')
+    position = 0
+    while True:                             # Data block 4K aligned after the header
+        header = xml(position)
+        aligned = -(-(16 + len(header)) // 4096) * 4096
+        if aligned <= position:
+            break
+        position = aligned
+    length = len(header)
+    f.write(b'XISF0100' + length.to_bytes(4, 'little') + bytes(4) + header)
+    f.write(bytes(position - 16 - length))
+    for band in _bands(image, '<u2' if u16 else '<u4'):
+        f.write(band)
+
+WRITERS = {'fits': (write_fits, '.fits'), 'xisf': (write_xisf, '.xisf')}
+
+class FrameWriter:
+    """Saves finished frames to disk on a background thread
+
+    :py:meth:`submit` takes a reference on the frame's buffer (a
+    :py:class:`~bufpool.FrameBuffer` or :py:class:`~spool.SpoolEntry`)
+    and queues it, so the device engine never waits on the disk. The
+    writer thread converts the pixels a band at a time, writes
+    ``<name>.part`` and renames it when complete, so whatever watches
+    the directory only sees whole files, then releases the buffer.
+    """
+    def __init__(self, logger: Logger, directory: str, fmt: str = 'fits', depth: int = 4):
+        if not fmt in WRITERS:
+            raise ValueError(f'Unknown frame file format "{fmt}" in config.toml')
+        self.logger = logger
+        self.directory = directory
+        self.format = fmt
+        self.enabled = False
+        self.written = 0
+        self.dropped = 0
+        self.last_file = ''
+        self._queue = queue.Queue(depth)
+        self._thread: threading.Thread = None
+        self._lock = threading.Lock()
+
+    def enable(self, on: bool):
+        with self._lock:
+            if on and self._thread is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._thread = threading.Thread(target=self._run, name='FrameWriter', daemon=True)
+                self._thread.start()
+            self.enabled = on
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def status(self) -> dict:
+        return {'Enabled': self.enabled, 'Format': self.format, 'Directory': os.path.abspath(self.directory),
+                'Pending': self.pending, 'Written': self.written, 'Dropped': self.dropped,
+                'LastFile': self.last_file}
+
+    def submit(self, image, buffer, cards: list, name: str):
+        """Queue a frame for saving as name (no extension) in the directory,
+        dropped with an error if the writer is that far behind"""
+        if not self.enabled:
+            return
+        buffer.acquire()
+        try:
+            self._queue.put_nowait((image, buffer, cards, name))
+        except queue.Full:
+            buffer.release()
+            self.dropped += 1
+            self.logger.error(f'Frame writer is {self._queue.maxsize} frames behind, {name} not saved')
+
+    def _run(self):
+        write, ext = WRITERS[self.format]
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            image, buffer, cards, name = item
+            path = os.path.join(self.directory, name + ext)
+            try:
+                with open(path + '.part', 'wb') as f:
+                    write(f, image, cards)
+                os.replace(path + '.part', path)
+                self.written += 1
+                self.last_file = path
+                self.logger.info(f'Frame saved to {path}')
+            except Exception as ex:
+                self.logger.error(f'Frame writer could not save {path}: {type(ex).__name__}: {ex}')
+            finally:
+                del image
+                buffer.release()
+
+    def close(self):
+        """Finish the frames queued so far and stop the thread"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            self.enabled = False
+        if not thread is None:
+            self._queue.put(None)
+            thread.join()
@@ -46,27 +46,731 @@
 #
 # ----------------------------------------------------------------------------------
 
-import math
+import os
 import datetime
-import re
 import asyncio
-import ephem
+import time
+import concurrent.futures
+from collections import deque
 from threading import Lock
 from logging import Logger
 from config import Config
+from ptp import PTPSession, DPC_BATTERY_LEVEL, DPC_EXPOSURE_INDEX, DPC_EXPOSURE_TIME, EC_OBJECT_ADDED
+from bufpool import BufferPool, FrameBuffer, MiB
+from liveview import LatestFrame
+from framewriter import FrameWriter
+from metrics import STAGE_SECONDS, USB_BYTES
+import sensors
 #from exceptions import AstroModeError, AstroAlignmentError, WatchdogError
 #from shr import deg2rad, rad2hr, rad2deg, hr2rad, deg2dms, hr2hms, clamparcsec, empty_queue
 
+# ------------------------------------------------
+# ICamera CameraStates values (camera.CameraStates)
+# ------------------------------------------------
+CAMERA_IDLE         = 0
+CAMERA_WAITING      = 1
+CAMERA_EXPOSING     = 2
+CAMERA_READING      = 3
+CAMERA_DOWNLOAD     = 4
+CAMERA_ERROR        = 5
+
+def make_transport(logger: Logger, serial: str = ''):
+    """Create the camera transport selected by ``transport`` in ``config.toml``
+
+    ``serial`` picks the camera by USB serial number, empty for any one
+    not already open.
+    """
+    if Config.transport == 'usb':
+        from usbtransport import USBTransport
+        return USBTransport(logger, serial)
+    if Config.transport == 'simulator':
+        from simulator import SimulatedCamera
+        return SimulatedCamera(logger, serial=serial)
+    raise ValueError(f'Unknown camera transport "{Config.transport}" in config.toml')
+
+# RAF bytes on top of the raw pixels (preview JPEG, metadata), for
+# sizing the download buffers at connect
+RAF_OVERHEAD = 16 * MiB
+
+class Frame:
+    """A downloaded, decoded frame waiting in the ready queue
+
+    Or, with ``error`` set, a frame whose pipelined download failed,
+    queued in its place so the ImageArray that would have served it
+    fails instead.
+    """
+    __slots__ = ('image', 'buffer', 'start_time', 'duration', 'fetched', 'error')
+
+    def __init__(self, image, buffer, start_time: str, duration: float, error: str = None):
+        self.image = image              # numpy array in ASCOM [x][y] order
+        self.buffer = buffer            # FrameBuffer or SpoolEntry holding image, one reference
+        self.start_time = start_time
+        self.duration = duration
+        self.fetched = False            # Client has downloaded it at least once
+        self.error = error
+
+    def release(self):
+        if not self.buffer is None:
+            self.buffer.release()
+
+# Camera properties kept in the state cache: name -> (PTP code, format)
+POLLED_PROPS = {
+    'iso':      (DPC_EXPOSURE_INDEX, 'H'),
+    'battery':  (DPC_BATTERY_LEVEL, 'B')
+}
+
+class StateCache:
+    """Camera property values with per-property time to live
+
+    Reads never block and never go to the camera. They return the last
+    value even when it is stale. The state poller re-reads what has
+    expired, and set commands and the camera's DevicePropChanged events
+    invalidate a value, so it is re-read on the next poll.
+    """
+    def __init__(self, ttls: dict):
+        self._ttls = ttls
+        self._values = {}
+        self._expires = {}
+
+    def get(self, name: str, default = None):
+        return self._values.get(name, default)
+
+    def put(self, name: str, value):
+        self._values[name] = value
+        self._expires[name] = time.monotonic() + self._ttls.get(name, Config.poll_interval)
+
+    def invalidate(self, name: str):
+        self._expires[name] = 0.0
+
+    def expired(self, names) -> list:
+        now = time.monotonic()
+        return [n for n in names if self._expires.get(n, 0.0) <= now]
+
+    def clear(self):
+        self._values.clear()
+        self._expires.clear()
+
 class Fujifilm:
+    """Fujifilm camera device engine
+
+    A single asyncio task, :py:meth:`client`, owns the camera connection.
+    It takes commands (connect, set ISO/shutter, start/abort exposure,
+    download ...) one at a time from a bounded queue, and runs all the
+    blocking PTP I/O on one dedicated thread so the event loop itself
+    never blocks. The HTTP responders, which run on the server's worker
+    threads, call :py:meth:`command` and wait for the result with a
+    timeout. State (connected, camera_state, image ...) is plain
+    attributes which the responders read without going to the camera.
+    Camera properties (ISO, battery) live in :py:attr:`state`, a
+    :py:class:`StateCache` kept fresh by a poller task while connected.
 
-    def __init__(self, logger: Logger):
+    The camera transport comes from ``transport_factory(logger, serial)``, by
+    default :py:func:`make_transport`, so a simulated camera can be
+    swapped in for testing.
+
+    **Pipelined mode** (``pipeline = true`` in ``config.toml``): once the
+    shutter has closed and the camera has the frame, the camera is idle
+    again and the next exposure may start while the frame is downloaded
+    (in GetPartialObject chunks, so the next exposure's PTP commands slot
+    in between) and decoded in the background. Finished frames wait in a
+    FIFO of at most ``pipeline_depth`` frames, or with a spool as many as
+    fit in ``spool_max_mb`` (``pipeline_depth`` then only limits the
+    downloads in flight). An exposure is refused rather than let a frame
+    not yet fetched be dropped. ImageArray serves the
+    oldest frame not yet fetched, and a fetched frame is retired as soon
+    as a newer one is served or the next exposure starts. Without
+    pipelining, an exposure includes its download and starting a new one
+    discards the old frame.
+    """
+
+    def __init__(self, logger: Logger, transport_factory = None, serial: str = '', devnum: int = 0,
+                 decoder: 'RAFDecoder' = None):
         self._lock = Lock()
-        self.name: str = 'device'
+        self.name: str = f'camera {devnum}'
+        self.devnum: int = devnum
+        self.serial: str = serial               # USB serial number wanted, '' for any
         self.logger = logger
-        
+        self.connected: bool = False
+        self.connecting: bool = False
+        self.model: str = ''
+        self.camera_state: int = CAMERA_IDLE
+        self.state = StateCache(Config.state_ttl)
+        self.shutter: float = 0.0
+        self.last_exposure_start_time: str = ''
+        self.last_exposure_duration: float = 0.0
+        self.session: int = 0                   # Bumped when session-static properties change
+        self.sensor: sensors.Sensor = sensors.UNKNOWN
+        self.camera_x_size: int = 0             # Full sensor, from sensors.SENSORS
+        self.camera_y_size: int = 0             #   or else the first frame
+        self.pixel_size: float = 0.0
+        self.max_bin: int = Config.max_bin
+        self.start_x: int = 0                   # Subframe, in binned pixels
+        self.start_y: int = 0
+        self.num_x: int = 0
+        self.num_y: int = 0
+        self.bin_x: int = 1
+        self.bin_y: int = 1
+        self._exposure_roi: tuple = None        # Subframe latched at StartExposure
+        self._exposure_cards: list = None       # Header cards for the saved file, ditto
+        self._transport_factory = transport_factory or make_transport
+        self._transport = None
+        self._session: PTPSession = None
+        self._loop: asyncio.AbstractEventLoop = None
+        self._commands: asyncio.Queue = None
+        self._io_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='FujifilmIO')
+        self._exposure_task: asyncio.Task = None
+        self._poller_task: asyncio.Task = None
+        self._capture_tid: int = 0
+        self._exposure_t0: float = 0.0
+        self._ready = deque()           # Frames ready for ImageArray, oldest first
+        self._downloads_pending: int = 0
+        self._download_progress: float = 0.0
+        self.download_mbps: float = 0.0         # Achieved by the last download
+        self._download_lock: asyncio.Lock = None
+        self._own_decoder = decoder is None
+        if decoder is None:
+            from decoder import RAFDecoder
+            decoder = RAFDecoder(logger)
+        self._decoder = decoder                 # May be shared by all cameras
+        self._buffers = BufferPool(logger)
+        self.liveview = LatestFrame()
+        self._spool: FrameSpool = None
+        if Config.spool_dir:
+            from spool import FrameSpool
+            self._spool = FrameSpool(logger, os.path.join(Config.spool_dir, f'camera{devnum}'),
+                                     Config.spool_max_mb * MiB, self._spool_evicted)
+        self.writer = FrameWriter(logger, os.path.join(Config.save_dir, f'camera{devnum}'),
+                                  Config.save_format, Config.save_queue)
+        self.writer.enable(Config.save_frames)
+        self._liveview_task: asyncio.Task = None
+        self._liveview_clients: int = 0
+
+# ----------------------------------
+# Frame and progress state (any thread)
+# ----------------------------------
+    @property
+    def iso(self) -> int:
+        return self.state.get('iso', 0)
+
+    @property
+    def image_ready(self) -> bool:
+        return len(self._ready) > 0
+
+    def queue_depths(self) -> dict:
+        return {'commands': 0 if self._commands is None else self._commands.qsize(),
+                'ready_frames': len(self._ready),
+                'downloads': self._downloads_pending,
+                'writer': self.writer.pending,
+                'liveview_clients': self._liveview_clients}
+
+    def memory_usage(self) -> dict:
+        """Frame pool {'busy'|'idle': (buffers, bytes)} and spooled bytes"""
+        usage = self._buffers.usage()
+        usage['spooled'] = (0, 0) if self._spool is None else (len(self._ready), self._spool.nbytes)
+        return usage
+
+    def _current_frame(self) -> Frame:
+        """Oldest frame not yet fetched, else the last fetched one (hold _lock)"""
+        ready = self._ready
+        while len(ready) > 1 and ready[0].fetched:
+            ready.popleft().release()
+        return ready[0]
+
+    def _retire_frames(self, fetched_only: bool):
+        with self._lock:
+            while self._ready and (self._ready[0].fetched or not fetched_only):
+                self._ready.popleft().release()
+
+    def fetch_image(self) -> tuple:
+        """Return the image for ImageArray and its buffer, and mark it fetched
+
+        The caller holds a reference on the buffer and must release it
+        once the image has been sent, then the buffer can go back to the
+        pool when the frame is retired. Raises ``RuntimeError`` for a
+        frame whose download failed.
+        """
+        with self._lock:
+            frame = self._current_frame()
+            frame.fetched = True
+            if not frame.error is None:
+                raise RuntimeError(frame.error)
+            if not self._spool is None:
+                self._spool.served(frame.buffer)
+            return frame.image, frame.buffer.acquire()
+
+    @property
+    def percent_completed(self) -> int:
+        """Exposure progress while exposing, else download progress"""
+        if self.camera_state == CAMERA_EXPOSING and self.last_exposure_duration > 0:
+            done = (time.monotonic() - self._exposure_t0) / self.last_exposure_duration
+            return min(100, int(done * 100))
+        if self._downloads_pending > 0 or self.camera_state == CAMERA_DOWNLOAD:
+            return int(self._download_progress * 100)
+        return 100
+
+# ---------------------------------
+# Thread side API (HTTP responders)
+# ---------------------------------
+    def command(self, name: str, *args, timeout: float = None):
+        """Queue a command for the device engine and wait for its result
+
+        Called from the HTTP worker threads. Raises ``TimeoutError`` if the
+        engine has not finished it within ``timeout`` seconds (default
+        ``Config.command_timeout``), ``asyncio.QueueFull`` if the engine is
+        swamped, else whatever the command itself raised.
+        """
+        if self._loop is None:
+            raise RuntimeError('Fujifilm device engine is not running')
+        fut = asyncio.run_coroutine_threadsafe(self._enqueue(name, args), self._loop)
+        try:
+            return fut.result(timeout or Config.command_timeout)
+        except concurrent.futures.TimeoutError:
+            fut.cancel()
+            raise TimeoutError(f'Fujifilm {name} did not complete within {timeout or Config.command_timeout} sec')
+
+    def command_nowait(self, name: str, *args):
+        """Queue a command for the device engine and return at once (errors are logged)
+
+        Raises ``asyncio.QueueFull`` if the engine is swamped.
+        """
+        if self._loop is None:
+            raise RuntimeError('Fujifilm device engine is not running')
+        asyncio.run_coroutine_threadsafe(self._enqueue_nowait(name, args), self._loop).result(Config.command_timeout)
+
+    async def _enqueue(self, name: str, args):
+        future = self._loop.create_future()
+        self._commands.put_nowait((name, args, future))
+        return await future
+
+    async def _enqueue_nowait(self, name: str, args):
+        self._commands.put_nowait((name, args, None))
+
+    async def _io(self, fn, *args):
+        """Run blocking camera I/O on the engine's I/O thread"""
+        return await self._loop.run_in_executor(self._io_executor, fn, *args)
 
 # ----------------------------
 # Fujifilm Connection Methods
 # ----------------------------
-    async def client():
-        null
\ No newline at end of file
+    async def client(self):
+        """The device engine: runs the queued commands one at a time, forever"""
+        self._loop = asyncio.get_running_loop()
+        self._commands = asyncio.Queue(maxsize=Config.command_queue_size)
+        self._download_lock = asyncio.Lock()
+        self.logger.info('==STARTUP== Fujifilm device engine running')
+        try:
+            while True:
+                name, args, future = await self._commands.get()
+                if not future is None and future.done():
+                    continue                        # Caller gave up waiting
+                try:
+                    result = await getattr(self, f'_cmd_{name}')(*args)
+                    if not future is None and not future.done():
+                        future.set_result(result)
+                except Exception as ex:
+                    if not future is None and not future.done():
+                        future.set_exception(ex)
+                    else:
+                        self.logger.error(f'Fujifilm {name} failed: {type(ex).__name__}: {ex}')
+        finally:
+            if self.connected:
+                await self._cmd_disconnect()
+            self._io_executor.shutdown(wait=False)
+            self.writer.close()
+            if self._own_decoder:
+                self._decoder.shutdown()
+            self._retire_frames(fetched_only=False)
+            self._buffers.close()
+            if not self._spool is None:
+                self._spool.close()
+
+    async def _cmd_connect(self):
+        if self.connected:
+            self.connecting = False
+            return
+        self.connecting = True
+        transport = self._transport_factory(self.logger, self.serial)
+        try:
+            await self._io(transport.open)
+            session = PTPSession(transport)
+            await self._io(session.open_session)
+            info = await self._io(session.get_device_info)
+            for name, (code, fmt) in POLLED_PROPS.items():
+                self.state.put(name, await self._io(session.get_prop, code, fmt))
+            session.on_prop_changed = self._prop_changed
+            await self._loop.run_in_executor(None, self._decoder.start)
+            self._transport = transport
+            self._session = session
+            self.model = info.model
+            self._set_sensor(sensors.lookup(info.model))
+            await self._loop.run_in_executor(None, self._reserve_buffers)
+            self.camera_state = CAMERA_IDLE
+            self.session += 1
+            self.connected = True
+            self._poller_task = self._loop.create_task(self._state_poller())
+            self.logger.info(f'Fujifilm {info.model} (serial {info.serial}) connected, '
+                             f'battery {self.state.get("battery")}%')
+        except Exception:
+            await self._io(transport.close)
+            raise
+        finally:
+            self.connecting = False
+
+    def _set_sensor(self, sensor: sensors.Sensor):
+        """Take the sensor geometry and reset the subframe to the full frame"""
+        if sensor is None:
+            self.logger.warning(f'Fujifilm {self.model} sensor size unknown until the first frame')
+            sensor = sensors.UNKNOWN
+        self.sensor = sensor
+        self.camera_x_size, self.camera_y_size, self.pixel_size = sensor.width, sensor.height, sensor.pixel_size
+        self.start_x = self.start_y = 0
+        self.bin_x = self.bin_y = 1
+        self.num_x, self.num_y = sensor.width, sensor.height
+
+    def _reserve_buffers(self):
+        """Preallocate the frame buffers for this sensor: downloads and decoded frames"""
+        if self.camera_x_size == 0:
+            return                                  # Allocated as needed
+        image = self.camera_x_size * self.camera_y_size * 2
+        raw = -(-(image + RAF_OVERHEAD) // MiB) * MiB
+        frames = Config.pipeline_depth + 1 if Config.pipeline else 2
+        self._buffers.reserve({raw: 2 if Config.pipeline else 1, image: frames})
+
+    async def _cmd_disconnect(self):
+        if not self.connected:
+            return
+        self._cancel_exposure_timer()
+        self._poller_task.cancel()
+        self._stop_liveview()
+        self.connected = False
+        self.state.clear()
+        try:
+            await self._io(self._session.close_session)
+        finally:
+            await self._io(self._transport.close)
+            self._session = None
+            self._transport = None
+            self.logger.info('Fujifilm disconnected')
+
+# ---------------------------
+# Fujifilm Property Commands
+# ---------------------------
+    async def _cmd_set_iso(self, iso: int):
+        await self._io(self._session.set_prop, DPC_EXPOSURE_INDEX, iso, 'H')
+        self.state.put('iso', iso)
+        self.state.invalidate('iso')                # The camera may round it, re-read
+
+    def _prop_changed(self, code: int):
+        """DevicePropChanged from the camera (on the I/O thread)"""
+        for name, (prop, fmt) in POLLED_PROPS.items():
+            if prop == code:
+                self.state.invalidate(name)
+
+    async def _state_poller(self):
+        """Apply the camera's events and re-read expired properties, while connected"""
+        while True:
+            await asyncio.sleep(Config.poll_interval)
+            try:
+                await self._io(self._session.poll_events)
+                for name in self.state.expired(POLLED_PROPS):
+                    code, fmt = POLLED_PROPS[name]
+                    self.state.put(name, await self._io(self._session.get_prop, code, fmt))
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                self.logger.warning(f'Fujifilm state poll failed: {type(ex).__name__}: {ex}')
+
+    async def _cmd_set_shutter(self, seconds: float):
+        await self._io(self._session.set_prop, DPC_EXPOSURE_TIME, round(seconds * 10000), 'I')
+        self.shutter = seconds
+
+# ---------------------------
+# Fujifilm Live View Commands
+# ---------------------------
+    async def _cmd_start_liveview(self):
+        """A live view client arrived, pull frames while there are any"""
+        if not self.connected:
+            raise RuntimeError('Fujifilm is not connected')
+        self._liveview_clients += 1
+        if self._liveview_task is None:
+            self._liveview_task = self._loop.create_task(self._liveview_loop())
+            self.logger.info('Fujifilm live view started')
+
+    async def _cmd_stop_liveview(self):
+        """A live view client left"""
+        self._liveview_clients = max(0, self._liveview_clients - 1)
+        if self._liveview_clients == 0:
+            self._stop_liveview()
+
+    def _stop_liveview(self):
+        self._liveview_clients = 0
+        if not self._liveview_task is None:
+            self._liveview_task.cancel()
+            self._liveview_task = None
+            self.liveview.clear()
+            self.logger.info('Fujifilm live view stopped')
+
+    async def _liveview_loop(self):
+        """Pull live view JPEGs into self.liveview, at most liveview_max_fps
+
+        Each pull is one short GetObject on the I/O thread, so commands
+        interleave with it. Live view pauses while an exposure or a
+        download has the camera.
+        """
+        interval = 1.0 / Config.liveview_max_fps
+        while True:
+            t0 = time.monotonic()
+            if self.camera_state == CAMERA_IDLE and self._downloads_pending == 0:
+                try:
+                    self.liveview.put(await self._io(self._session.get_liveview))
+                except asyncio.CancelledError:
+                    raise
+                except Exception as ex:
+                    self.logger.warning(f'Fujifilm live view frame failed: {type(ex).__name__}: {ex}')
+                    await asyncio.sleep(1.0)
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - t0)))
+
+# ---------------------------
+# Fujifilm Exposure Commands
+# ---------------------------
+    async def _cmd_start_exposure(self, duration: float, light: bool):
+        """Open the shutter (bulb) and start the exposure timer"""
+        if self.camera_state != CAMERA_IDLE:
+            raise RuntimeError('An exposure is already in progress')
+        if Config.pipeline:
+            self._retire_frames(fetched_only=True)
+            if not self._spool is None:             # Waiting frames are on disk, only downloads use RAM
+                if self._downloads_pending >= Config.pipeline_depth:
+                    raise RuntimeError(f'{Config.pipeline_depth} frames are still downloading')
+            elif len(self._ready) + self._downloads_pending >= Config.pipeline_depth:
+                raise RuntimeError(f'{Config.pipeline_depth} frames are waiting to be downloaded')
+        else:
+            self._retire_frames(fetched_only=False)
+        if not self._spool is None:
+            self._check_spool_room()
+        self._capture_tid = await self._io(self._session.initiate_open_capture)
+        self._exposure_t0 = time.monotonic()
+        self.last_exposure_start_time = datetime.datetime.utcnow().isoformat(timespec='milliseconds')
+        self.last_exposure_duration = duration
+        self._exposure_roi = (self.start_x, self.start_y, self.num_x, self.num_y, self.bin_x, self.bin_y)
+        self._exposure_cards = self._frame_cards(light)
+        self.camera_state = CAMERA_EXPOSING
+        self._exposure_task = self._loop.create_task(self._exposure_timer(duration))
+
+    async def _exposure_timer(self, duration: float):
+        await asyncio.sleep(duration)
+        await self._commands.put(('finish_exposure', (), None))
+
+    def _cancel_exposure_timer(self):
+        if not self._exposure_task is None:
+            self._exposure_task.cancel()
+            self._exposure_task = None
+
+    async def _cmd_finish_exposure(self):
+        """Close the shutter, wait for the new object, then download it
+
+        In pipelined mode the download runs as a background task and the
+        camera is idle (ready for the next exposure) as soon as it has
+        the frame.
+        """
+        if self.camera_state != CAMERA_EXPOSING:
+            return                                  # Aborted meanwhile
+        self._exposure_task = None
+        STAGE_SECONDS.observe(time.monotonic() - self._exposure_t0, (self.devnum, 'exposure'))
+        try:
+            await self._io(self._session.terminate_open_capture, self._capture_tid)
+            self.camera_state = CAMERA_READING
+            params = await self._io(self._session.wait_event, EC_OBJECT_ADDED, Config.download_timeout)
+        except Exception:
+            self.camera_state = CAMERA_ERROR
+            raise
+        frame = (self.last_exposure_start_time, self.last_exposure_duration, self._exposure_roi,
+                 self._exposure_cards)
+        if Config.pipeline:
+            self._downloads_pending += 1
+            self.camera_state = CAMERA_IDLE
+            self._loop.create_task(self._background_download(params[0], *frame))
+        else:
+            await self._cmd_download(params[0], *frame)
+
+    async def _cmd_stop_exposure(self):
+        """End the exposure now and keep the image
+
+        Queues the finish as the exposure timer does, so the caller is
+        answered at once and does not wait on the download (a large RAF
+        over USB 2 takes longer than ``command_timeout``). ImageReady
+        tells when the frame is there.
+        """
+        if self.camera_state != CAMERA_EXPOSING:
+            return
+        self._cancel_exposure_timer()
+        self._commands.put_nowait(('finish_exposure', (), None))
+
+    async def _cmd_abort_exposure(self):
+        """End the exposure now and throw the image away"""
+        if self.camera_state != CAMERA_EXPOSING:
+            return
+        self._cancel_exposure_timer()
+        try:
+            await self._io(self._session.terminate_open_capture, self._capture_tid)
+            params = await self._io(self._session.wait_event, EC_OBJECT_ADDED, Config.download_timeout)
+            await self._io(self._session.delete_object, params[0])
+        finally:
+            self.camera_state = CAMERA_IDLE
+
+    async def _cmd_download(self, handle: int, start_time: str, duration: float, roi: tuple, cards: list):
+        """Download an object (RAF) from the camera in one transfer and decode it"""
+        self.camera_state = CAMERA_DOWNLOAD
+        self._download_progress = 0.0
+        try:
+            info = await self._io(self._session.get_object_info, handle)
+            raw = self._buffers.get(info.size)
+            try:
+                t0 = time.monotonic()
+                size = await self._io(self._session.get_object_into, handle, raw.buf)
+                self._downloaded(info, size, time.monotonic() - t0)
+                await self._io(self._session.delete_object, handle)
+                self._download_progress = 1.0
+                await self._decode(raw, size, start_time, duration, roi, cards)
+            finally:
+                raw.release()
+            self.camera_state = CAMERA_IDLE
+        except Exception:
+            self.camera_state = CAMERA_ERROR
+            raise
+
+    async def _background_download(self, handle: int, start_time: str, duration: float, roi: tuple,
+                                   cards: list):
+        """Pipelined download, in chunks so other PTP commands can interleave"""
+        try:
+            async with self._download_lock:         # FIFO, frames stay in order
+                self._download_progress = 0.0
+                info = await self._io(self._session.get_object_info, handle)
+                raw = self._buffers.get(info.size)
+                try:
+                    offset = 0
+                    t0 = time.monotonic()
+                    while offset < info.size:
+                        n = await self._io(self._session.get_partial_object_into, handle, offset,
+                                           min(Config.partial_object_size, info.size - offset),
+                                           raw.buf[offset:])
+                        if n == 0:
+                            raise IOError(f'{info.filename} ended at {offset} of {info.size} bytes')
+                        offset += n
+                        self._download_progress = offset / info.size
+                    self._downloaded(info, offset, time.monotonic() - t0)
+                    await self._io(self._session.delete_object, handle)
+                    await self._decode(raw, info.size, start_time, duration, roi, cards)
+                finally:
+                    raw.release()
+        except Exception as ex:
+            self.logger.error(f'Fujifilm background download failed: {type(ex).__name__}: {ex}')
+            with self._lock:                        # Its ImageArray gets the error, in frame order
+                self._ready.append(Frame(None, None, start_time, duration,
+                                         f'Download of the frame started {start_time} failed: '
+                                         f'{type(ex).__name__}: {ex}'))
+        finally:
+            self._downloads_pending -= 1
+
+    def _downloaded(self, info, size: int, seconds: float):
+        """Note the achieved transfer rate of a download"""
+        self.download_mbps = size / max(seconds, 1e-6) / 1e6
+        STAGE_SECONDS.observe(seconds, (self.devnum, 'download'))
+        USB_BYTES.inc((self.devnum,), size)
+        self.logger.info(f'Fujifilm {info.filename} downloaded, {size} bytes in {seconds:.2f} sec, '
+                         f'{self.download_mbps:.1f} MB/s')
+
+    async def _decode(self, raw: FrameBuffer, size: int, start_time: str, duration: float, roi: tuple,
+                      cards: list):
+        """Decode the RAF in the decoder's process pool, apply the subframe
+        and binning, queue the frame for ImageArray and hand it to the
+        frame writer"""
+        t0 = time.monotonic()
+        image, buffer = await self._loop.run_in_executor(None, self._develop, raw, size, roi)
+        t1 = time.monotonic()
+        STAGE_SECONDS.observe(t1 - t0, (self.devnum, 'decode'))
+        if not self._spool is None:
+            image, buffer = await self._loop.run_in_executor(None, self._spool_frame, image, buffer)
+            STAGE_SECONDS.observe(time.monotonic() - t1, (self.devnum, 'spool'))
+        with self._lock:
+            self._ready.append(Frame(image, buffer, start_time, duration))
+        self.logger.info(f'Fujifilm frame {image.shape} ready, {size} bytes')
+        stamp = start_time.replace('-', '').replace(':', '').replace('.', '-')
+        self.writer.submit(image, buffer, cards, f'{self.model.replace(" ", "") or "frame"}_{stamp}')
+
+    def _frame_cards(self, light: bool) -> list:
+        """FITS header cards (key, value, comment) for the exposure just
+        started, None values are left out. The sensor temperature is not
+        available over PTP."""
+        startx, starty, _, _, binx, biny = self._exposure_roi
+        bayer = self.sensor.bayer and binx == 1 and biny == 1
+        return [('DATE-OBS', self.last_exposure_start_time, 'UTC start of exposure'),
+                ('EXPTIME', float(self.last_exposure_duration), '[s] exposure time'),
+                ('EXPOSURE', float(self.last_exposure_duration), '[s] exposure time'),
+                ('IMAGETYP', 'Light Frame' if light else 'Dark Frame', 'type of exposure'),
+                ('INSTRUME', self.model, 'camera model'),
+                ('ISOSPEED', self.iso or None, 'ISO sensitivity'),
+                ('XBINNING', binx, 'binning factor in width'),
+                ('YBINNING', biny, 'binning factor in height'),
+                ('XORGSUBF', startx, 'subframe x origin, binned pixels'),
+                ('YORGSUBF', starty, 'subframe y origin, binned pixels'),
+                ('XPIXSZ', self.sensor.pixel_size * binx or None, '[um] pixel width incl. binning'),
+                ('YPIXSZ', self.sensor.pixel_size * biny or None, '[um] pixel height incl. binning'),
+                ('BAYERPAT', 'RGGB' if bayer else None, 'Bayer color pattern'),
+                ('XBAYROFF', 0 if bayer else None, 'Bayer pattern x offset'),
+                ('YBAYROFF', 0 if bayer else None, 'Bayer pattern y offset'),
+                ('ROWORDER', 'TOP-DOWN', 'order of the rows'),
+                ('SWCREATE', 'Alpaca Fujifilm driver', 'software that wrote the file')]
+
+    def _spool_frame(self, image, buffer: FrameBuffer) -> tuple:
+        """Move a developed frame out of memory into the spool, return (memmap, entry)"""
+        try:
+            entry = self._spool.put(image)
+        finally:
+            del image
+            buffer.release()
+        return entry.image, entry
+
+    def _check_spool_room(self):
+        """Refuse an exposure if the spool can't take its frame, and those
+        still downloading, without evicting a frame not yet fetched"""
+        import numpy as np
+        from imaging import subframe_dtype
+        frame = self.num_x * self.num_y * np.dtype(subframe_dtype(self.bin_x, self.bin_y)).itemsize
+        if frame * (self._downloads_pending + 1) > self._spool.room():
+            raise RuntimeError(f'Frame spool full, {len(self._ready)} frames are waiting to be '
+                               f'downloaded')
+
+    def _spool_evicted(self, entry: 'SpoolEntry'):
+        """The spool is full and dropped this fetched frame, take it off the ready queue"""
+        with self._lock:
+            for frame in self._ready:
+                if frame.buffer is entry:
+                    self._ready.remove(frame)
+                    break
+            else:
+                return
+        entry.release()
+
+    def _develop(self, raw: FrameBuffer, size: int, roi: tuple) -> tuple:
+        """Decode and subframe/bin, all in pooled buffers, return (image, buffer)"""
+        import numpy as np
+        import imaging
+        image, buffer = self._decoder.decode(raw, size, self._buffers)
+        if self.camera_x_size == 0:                 # Sensor not in sensors.SENSORS
+            self.sensor = self.sensor._replace(width=image.shape[0], height=image.shape[1])
+            self.camera_x_size, self.camera_y_size = image.shape
+            self.num_x, self.num_y = image.shape
+            self.session += 1
+            roi = (0, 0) + image.shape + (1, 1)
+        if imaging.is_full_frame(image, *roi):
+            return image, buffer
+        try:
+            numx, numy, binx, biny = roi[2:]
+            dtype = imaging.subframe_dtype(binx, biny)
+            sub = self._buffers.get(numx * numy * np.dtype(dtype).itemsize)
+            out = imaging.subframe(image, *roi, out=sub.array((numx, numy), dtype))
+        finally:
+            del image
+            buffer.release()
+        return out, sub
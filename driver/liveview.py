@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# liveview.py - Live view latest frame and MJPEG endpoint
+# -----------------------------------------------------------------------------
+#
+# ASCOM Camera driver for Fujifilm Mirrorless Camera
+#
+# Description:	Implements ASCOM driver for Fujifilm Mirrorless camera.
+#				Communicates using USB connection.
+#
+# Implements:	ASCOM Standard iCamera V4 interface
+# Author:		(2025) Tony Veinberg <tony.veinberg@gmail.com>
+#
+# Python Compatibility: Requires Python 3.7 or later
+# GitHub: https://github.com/tonyveinberg/alpaca-fujifilm-cameras
+#
+# ---------------------------------------------------------------------------------
+# MIT License
+#
+# Copyright (c) 2024
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# ----------------------------------------------------------------------------------
+
+from threading import Condition, Lock
+from falcon import Request, Response, HTTPBadRequest, HTTPServiceUnavailable
+from config import Config
+from shr import log_request
+
+MJPEG_BOUNDARY = 'liveviewframe'
+
+class LatestFrame:
+    """The most recent live view frame, latest frame wins
+
+    The live view loop puts every frame it pulls and never waits. Readers
+    always get the newest frame, so a slow reader skips frames instead of
+    holding up the camera, and all readers share one pull from the USB
+    pipe. Frames are immutable ``bytes``, a reader keeps its frame
+    however many have been put since.
+    """
+    def __init__(self):
+        self._frame = None
+        self._seq = 0                   # Frames put so far
+        self._cond = Condition()
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    def put(self, frame: bytes):
+        with self._cond:
+            self._frame = frame
+            self._seq += 1
+            self._cond.notify_all()
+
+    def wait(self, after: int, timeout: float) -> tuple:
+        """Wait for a frame newer than sequence number ``after``
+
+        Returns ``(seq, frame)`` for the newest frame, or ``(after, None)``
+        if there was none within ``timeout`` seconds.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > after, timeout):
+                return after, None
+            return self._seq, self._frame
+
+    def clear(self):
+        with self._cond:
+            self._frame = None
+
+class MJPEGStream:
+    """WSGI body: live view frames as multipart/x-mixed-replace JPEG parts
+
+    Ends when no frame has come for ``Config.liveview_timeout`` seconds
+    (camera busy exposing or disconnected). ``close()``, called by the
+    WSGI server however the response ends, tells the engine this client
+    is gone, and gives back the viewer slot.
+    """
+    def __init__(self, engine, release):
+        self._engine = engine
+        self._release = release
+        self._closed = False
+        self._sent = 0
+        self._skipped = 0
+
+    def __iter__(self):
+        latest = self._engine.liveview
+        seq = latest.seq                            # Only frames from now on
+        while not self._closed:
+            newest, frame = latest.wait(seq, Config.liveview_timeout)
+            if frame is None:
+                return
+            self._skipped += newest - seq - 1 if self._sent else 0
+            seq = newest
+            self._sent += 1
+            yield b''.join((b'--%s\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n'
+                            % (MJPEG_BOUNDARY.encode(), len(frame)), frame, b'\r\n'))
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._release()
+        self._engine.logger.info(f'Live view client done, {self._sent} frames sent, '
+                                 f'{self._skipped} skipped')
+        try:
+            self._engine.command_nowait('stop_liveview')
+        except Exception as ex:
+            self._engine.logger.warning(f'Live view stop failed: {type(ex).__name__}: {ex}')
+
+class mjpeg:
+    """GET /api/v1/camera/{devnum}/liveview: the live view as an MJPEG stream
+
+    Browsers show it in an ``<img>`` tag. Each viewer holds one of the
+    ``Config.max_workers`` request slots for as long as it watches, so
+    viewers (of all cameras together) are capped at
+    ``Config.liveview_max_viewers``, and always leave a slot for Alpaca
+    clients. One more gets 503.
+    """
+    def __init__(self, engines: list):
+        self._engines = engines         # Indexed by device number
+        self._max_viewers = max(0, min(Config.liveview_max_viewers, Config.max_workers - 1))
+        self._viewers = 0
+        self._lock = Lock()
+
+    def _take_viewer(self) -> bool:
+        with self._lock:
+            if self._viewers >= self._max_viewers:
+                return False
+            self._viewers += 1
+            return True
+
+    def _release_viewer(self):
+        with self._lock:
+            self._viewers -= 1
+
+    def on_get(self, req: Request, resp: Response, devnum: int):
+        log_request(req)
+        if devnum >= len(self._engines):
+            raise HTTPBadRequest(title='Bad Alpaca Request',
+                                 description=f'Device number {devnum} does not exist.')
+        engine = self._engines[devnum]
+        if not engine.connected:
+            raise HTTPServiceUnavailable(title='Camera not connected',
+                                         description='Connect the camera to start live view.')
+        if not self._take_viewer():
+            raise HTTPServiceUnavailable(title='Too many live view viewers',
+                                         description=f'Live view is limited to {self._max_viewers} '
+                                                     'viewers at a time.', retry_after=5)
+        try:
+            engine.command('start_liveview')
+        except:
+            self._release_viewer()
+            raise
+        resp.content_type = f'multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}'
+        resp.cache_control = ('no-cache',)
+        resp.stream = MJPEGStream(engine, self._release_viewer)
@@ -37,14 +37,82 @@
 # 08-Nov-2023   rbd 0.4 Log name is now 'alpyca'
 # 17-Feb-2024   rbd 0.6 Additional documentation.
 
+import atexit
 import logging
 import logging.handlers
+import queue
+import reprlib
 import time
 from config import Config
 
 global logger
 #logger: logging.Logger = None  # Master copy (root) of the logger
 logger = None                   # Safe on Python 3.7 but no intellisense in VSCode etc.
+listener: logging.handlers.QueueListener = None     # The background log writer
+
+# ---------------------------------------------------------------
+# Lazy value summary for the log. Nothing is stringified until the
+# background writer formats the record, and then only a bounded
+# amount: arrays by shape and type, anything else by a truncated
+# repr (Config.log_value_max characters).
+# ---------------------------------------------------------------
+_repr = reprlib.Repr()
+_repr.maxstring = _repr.maxother = 80
+_repr.maxlist = _repr.maxtuple = _repr.maxdict = 16
+
+class brief:
+    """Wrap a value for logging, it is summarized only when written"""
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self) -> str:
+        v = self.value
+        if hasattr(v, 'shape') and hasattr(v, 'dtype'):
+            return f'<array {v.shape} {v.dtype}>'
+        s = v if isinstance(v, str) else _repr.repr(v)
+        if len(s) > Config.log_value_max:
+            s = s[:Config.log_value_max] + f'... ({len(s)} chars)'
+        return s
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that never blocks or formats in the caller's thread
+
+    Records go onto a bounded queue as they are, message and args not
+    yet merged, so all formatting is done by the writer thread. If the
+    writer falls behind and the queue is full, records are dropped and
+    counted, and the count is logged once there is room again.
+    """
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:                 # Render now, the frames go away
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            if self.dropped:
+                note = logging.makeLogRecord({'levelno': logging.WARNING, 'levelname': 'WARNING',
+                                              'msg': f'{self.dropped} log records dropped, the log writer fell behind'})
+                self.queue.put_nowait(note)
+                self.dropped = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class DeviceLogger(logging.LoggerAdapter):
+    """Logger prefixing every message with a device's name, for multi-camera logs"""
+    def __init__(self, logger: logging.Logger, name: str):
+        super().__init__(logger, {})
+        self.prefix = f'[{name}] '
+
+    def process(self, msg, kwargs):
+        return self.prefix + str(msg), kwargs
 
 def init_logging():
     """ Create the logger - called at app startup
@@ -58,6 +126,11 @@ def init_logging():
         the default stdout handler. Thank heaven that Python logging is
         thread-safe!
 
+        The stdout and file handlers are not attached to the logger itself.
+        They sit behind a :py:class:`BoundedQueueHandler` and are run by a
+        ``QueueListener`` thread, so a request thread never waits for the
+        disk or the console, and never formats a log message.
+
         This logger is passed around throughout the app and may be used
         throughout, even the device control. The :py:class:`config.Config` class
         has options to control the number of back generations of logs to keep,
@@ -70,6 +143,7 @@ def init_logging():
 
     """
 
+    global listener
     logging.basicConfig(level=Config.log_level)
     logger = logging.getLogger()                # Root logger, see above
     formatter = logging.Formatter('%(asctime)s.%(msecs)03d %(levelname)s %(message)s', '%Y-%m-%dT%H:%M:%S')
@@ -84,14 +158,24 @@ def init_logging():
     handler.setLevel(Config.log_level)
     handler.setFormatter(formatter)
     handler.doRollover()                                            # Always start with fresh log
-    logger.addHandler(handler)
+    handlers = [handler]
+    if Config.log_to_stdout:
+        handlers.insert(0, logger.handlers[0])  # The stdout handler
+    # The logger itself only queues, the handlers run on the listener thread
+    for h in list(logger.handlers):
+        logger.removeHandler(h)
+    log_queue = queue.Queue(maxsize=Config.log_queue_size)
+    logger.addHandler(BoundedQueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(stop_logging)
     if not Config.log_to_stdout:
-        """
-            This allows control of logging to stdout by simply
-            removing the stdout handler from the logger's
-            handler list. It's always handler[0] as created
-            by logging.basicConfig()
-        """
         logger.debug('Logging to stdout disabled in settings')
-        logger.removeHandler(logger.handlers[0])    # This is the stdout handler
-    return logger
\ No newline at end of file
+    return logger
+
+def stop_logging():
+    """Write out what is still queued and stop the writer thread"""
+    global listener
+    if not listener is None:
+        listener.stop()
+        listener = None
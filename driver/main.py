@@ -45,16 +45,20 @@
 # SOFTWARE.
 # -----------------------------------------------------------------------------
 #
+import startup                  # First, it notes the start time
+import sys
 import asyncio
+import threading
 import discovery
 import exceptions
 import shr
 import log
 from config import Config
-from discovery import DiscoveryResponder
 import camera
+import management
 import app
 import argparse
+startup.mark('imports')
 
 # ===========
 # APP STARTUP
@@ -62,12 +66,15 @@ import argparse
 async def main():
 
     logger = log.init_logging()
+    startup.mark('logging')
     # Share this logger throughout
     log.logger = logger
     exceptions.logger = logger
     discovery.logger = logger
     camera.logger = logger
+    management.logger = logger
     shr.logger = logger
+    sys.excepthook = app.custom_excepthook      # Last-chance handler, logs to our log file
 
 
     # Output performance data log headers if enabled
@@ -89,21 +96,26 @@ async def main():
 
     # Initialize the ASCOM devices
     camera.start_fujifilm(logger)
+    startup.mark('devices')
 
-    # Create a separate thread for ASCOM Discovery
-    _DSC = DiscoveryResponder(Config.alpaca_ip_address, Config.alpaca_port)
+    # ASCOM Discovery, answered right here in the event loop
+    discovery_transports = await discovery.start_discovery(Config.ip_address, Config.port)
+    startup.mark('discovery')
+
+    def listening():
+        startup.mark('http')
+        startup.report(logger)
+        threading.Thread(target=startup.preload, args=(logger,), name='Preload', daemon=True).start()
 
-    # Create a native stellarium telescope service
-    if Config.stellarium_telescope_port > 0:
-        await stellarium.stellarium_telescope(logger, 
-                                              Config.stellarium_telescope_ip_address, 
-                                              Config.stellarium_telescope_port)
-    
     tasks = [
-            app.alpaca_httpd(logger),
-            telescope.polaris.client(logger)
+            app.alpaca_httpd(logger, listening),
+            *[cam.client() for cam in camera.cameras]
     ]
-    await asyncio.gather(*tasks)
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for transport in discovery_transports:
+            transport.close()
 
     logger.info(f'==SHUTDOWN== Time stamps are UTC.')
 
@@ -113,7 +125,7 @@ async def main():
 # ==================================================================
 if __name__ == '__main__':
 
-    parser = argparse.ArgumentParser(description="Alpaca Benro Polaris Driver.")
+    parser = argparse.ArgumentParser(description="Alpaca Fujifilm camera driver.")
 
     # Add the arguments
     parser.add_argument('--lat', type=float, help='Site Latitude in decimal degrees')
@@ -42,12 +42,14 @@
 # 23-May-2023   rbd 0.2 Refactoring for  multiple ASCOM device type support
 #               GitHub issue #1
 #
-from falcon import Request, Response
-from shr import PropertyResponse, DeviceMetadata
+import datetime
+from falcon import Request, Response, HTTPBadRequest, HTTPConflict, HTTPNotFound, HTTP_202
+import profiler
+from shr import PropertyResponse, DeviceMetadata, get_request_field, dumps
 from config import Config
 from logging import Logger
 # For each *type* of device served
-from camera import CameraMetadata
+from camera import CameraMetadata, maxdev, device_name, unique_id
 
 logger: Logger = None
 #logger = None                   # Safe on Python 3.7 but no intellisense in VSCode etc.
@@ -77,17 +79,63 @@ class description:
             }
         resp.text = PropertyResponse(desc, req).json
 
+# ------------------------------------------------------------
+# Sampling Profiler (all threads), not part of the Alpaca API
+# ------------------------------------------------------------
+class profile:
+    """Sample every thread in the background, for flamegraph.pl or speedscope
+
+    PUT ``Duration=<seconds>`` starts a profile and answers 202 with its
+    Id (and a Location to GET). GET ``?Id=<id>`` answers 202 while it is
+    still sampling, then the collapsed stacks. No HTTP worker waits for
+    the profile meanwhile. Only the latest profile is kept.
+    """
+    def on_put(self, req: Request, resp: Response):
+        try:
+            duration = float(get_request_field('Duration', req, True, Config.profile_seconds))
+        except ValueError:
+            raise HTTPBadRequest(title='Bad Duration', description='Duration must be a number of seconds')
+        if not 0.1 <= duration <= Config.profile_max_seconds:
+            raise HTTPBadRequest(title='Bad Duration',
+                                 description=f'Duration must be 0.1 to {Config.profile_max_seconds} sec')
+        try:
+            job = profiler.start(duration, Config.profile_interval_ms / 1000)
+        except RuntimeError as ex:
+            raise HTTPConflict(title='Profiler busy', description=str(ex))
+        logger.info(f'==PROFILE== {job.id} sampling all threads for {duration} sec')
+        resp.status = HTTP_202
+        resp.location = f'{req.path}?Id={job.id}'
+        resp.text = dumps({'Id': job.id, 'Duration': duration})
+
+    def on_get(self, req: Request, resp: Response):
+        profile_id = req.get_param_as_int('Id', required=True)
+        job = profiler.find(profile_id)
+        if job is None:
+            raise HTTPNotFound(title='No such profile',
+                               description=f'Profile {profile_id} is not the latest one')
+        if not job.done:
+            resp.status = HTTP_202
+            resp.retry_after = max(1, round(job.duration))
+            resp.text = dumps({'Id': job.id, 'Duration': job.duration, 'Done': False})
+            return
+        logger.info(f'==PROFILE== {job.id}: {job.samples} samples, {len(job.stacks)} distinct stacks')
+        stamp = datetime.datetime.utcnow().strftime('%Y%m%dT%H%M%S')
+        resp.content_type = 'text/plain; charset=utf-8'
+        resp.downloadable_as = f'alpaca-profile-{stamp}.folded'
+        resp.text = profiler.collapsed(job.stacks)
+
 # -----------------
 # ConfiguredDevices
 # -----------------
 class configureddevices():
     def on_get(self, req: Request, resp: Response):
-        confarray = [    # TODO ADD ONE FOR EACH DEVICE TYPE AND INSTANCE SERVED
+        confarray = [    # One for each camera served
             {
-            'DeviceName'    : RotatorMetadata.Name,
-            'DeviceType'    : RotatorMetadata.DeviceType,
-            'DeviceNumber'  : 0,
-            'UniqueID'      : RotatorMetadata.DeviceID
+            'DeviceName'    : device_name(devnum),
+            'DeviceType'    : CameraMetadata.DeviceType,
+            'DeviceNumber'  : devnum,
+            'UniqueID'      : unique_id(devnum)
             }
+            for devnum in range(maxdev + 1)
         ]
         resp.text = PropertyResponse(confarray, req).json
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# metrics.py - Prometheus style metrics for the driver hot paths
+# -----------------------------------------------------------------------------
+#
+# ASCOM Camera driver for Fujifilm Mirrorless Camera
+#
+# Description:	Implements ASCOM driver for Fujifilm Mirrorless camera.
+#				Communicates using USB connection.
+#
+# Implements:	ASCOM Standard iCamera V4 interface
+# Author:		(2025) Tony Veinberg <tony.veinberg@gmail.com>
+#
+# Python Compatibility: Requires Python 3.7 or later
+# GitHub: https://github.com/tonyveinberg/alpaca-fujifilm-cameras
+#
+# ---------------------------------------------------------------------------------
+# MIT License
+#
+# Copyright (c) 2024
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# ----------------------------------------------------------------------------------
+
+
+import time
+import threading
+import weakref
+from bisect import bisect_left
+from falcon import Request, Response
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Upper bounds (seconds), an +Inf bucket is always added
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+
+_registry = []                  # Every metric, in the order exposed
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _label_text(names: tuple, values: tuple, extra: str = '') -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class _Sharded:
+    """Base of the metrics updated on the hot paths
+
+    Each thread updates its own shard (a dict keyed by label values),
+    so an update is a couple of dict operations under the GIL and never
+    waits on a lock. The lock is only taken when a thread makes its
+    first update, when the shards are summed for a scrape, and when a
+    thread ends and its shard is folded into ``_retired`` (connections
+    each have a thread, so shards must not outlive them).
+    """
+    kind = ''
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = {}               # id -> shard of each live thread
+        self._retired = {}              # Sum of the shards of threads gone
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.holder.shard
+        except AttributeError:
+            holder = self._local.holder = _ShardHolder()
+            with self._lock:
+                self._shards[id(holder.shard)] = holder.shard
+            # The thread's locals go when it ends, and its shard with them
+            weakref.finalize(holder, self._retire, holder.shard)
+            return holder.shard
+
+    def _retire(self, shard: dict):
+        with self._lock:
+            del self._shards[id(shard)]
+            self._fold(self._retired, shard)
+
+    def _fold(self, total: dict, shard: dict):
+        for labels, value in list(shard.items()):
+            total[labels] = self._add(total.get(labels), value)
+
+    def _add(self, a, b):
+        raise NotImplementedError
+
+    def _merged(self) -> dict:
+        total = {}
+        with self._lock:
+            shards = list(self._shards.values())
+            self._fold(total, self._retired)
+        for shard in shards:
+            self._fold(total, shard)
+        return total
+
+    def exposition(self) -> list:
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+class _ShardHolder:
+    """A thread's shard, in an object that can be watched for the thread ending"""
+    __slots__ = ('shard', '__weakref__')
+
+    def __init__(self):
+        self.shard = {}
+
+class Counter(_Sharded):
+    kind = 'counter'
+
+    def _add(self, a, b):
+        return b if a is None else a + b
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def exposition(self) -> list:
+        lines = _Sharded.exposition(self)
+        for labels, value in self._merged().items():
+            lines.append(f'{self.name}{_label_text(self.labelnames, labels)} {value}')
+        return lines
+
+class Histogram(_Sharded):
+    """Observations counted into ``buckets`` (upper bounds), with their sum"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = REQUEST_BUCKETS):
+        _Sharded.__init__(self, name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _add(self, a, b):
+        return list(b) if a is None else [x + y for x, y in zip(a, b)]
+
+    def observe(self, value: float, labels: tuple = ()):
+        shard = self._shard()
+        row = shard.get(labels)
+        if row is None:
+            row = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        row[bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def exposition(self) -> list:
+        lines = _Sharded.exposition(self)
+        merged = self._merged()
+        for labels, row in merged.items():
+            count = 0
+            for bound, n in zip(self.buckets + ('+Inf',), row):
+                count += n
+                le = 'le="%s"' % bound
+                lines.append(f'{self.name}_bucket{_label_text(self.labelnames, labels, le)} {count}')
+            lines.append(f'{self.name}_sum{_label_text(self.labelnames, labels)} {row[-1]}')
+            lines.append(f'{self.name}_count{_label_text(self.labelnames, labels)} {count}')
+        return lines
+
+class Sampled:
+    """A gauge (or counter kept elsewhere) read only when scraped
+
+    ``collect()`` returns (label values, value) pairs, so the code it
+    reads from pays nothing between scrapes.
+    """
+    def __init__(self, name: str, help: str, labelnames: tuple, collect, kind: str = 'gauge'):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+        self.kind = kind
+        _registry.append(self)
+
+    def exposition(self) -> list:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        for labels, value in self.collect():
+            lines.append(f'{self.name}{_label_text(self.labelnames, labels)} {value}')
+        return lines
+
+def exposition() -> str:
+    """Every metric in the Prometheus text format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.exposition())
+    return '\n'.join(lines) + '\n'
+
+# ------------------------
+# Metrics of the HTTP side
+# ------------------------
+REQUESTS = Counter('alpaca_requests_total', 'HTTP requests by route, method and status code',
+                   ('route', 'method', 'code'))
+REQUEST_SECONDS = Histogram('alpaca_request_duration_seconds',
+                            'HTTP request time until the last body byte is written', ('route', 'method'))
+SERIALIZE_SECONDS = Histogram('alpaca_serialize_seconds', 'Time to build and stream out an ImageArray response body',
+                              ('format',))
+# Device engine stages: exposure, download, decode, spool, save
+STAGE_SECONDS = Histogram('alpaca_stage_seconds', 'Frame pipeline stage time', ('camera', 'stage'),
+                          STAGE_BUCKETS)
+USB_BYTES = Counter('alpaca_usb_bytes_total', 'Image bytes downloaded from the camera', ('camera',))
+
+class TimedBody:
+    """A streamed response body that calls ``done()`` once it has been sent
+    (or given up on), when the server closes it"""
+    __slots__ = ('_body', '_done')
+
+    def __init__(self, body, done):
+        self._body = body
+        self._done = done
+
+    def __iter__(self):
+        return iter(self._body)
+
+    def close(self):
+        try:
+            if hasattr(self._body, 'close'):
+                self._body.close()
+        finally:
+            done, self._done = self._done, None
+            if not done is None:
+                done()
+
+class RequestMetrics:
+    """Falcon middleware counting and timing every request by route,
+    the responder class name as routed by :py:func:`app.init_routes`"""
+
+    def process_request(self, req: Request, resp: Response):
+        req.context.metrics_t0 = time.perf_counter()
+
+    def process_response(self, req: Request, resp: Response, resource, req_succeeded: bool):
+        route = 'unrouted' if resource is None else type(resource).__name__
+        t0 = req.context.metrics_t0
+        REQUESTS.inc((route, req.method, resp.status_code))
+        def done():
+            REQUEST_SECONDS.observe(time.perf_counter() - t0, (route, req.method))
+        if resp.stream is None:
+            done()
+        else:
+            resp.stream = TimedBody(resp.stream, done)
+
+class metrics:
+    """GET /metrics, for Prometheus to scrape"""
+    def on_get(self, req: Request, resp: Response):
+        resp.content_type = CONTENT_TYPE
+        resp.text = exposition()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# profiler.py - Sampling profiler across all driver threads
+# -----------------------------------------------------------------------------
+#
+# ASCOM Camera driver for Fujifilm Mirrorless Camera
+#
+# Description:	Implements ASCOM driver for Fujifilm Mirrorless camera.
+#				Communicates using USB connection.
+#
+# Implements:	ASCOM Standard iCamera V4 interface
+# Author:		(2025) Tony Veinberg <tony.veinberg@gmail.com>
+#
+# Python Compatibility: Requires Python 3.7 or later
+# GitHub: https://github.com/tonyveinberg/alpaca-fujifilm-cameras
+#
+# ---------------------------------------------------------------------------------
+# MIT License
+#
+# Copyright (c) 2024
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# ----------------------------------------------------------------------------------
+
+
+import os
+import sys
+import time
+import threading
+from collections import Counter
+
+_busy = threading.Lock()                # One profile at a time
+_lock = threading.Lock()
+_last: 'Profile' = None                 # The latest profile started
+_next_id = 1
+
+def _frame_name(code) -> str:
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+class Profile:
+    """A profile sampling on a thread of its own, see :py:func:`start`"""
+    def __init__(self, id: int, duration: float, interval: float):
+        self.id = id
+        self.duration = duration
+        self.stacks: Counter = None     # Set when done
+        self.samples = 0
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(duration, interval),
+                                        name=f'Profile-{id}', daemon=True)
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def _run(self, duration: float, interval: float):
+        try:
+            self.stacks, self.samples = sample(duration, interval)
+        finally:
+            self._done.set()
+            _busy.release()
+
+def start(duration: float, interval: float) -> Profile:
+    """Start sampling every thread for ``duration`` seconds in the
+    background and return the running :py:class:`Profile`. Raises
+    RuntimeError if a profile is already running."""
+    global _last, _next_id
+    if not _busy.acquire(blocking=False):
+        raise RuntimeError('A profile is already running')
+    with _lock:
+        _last = Profile(_next_id, duration, interval)
+        _next_id += 1
+    _last._thread.start()
+    return _last
+
+def find(id: int) -> Profile:
+    """The profile with this id if it is the latest one, else None"""
+    last = _last
+    return last if not last is None and last.id == id else None
+
+def sample(duration: float, interval: float) -> tuple:
+    """Sample every thread's stack each ``interval`` seconds for ``duration``
+
+    Returns (Counter of collapsed stack -> samples, number of samples).
+    Each stack is ``thread;outermost;...;innermost``, wall clock, so a
+    thread waiting (on a socket, a queue, the camera) shows where it
+    waits. Blocks for ``duration``, :py:func:`start` runs it in the
+    background, one at a time.
+    """
+    me = threading.get_ident()
+    stacks = Counter()
+    names = {}
+    samples = 0
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        frames = sys._current_frames()
+        if len(names) < len(frames):                # A thread has started
+            names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in frames.items():
+            if ident == me:
+                continue
+            stack = []
+            while not frame is None:
+                stack.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(ident, f'thread-{ident}'))
+            stacks[';'.join(reversed(stack))] += 1
+        del frames, frame
+        samples += 1
+        time.sleep(interval)
+    return stacks, samples
+
+def collapsed(stacks: Counter) -> str:
+    """Stacks in the collapsed format of flamegraph.pl and speedscope"""
+    return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
@@ -0,0 +1,395 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# ptp.py - PTP (ISO 15740) transaction layer for Fujifilm cameras
+# -----------------------------------------------------------------------------
+#
+# ASCOM Camera driver for Fujifilm Mirrorless Camera
+#
+# Description:	Implements ASCOM driver for Fujifilm Mirrorless camera.
+#				Communicates using USB connection.
+#
+# Implements:	ASCOM Standard iCamera V4 interface
+# Author:		(2025) Tony Veinberg <tony.veinberg@gmail.com>
+#
+# Python Compatibility: Requires Python 3.7 or later
+# GitHub: https://github.com/tonyveinberg/alpaca-fujifilm-cameras
+#
+# ---------------------------------------------------------------------------------
+# MIT License
+#
+# Copyright (c) 2024
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# ----------------------------------------------------------------------------------
+
+import struct
+from collections import namedtuple, deque
+
+# ---------------
+# Container types
+# ---------------
+CONTAINER_COMMAND   = 1
+CONTAINER_DATA      = 2
+CONTAINER_RESPONSE  = 3
+CONTAINER_EVENT     = 4
+
+# -----------------------
+# Operation codes (PTP 1.1)
+# -----------------------
+OC_GET_DEVICE_INFO          = 0x1001
+OC_OPEN_SESSION             = 0x1002
+OC_CLOSE_SESSION            = 0x1003
+OC_GET_OBJECT_INFO          = 0x1008
+OC_GET_OBJECT               = 0x1009
+OC_DELETE_OBJECT            = 0x100B
+OC_GET_DEVICE_PROP_VALUE    = 0x1015
+OC_SET_DEVICE_PROP_VALUE    = 0x1016
+OC_TERMINATE_OPEN_CAPTURE   = 0x1018
+OC_GET_PARTIAL_OBJECT       = 0x101B
+OC_INITIATE_OPEN_CAPTURE    = 0x101C
+
+# --------------
+# Response codes
+# --------------
+RC_OK                       = 0x2001
+RC_GENERAL_ERROR            = 0x2002
+RC_SESSION_NOT_OPEN         = 0x2003
+RC_OPERATION_NOT_SUPPORTED  = 0x2005
+RC_DEVICE_BUSY              = 0x2019
+RC_SESSION_ALREADY_OPEN     = 0x201E
+
+# -----------
+# Event codes
+# -----------
+EC_OBJECT_ADDED             = 0x4002
+EC_DEVICE_PROP_CHANGED      = 0x4006
+EC_CAPTURE_COMPLETE         = 0x400D
+
+# ---------------------------------------------------------
+# Device property codes (standard PTP, Fujifilm honors these)
+# ---------------------------------------------------------
+DPC_BATTERY_LEVEL           = 0x5001
+DPC_EXPOSURE_TIME           = 0x500D    # UINT32, units of 0.1 ms
+DPC_EXPOSURE_INDEX          = 0x500F    # UINT16, ISO
+
+# ------------------------------------------------------------
+# Fujifilm live view: GetObject on this pseudo-handle answers
+# the current viewfinder frame as a JPEG (about 640x480)
+# ------------------------------------------------------------
+LIVEVIEW_HANDLE             = 0x80000001
+
+# length, type, code, transaction ID
+_header = struct.Struct('<IHHI')
+
+DeviceInfo = namedtuple('DeviceInfo', 'manufacturer model version serial')
+ObjectInfo = namedtuple('ObjectInfo', 'storage format size filename')
+
+class PTPError(Exception):
+    """PTP operation answered with a response code other than OK"""
+    def __init__(self, opcode: int, rcode: int):
+        self.opcode = opcode
+        self.rcode = rcode
+        super().__init__(f'PTP operation {opcode:#06x} failed with response {rcode:#06x}')
+
+# -------------------------------
+# PTP dataset (payload) unpacking
+# -------------------------------
+def unpack_string(buf, pos: int):
+    """Unpack a PTP string (count byte then UCS-2), return (str, new pos)"""
+    n = buf[pos]
+    pos += 1
+    if n == 0:
+        return '', pos
+    s = bytes(buf[pos:pos + 2 * n]).decode('utf-16-le').rstrip('\0')
+    return s, pos + 2 * n
+
+def pack_string(s: str) -> bytes:
+    """Pack a PTP string, null terminated"""
+    if not s:
+        return b'\0'
+    return bytes([len(s) + 1]) + (s + '\0').encode('utf-16-le')
+
+def skip_array(buf, pos: int, size: int) -> int:
+    """Skip a PTP array (UINT32 count then elements of size bytes)"""
+    n, = struct.unpack_from('<I', buf, pos)
+    return pos + 4 + n * size
+
+def pack_container(ctype: int, code: int, tid: int, params = (), payload: bytes = b'') -> bytes:
+    """Pack a complete PTP container: 12-byte header then params or payload"""
+    body = struct.pack(f'<{len(params)}I', *params) + payload
+    return _header.pack(_header.size + len(body), ctype, code, tid) + body
+
+def unpack_header(buf):
+    """Unpack a PTP container header, return (length, type, code, tid)"""
+    return _header.unpack_from(buf)
+
+HEADER_SIZE = _header.size
+
+# -----------
+# PTP Session
+# -----------
+class PTPSession:
+    """One PTP session over a camera transport
+
+    All calls block and are meant to be made from one thread (the
+    Fujifilm device engine's I/O thread), one transaction at a time.
+
+    The transport is any object with ``open()``, ``close()``,
+    ``write(data)``, ``read(size)`` (one bulk transfer of up to size
+    bytes), ``readinto(buffer)`` (bulk transfers straight into a
+    writable buffer, never past the end of the current container,
+    returns the bytes read) and ``read_event(timeout)`` (an event
+    container or None), e.g. :py:class:`~usbtransport.USBTransport`.
+    """
+    first_read = 0x10000                # Must be >= the bulk pipe's max packet size
+    max_zlp = 2                         # Empty transfers skipped in front of a container
+
+    def __init__(self, transport, session_id: int = 1):
+        self.transport = transport
+        self.session_id = session_id
+        self._tid = 0
+        self._events = deque(maxlen=32)     # Read but not yet asked for, oldest first
+        self.on_prop_changed = None         # Called with the property code of a DevicePropChanged event
+
+    def _next_tid(self) -> int:
+        self._tid = (self._tid + 1) & 0xFFFFFFFF or 1
+        return self._tid
+
+    def _read_first(self) -> bytes:
+        """The first transfer of the next container on the bulk in pipe
+
+        A container that is a whole number of max size packets long is
+        ended with a zero-length packet, which reads as an empty transfer
+        in front of the next container. Those are skipped.
+        """
+        for _ in range(self.max_zlp + 1):
+            first = self.transport.read(self.first_read)
+            if len(first) >= HEADER_SIZE:
+                return first
+            if first:
+                raise IOError(f'PTP container header cut short at {len(first)} bytes')
+        raise IOError('PTP bulk in pipe gave only empty transfers')
+
+    def _read_container(self):
+        """Read one complete container from the bulk in pipe
+
+        A bulk transfer never spans two containers, the camera ends each
+        with a short packet (or a zero-length one).
+        """
+        first = self._read_first()
+        length, ctype, code, tid = unpack_header(first)
+        if len(first) >= length:
+            return ctype, code, tid, first[HEADER_SIZE:length]
+        payload = bytearray(length - HEADER_SIZE)   # The rest lands in place
+        got = len(first) - HEADER_SIZE
+        payload[:got] = memoryview(first)[HEADER_SIZE:]
+        self._read_data(memoryview(payload)[got:])
+        return ctype, code, tid, payload
+
+    def _read_data(self, view: memoryview):
+        """Fill view from the rest of the current data container"""
+        got = 0
+        while got < len(view):
+            n = self.transport.readinto(view[got:])
+            if n == 0:
+                raise IOError(f'PTP data phase ended {len(view) - got} bytes short')
+            got += n
+
+    def _skip_data(self, first: bytes, length: int):
+        """Read and drop the rest of a data container, and its response,
+        so the pipe is ready for the next transaction"""
+        left = length - len(first)
+        scratch = memoryview(bytearray(min(max(left, 0), self.first_read)))
+        while left > 0:
+            n = self.transport.readinto(scratch[:left])
+            if n == 0:
+                break
+            left -= n
+        self._read_container()
+
+    def transaction(self, opcode: int, params = (), data: bytes = None):
+        """Run one PTP transaction, return (response params, data in)
+
+        Raises :py:class:`PTPError` if the response is not OK.
+        """
+        tid = self._next_tid()
+        self.transport.write(pack_container(CONTAINER_COMMAND, opcode, tid, params))
+        if not data is None:
+            self.transport.write(pack_container(CONTAINER_DATA, opcode, tid, (), data))
+        data_in = b''
+        ctype, code, rtid, payload = self._read_container()
+        if ctype == CONTAINER_DATA:
+            data_in = payload
+            ctype, code, rtid, payload = self._read_container()
+        if code != RC_OK:
+            raise PTPError(opcode, code)
+        nparams = len(payload) // 4
+        return struct.unpack(f'<{nparams}I', payload[:4 * nparams]), data_in
+
+    # -----------------
+    # Session operations
+    # -----------------
+    def open_session(self):
+        self._tid = 0
+        self.transport.write(pack_container(CONTAINER_COMMAND, OC_OPEN_SESSION, 0, (self.session_id,)))
+        ctype, code, tid, payload = self._read_container()
+        if code not in (RC_OK, RC_SESSION_ALREADY_OPEN):
+            raise PTPError(OC_OPEN_SESSION, code)
+
+    def close_session(self):
+        self.transaction(OC_CLOSE_SESSION)
+
+    def get_device_info(self) -> DeviceInfo:
+        params, buf = self.transaction(OC_GET_DEVICE_INFO)
+        pos = 8                                     # StandardVersion, VendorExtensionID, VendorExtensionVersion
+        _, pos = unpack_string(buf, pos)            # VendorExtensionDesc
+        pos += 2                                    # FunctionalMode
+        for _ in range(5):                          # Operations, Events, DeviceProps, CaptureFormats, ImageFormats
+            pos = skip_array(buf, pos, 2)
+        manufacturer, pos = unpack_string(buf, pos)
+        model, pos = unpack_string(buf, pos)
+        version, pos = unpack_string(buf, pos)
+        serial, pos = unpack_string(buf, pos)
+        return DeviceInfo(manufacturer, model, version, serial)
+
+    # --------------------
+    # Device properties
+    # --------------------
+    def get_prop(self, code: int, fmt: str):
+        """Read a device property, fmt is its struct format (e.g. 'H')"""
+        params, data = self.transaction(OC_GET_DEVICE_PROP_VALUE, (code,))
+        return struct.unpack_from(f'<{fmt}', data)[0]
+
+    def set_prop(self, code: int, value, fmt: str):
+        self.transaction(OC_SET_DEVICE_PROP_VALUE, (code,), struct.pack(f'<{fmt}', value))
+
+    # -------
+    # Capture
+    # -------
+    def initiate_open_capture(self) -> int:
+        """Open the shutter (bulb), return the transaction ID to terminate it with"""
+        self.transaction(OC_INITIATE_OPEN_CAPTURE, (0, 0))
+        return self._tid
+
+    def terminate_open_capture(self, tid: int):
+        self.transaction(OC_TERMINATE_OPEN_CAPTURE, (tid,))
+
+    def _take_event(self, buf) -> tuple:
+        """Dispatch DevicePropChanged, else return (code, params) or None"""
+        length, ctype, code, tid = unpack_header(buf)
+        if ctype != CONTAINER_EVENT:
+            return None
+        params = struct.unpack_from(f'<{(length - HEADER_SIZE) // 4}I', buf, HEADER_SIZE)
+        if code == EC_DEVICE_PROP_CHANGED:
+            if not self.on_prop_changed is None and params:
+                self.on_prop_changed(params[0])
+            return None
+        return code, params
+
+    def wait_event(self, code: int, timeout: float):
+        """Wait for the given event, return its params. Raises TimeoutError.
+
+        Events read earlier by :py:meth:`poll_events` count too.
+        """
+        for event in self._events:
+            if event[0] == code:
+                self._events.remove(event)
+                return event[1]
+        while True:
+            buf = self.transport.read_event(timeout)
+            if buf is None:
+                raise TimeoutError(f'No PTP event {code:#06x} within {timeout} sec')
+            event = self._take_event(buf)
+            if not event is None and event[0] == code:
+                return event[1]
+
+    def poll_events(self):
+        """Read the events already waiting, without blocking
+
+        DevicePropChanged goes to ``on_prop_changed``, anything else is
+        kept for :py:meth:`wait_event`.
+        """
+        while True:
+            buf = self.transport.read_event(0.001)
+            if buf is None:
+                return
+            event = self._take_event(buf)
+            if not event is None:
+                self._events.append(event)
+
+    # -------
+    # Objects
+    # -------
+    def get_object_info(self, handle: int) -> ObjectInfo:
+        params, buf = self.transaction(OC_GET_OBJECT_INFO, (handle,))
+        storage, fmt, _, size = struct.unpack_from('<IHHI', buf)
+        filename, _ = unpack_string(buf, 52)        # After the fixed-size fields
+        return ObjectInfo(storage, fmt, size, filename)
+
+    def get_object(self, handle: int) -> bytes:
+        params, data = self.transaction(OC_GET_OBJECT, (handle,))
+        return data
+
+    def _transaction_into(self, opcode: int, params, buffer) -> int:
+        """Run a transaction whose data phase goes straight into buffer, return its size
+
+        The transport reads the data phase into the buffer, there is no
+        intermediate copy of it. Raises ``ValueError`` if the data does
+        not fit the buffer (it is read and dropped).
+        """
+        tid = self._next_tid()
+        self.transport.write(pack_container(CONTAINER_COMMAND, opcode, tid, params))
+        first = self._read_first()
+        length, ctype, code, rtid = unpack_header(first)
+        if ctype != CONTAINER_DATA:
+            raise PTPError(opcode, code)
+        size = length - HEADER_SIZE
+        view = memoryview(buffer)
+        if size > len(view):
+            self._skip_data(first, length)
+            raise ValueError(f'PTP operation {opcode:#06x} sent {size} bytes, '
+                             f'more than the {len(view)} byte buffer')
+        got = min(len(first), length) - HEADER_SIZE
+        view[:got] = memoryview(first)[HEADER_SIZE:HEADER_SIZE + got]
+        self._read_data(view[got:size])
+        ctype, code, rtid, payload = self._read_container()
+        if code != RC_OK:
+            raise PTPError(opcode, code)
+        return size
+
+    def get_object_into(self, handle: int, buffer) -> int:
+        """GetObject straight into a writable buffer, return the object size"""
+        return self._transaction_into(OC_GET_OBJECT, (handle,), buffer)
+
+    def get_partial_object(self, handle: int, offset: int, size: int) -> bytes:
+        """Read size bytes of an object from offset, one transaction per chunk"""
+        params, data = self.transaction(OC_GET_PARTIAL_OBJECT, (handle, offset, size))
+        return data
+
+    def get_partial_object_into(self, handle: int, offset: int, size: int, buffer) -> int:
+        """GetPartialObject straight into a writable buffer, return the bytes read"""
+        return self._transaction_into(OC_GET_PARTIAL_OBJECT, (handle, offset, size), buffer)
+
+    def get_liveview(self) -> bytes:
+        """The current live view frame, a JPEG"""
+        return self.get_object(LIVEVIEW_HANDLE)
+
+    def delete_object(self, handle: int):
+        self.transaction(OC_DELETE_OBJECT, (handle, 0))
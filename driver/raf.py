@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# raf.py - Fujifilm RAF raw file parsing and decoding
+# -----------------------------------------------------------------------------
+#
+# ASCOM Camera driver for Fujifilm Mirrorless Camera
+#
+# Description:	Implements ASCOM driver for Fujifilm Mirrorless camera.
+#				Communicates using USB connection.
+#
+# Implements:	ASCOM Standard iCamera V4 interface
+# Author:		(2025) Tony Veinberg <tony.veinberg@gmail.com>
+#
+# Python Compatibility: Requires Python 3.7 or later
+# GitHub: https://github.com/tonyveinberg/alpaca-fujifilm-cameras
+#
+# ---------------------------------------------------------------------------------
+# MIT License
+#
+# Copyright (c) 2024
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# ----------------------------------------------------------------------------------
+
+import io
+import struct
+from collections import namedtuple
+import numpy as np
+
+RAF_MAGIC = b'FUJIFILMCCD-RAW '
+
+# Fixed RAF header, all big-endian. Offsets and lengths of the embedded
+# JPEG, the CFA header (tag records) and the CFA (raw sensor data).
+_raf_header = struct.Struct('>16s4s8s32s4s20sIIIIII')
+
+# CFA header record tags
+TAG_RAW_FULL_SIZE = 0x100       # height, width (UINT16 each)
+
+# The CFA block of a camera RAF is a small TIFF, its first IFD points to
+# the Fuji raw IFD which describes the sensor data
+TAG_FUJI_IFD = 0xF000
+TAG_BITS_PER_SAMPLE = 0xF003    # Sample depth, 12 or 14
+TAG_STRIP_OFFSET = 0xF007       # From the start of the CFA block
+TAG_STRIP_BYTES = 0xF008
+
+# data_offset: where the sensor data starts in the file. bits: sample
+# depth (0 if not recorded). compressed: not one little-endian UINT16
+# per sample (compressed, or 12/14-bit packed), it takes LibRaw.
+RAFInfo = namedtuple('RAFInfo', 'model width height cfa_offset cfa_length data_offset bits compressed')
+
+def parse(buf) -> RAFInfo:
+    """Parse the RAF header and CFA records, no pixel data is touched"""
+    (magic, _, _, model, _, _, _, _,
+        cfah_offset, _, cfa_offset, cfa_length) = _raf_header.unpack_from(buf)
+    if magic != RAF_MAGIC:
+        raise ValueError('Not a Fujifilm RAF file')
+    width = height = 0
+    count, = struct.unpack_from('>I', buf, cfah_offset)
+    pos = cfah_offset + 4
+    for _ in range(count):
+        tag, size = struct.unpack_from('>HH', buf, pos)
+        pos += 4
+        if tag == TAG_RAW_FULL_SIZE:
+            height, width = struct.unpack_from('>HH', buf, pos)
+        pos += size
+    if width == 0 or height == 0:
+        raise ValueError('RAF file has no raw image size record')
+    npix = width * height
+    raw_ifd = _raw_ifd(buf, cfa_offset, cfa_length)
+    if TAG_STRIP_OFFSET in raw_ifd and TAG_STRIP_BYTES in raw_ifd:
+        data_offset = cfa_offset + raw_ifd[TAG_STRIP_OFFSET]
+        data_length = raw_ifd[TAG_STRIP_BYTES]
+    else:                                       # No TIFF, 16-bit samples end the block
+        data_offset = cfa_offset + cfa_length - npix * 2
+        data_length = cfa_length
+    bits = raw_ifd.get(TAG_BITS_PER_SAMPLE, 0)
+    if bits > 16:
+        raise ValueError(f'RAF file has {bits}-bit samples')
+    return RAFInfo(model.rstrip(b'\0').decode('ascii', 'replace'), width, height,
+                   cfa_offset, cfa_length, data_offset, bits, data_length < npix * 2)
+
+def _raw_ifd(buf, base: int, length: int) -> dict:
+    """{tag: value} of the Fuji raw IFD in the TIFF starting the CFA
+    block at base, {} if there is none. Only single SHORT and LONG
+    values are read, offsets are from base."""
+    order = bytes(buf[base:base + 2])
+    if length < 8 or order not in (b'II', b'MM'):
+        return {}
+    endian = '<' if order == b'II' else '>'
+
+    def ifd(offset: int) -> dict:
+        if offset < 8 or offset + 2 > length:
+            return {}
+        count, = struct.unpack_from(endian + 'H', buf, base + offset)
+        if offset + 2 + count * 12 > length:
+            return {}
+        tags = {}
+        for i in range(count):
+            tag, ftype, n, value = struct.unpack_from(endian + 'HHII', buf, base + offset + 2 + i * 12)
+            if ftype == 3 and n == 1 and endian == '>':
+                value >>= 16                    # A SHORT sits in the first two bytes
+            elif ftype == 3 and n == 1:
+                value &= 0xFFFF
+            tags[tag] = value
+        return tags
+
+    first, = struct.unpack_from(endian + 'I', buf, base + 4)
+    fuji = ifd(first).get(TAG_FUJI_IFD)
+    return {} if fuji is None else ifd(fuji)
+
+def make(model: str, width: int, height: int, pixels) -> bytes:
+    """Build a minimal uncompressed RAF file around 16-bit pixel data
+
+    The pixels (width * height little-endian UINT16, row by row) become
+    the CFA block. Used by the camera simulator.
+    """
+    cfa_header = struct.pack('>IHHHH', 1, TAG_RAW_FULL_SIZE, 4, height, width)
+    cfah_offset = _raf_header.size
+    cfa_offset = cfah_offset + len(cfa_header)
+    header = _raf_header.pack(RAF_MAGIC, b'0201', b'', model.encode('ascii'), b'0100', b'',
+                              0, 0, cfah_offset, len(cfa_header), cfa_offset, len(pixels))
+    return b''.join((header, cfa_header, pixels))
+
+def decode(buf, out = None):
+    """Decode a RAF file to a UINT16 numpy array in ASCOM [x][y] order
+
+    Uncompressed RAFs with one 16-bit little-endian word per sample are
+    unpacked here with numpy. Compressed RAFs, and uncompressed ones with
+    12 or 14-bit packed samples, need the optional ``rawpy`` (LibRaw)
+    package. If ``out`` (a writable
+    buffer, big enough for the full frame) is given, the image is
+    written there instead of into a new array.
+    """
+    info = parse(buf)
+    if info.compressed:
+        return _decode_libraw(buf, out)
+    npix = info.width * info.height
+    raw = np.frombuffer(buf, dtype='<u2', count=npix, offset=info.data_offset).reshape(info.height, info.width)
+    return _transpose(raw, out)
+
+def _transpose(raw, out):
+    """Rows/cols to ASCOM [x][y], once"""
+    if out is None:
+        return np.ascontiguousarray(raw.T)
+    image = np.ndarray(raw.shape[::-1], dtype=np.uint16, buffer=out)
+    image[...] = raw.T
+    return image
+
+def _decode_libraw(buf, out):
+    try:
+        import rawpy
+    except ImportError:
+        raise ValueError('Compressed or packed RAF files need the rawpy package (pip install rawpy)')
+    with rawpy.imread(io.BytesIO(buf)) as raw:
+        return _transpose(raw.raw_image_visible, out)
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# sensors.py - Fujifilm sensor geometry by camera model
+# -----------------------------------------------------------------------------
+#
+# ASCOM Camera driver for Fujifilm Mirrorless Camera
+#
+# Description:	Implements ASCOM driver for Fujifilm Mirrorless camera.
+#				Communicates using USB connection.
+#
+# Implements:	ASCOM Standard iCamera V4 interface
+# Author:		(2025) Tony Veinberg <tony.veinberg@gmail.com>
+#
+# Python Compatibility: Requires Python 3.7 or later
+# GitHub: https://github.com/tonyveinberg/alpaca-fujifilm-cameras
+#
+# ---------------------------------------------------------------------------------
+# MIT License
+#
+# Copyright (c) 2024
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# ----------------------------------------------------------------------------------
+
+from collections import namedtuple
+
+Sensor = namedtuple('Sensor', 'width height pixel_size bits bayer iso_min')
+
+# ----------------------------------------------------------------
+# By the model name the camera reports in its PTP DeviceInfo:
+#   width, height   Raw sensor size (pixels)
+#   pixel_size      Pixel pitch (um)
+#   bits            Raw sample depth
+#   bayer           True for an RGGB Bayer CFA (GFX), False for the
+#                   6x6 X-Trans CFA, which ASCOM has no SensorType for
+#   iso_min         Lowest native ISO
+# ----------------------------------------------------------------
+SENSORS = {
+    'X-T5':         Sensor(7752, 5178, 3.03, 14, False, 125),
+    'X-H2':         Sensor(7752, 5178, 3.03, 14, False, 125),
+    'X-T4':         Sensor(6384, 4182, 3.76, 14, False, 160),
+    'X-S10':        Sensor(6384, 4182, 3.76, 14, False, 160),
+    'GFX100':       Sensor(11808, 8754, 3.76, 16, True, 100),
+    'GFX100S':      Sensor(11808, 8754, 3.76, 16, True, 100),
+    'GFX50S':       Sensor(8280, 6208, 5.30, 14, True, 100),
+    'TINY':         Sensor(640, 480, 3.76, 14, False, 160)  # Simulator, for quick functional tests
+}
+
+# Until the first frame tells the size of a model not in the table
+UNKNOWN = Sensor(0, 0, 0.0, 14, False, 100)
+
+# Native ISO settings (1/3 stops) offered as the ASCOM Gains
+ISO_STOPS = (100, 125, 160, 200, 250, 320, 400, 500, 640, 800, 1000, 1250, 1600,
+             2000, 2500, 3200, 4000, 5000, 6400, 8000, 10000, 12800)
+
+def lookup(model: str) -> Sensor:
+    """Sensor for a model name (case and blanks don't matter), or None"""
+    key = model.upper().replace(' ', '')
+    for name, sensor in SENSORS.items():
+        if name.replace(' ', '') == key:
+            return sensor
+    return None
+
+def iso_values(sensor: Sensor) -> list:
+    """The native ISO settings of a sensor, lowest first"""
+    return [iso for iso in ISO_STOPS if iso >= sensor.iso_min]
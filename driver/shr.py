@@ -64,11 +64,16 @@
 #               ClientTransactionID. Add missing keywords to some Falcon
 #               HTTPBadRequest exceptions to prevent deprecation warnings.
 
-from threading import Lock
+from threading import Lock, local
 from exceptions import Success
 import json
+import random
+import struct
+import time
 from falcon import Request, Response, HTTPBadRequest
 from logging import Logger
+from log import brief
+from config import Config
 
 logger: Logger = None
 #logger = None                   # Safe on Python 3.7 but no intellisense in VSCode etc.
@@ -101,6 +106,9 @@ class StateValue:
     def json(self) -> str:
         return json.dumps(self.__dict__)
 
+    def __repr__(self) -> str:
+        return f'{self.Name}={self.Value!r}'
+
 # ---------------
 # Data Validation
 # ---------------
@@ -111,6 +119,30 @@ def to_bool(str: str) -> bool:
         raise HTTPBadRequest(title=_bad_title, description=f'Bad boolean value "{val}"')
     return val == _bools[0]
 
+# ---------------------------------------------------------
+# Request parameters, indexed once per request. GET takes the
+# query string, PUT the body "form" data (parsed once by Falcon).
+# Both an exact-case and a lower-cased name index, so lookups are
+# plain dict hits. Built by PreProcessRequest, or on first use.
+# ---------------------------------------------------------
+class RequestFields:
+    """Parsed Alpaca request parameters with exact and caseless name indexes"""
+    __slots__ = ('exact', 'caseless')
+
+    def __init__(self, req: Request):
+        items = req.params.items() if req.method == 'GET' else req.get_media().items()
+        self.exact = dict(items)
+        self.caseless = {}
+        for name, value in self.exact.items():
+            self.caseless.setdefault(name.lower(), value)   # First one wins
+
+def request_fields(req: Request) -> RequestFields:
+    """The request's parameter index, built on first use"""
+    fields = getattr(req.context, 'alpaca_fields', None)
+    if fields is None:
+        fields = req.context.alpaca_fields = RequestFields(req)
+    return fields
+
 # ---------------------------------------------------------
 # Get parameter/field from query string or body "form" data
 # If default is missing then the field is required. Maybe the
@@ -119,39 +151,105 @@ def to_bool(str: str) -> bool:
 # caseless (mostly for the ClientID and ClientTransactionID)
 # ---------------------------------------------------------
 def get_request_field(name: str, req: Request, caseless: bool = False, default: str = None) -> str:
-    bad_desc = f'Missing, empty, or misspelled parameter "{name}"'
-    lcName = name.lower()
-    if req.method == 'GET':
-        for param in req.params.items():        # [name,value] tuples
-            if param[0].lower() == lcName:
-                return param[1]
+    fields = request_fields(req)
+    if req.method == 'GET':                     # Query names are always caseless
+        value = fields.caseless.get(name.lower())
+    elif caseless:                              # Assume PUT since we never route other methods
+        value = fields.caseless.get(name.lower())
+    else:
+        value = fields.exact.get(name)
+        if value == '':
+            value = None
+    if value is None:
         if default == None:
-            raise HTTPBadRequest(title=_bad_title, description=bad_desc)                # Missing or incorrect casing
+            raise HTTPBadRequest(title=_bad_title,
+                                 description=f'Missing, empty, or misspelled parameter "{name}"') # Missing or incorrect casing
         return default                          # not in args, return default
-    else:                                       # Assume PUT since we never route other methods
-        formdata = req.get_media()
-        if caseless:
-            for fn in formdata.keys():
-                if fn.lower() == lcName:
-                    return formdata[fn]
-        else:
-            if name in formdata and formdata[name] != '':
-                return formdata[name]
-        if default == None:
-            raise HTTPBadRequest(title=_bad_title, description=bad_desc)                # Missing or incorrect casing
-        return default
+    return value
 
 #
 # Log the request as soon as the resource handler gets it so subsequent
 # logged messages are in the right order. Logs PUT body as well.
 #
 def log_request(req: Request):
-    msg = f'{req.remote_addr} -> {req.method} {req.path}'
+    # Lazy %-args, the log writer thread formats them
     if req.query_string != '':
-        msg += f'?{req.query_string}'
-    logger.info(msg)
+        logger.info('%s -> %s %s?%s', req.remote_addr, req.method, req.path, brief(req.query_string))
+    else:
+        logger.info('%s -> %s %s', req.remote_addr, req.method, req.path)
     if req.method == 'PUT' and req.content_length != 0:
-        logger.info(f'{req.remote_addr} -> {req.media}')
+        logger.info('%s -> %s', req.remote_addr, brief(req.media))
+
+# -----------------
+# Request Tracing
+# -----------------
+TRACE_KEY = 'alpaca.trace'          # WSGI environ key of a request's RequestTrace
+_current = local()                  # The trace of the request this HTTP worker is on
+
+class RequestTrace:
+    """Phase timings of one device request
+
+    Started by :py:class:`PreProcessRequest`, which marks the parse,
+    log and validate phases. :py:class:`RequestTracing` ends the
+    responder phase and returns the phases so far as a ``Server-Timing``
+    header. The server ends the write phase when the body has gone out
+    (see ``app.KeepAliveServerHandler``). JSON serialization inside the
+    responder is timed separately, as the serialize phase. A sampled
+    (``trace_sample_rate``) or slow (``trace_slow_ms``) request has its
+    trace logged.
+    """
+    __slots__ = ('path', 't0', 'last', 'phases', 'serialize', 'sampled')
+
+    def __init__(self, req: Request):
+        self.path = req.path
+        self.t0 = self.last = time.perf_counter()
+        self.phases = {}                # Phase name -> seconds, in order
+        self.serialize = 0.0
+        self.sampled = Config.trace_sample_rate > 0 and random.random() < Config.trace_sample_rate
+
+    def mark(self, phase: str):
+        """End a phase, the next starts now"""
+        now = time.perf_counter()
+        self.phases[phase] = now - self.last
+        self.last = now
+
+    def responded(self) -> str:
+        """End the responder phase, return the Server-Timing header value"""
+        self.mark('responder')
+        self.phases['responder'] -= self.serialize
+        self.phases['serialize'] = self.serialize
+        return ', '.join(f'{name};dur={seconds * 1000:.3f}' for name, seconds in self.phases.items())
+
+    def finish(self):
+        """End the write phase, and log the trace if sampled or slow"""
+        self.mark('write')
+        total = (self.last - self.t0) * 1000
+        if self.sampled or (Config.trace_slow_ms and total >= Config.trace_slow_ms):
+            logger.info('==TRACE== %s %.3f ms %s', self.path, total,
+                        ' '.join(f'{name}={seconds * 1000:.3f}' for name, seconds in self.phases.items()))
+
+def dumps(obj, **kwargs) -> str:
+    """json.dumps, its time counted as serialization in the current request's trace"""
+    trace = getattr(_current, 'trace', None)
+    if trace is None:
+        return json.dumps(obj, **kwargs)
+    t0 = time.perf_counter()
+    text = json.dumps(obj, **kwargs)
+    trace.serialize += time.perf_counter() - t0
+    return text
+
+class RequestTracing:
+    """Falcon middleware ending the responder phase of traced requests
+    and adding their ``Server-Timing`` header"""
+
+    def process_response(self, req: Request, resp: Response, resource, req_succeeded: bool):
+        _current.trace = None
+        trace = req.env.get(TRACE_KEY)
+        if trace is None:
+            return
+        timing = trace.responded()
+        if Config.server_timing:
+            resp.set_header('Server-Timing', timing)
 
 # ------------------------------------------------
 # Incoming Pre-Logging and Request Quality Control
@@ -196,23 +294,24 @@ class PreProcessRequest():
             msg = f'Request has bad Alpaca ClientID value {test}'
             logger.error(msg)
             raise HTTPBadRequest(title=_bad_title, description=msg)
-        if test == '0':
-            req.params['ClientID'] = '0'                            # In case it's missing
         test: str = get_request_field('ClientTransactionID', req, True, '0') # Caseless, default = 0 if missing
         if not self._pos_or_zero(test):
             msg = f'Request has bad Alpaca ClientTransactionID value {test}'
             logger.error(msg)
             raise HTTPBadRequest(title=_bad_title, description=msg)
-        if test == '0':
-            req.params['ClientTransactionID'] = '0'                 # In case it's missing
 
     #
     # params contains {'devnum': n } from the URI template matcher
     # and format converter. This is the device number from the URI
     #
     def __call__(self, req: Request, resp: Response, resource, params):
+        trace = req.env[TRACE_KEY] = _current.trace = RequestTrace(req)
+        request_fields(req)                         # Parse and index the parameters once
+        trace.mark('parse')
         log_request(req)                            # Log even a bad request
+        trace.mark('log')
         self._check_request(req, params['devnum'])   # Raises to 400 error on check failure
+        trace.mark('validate')
 
 # ------------------
 # PropertyResponse
@@ -236,7 +335,7 @@ class PropertyResponse():
         self.ClientTransactionID = int(get_request_field('ClientTransactionID', req, False, 0))  #Caseless on GET
         if err.Number == 0 and not value is None:
             self.Value = value
-            logger.info(f'{req.remote_addr} <- {str(value)}')
+            logger.info('%s <- %s', req.remote_addr, brief(value))
         self.ErrorNumber = err.Number
         self.ErrorMessage = err.Message
 
@@ -245,7 +344,38 @@ class PropertyResponse():
         """Return the JSON for the Property Response"""
 #       # This trickery allows serializing the StateValue object into the JSON
         # https://stackoverflow.com/questions/3768895/how-to-make-a-class-json-serializable
-        return json.dumps(self, default=lambda o: o.__dict__)
+        return dumps(self, default=lambda o: o.__dict__)
+
+# ------------------------
+# StaticPropertyResponse
+# ------------------------
+class StaticPropertyResponse():
+    """Pre-serialized JSON response for a property that is fixed for the session
+
+    The value part is serialized once, here. Each request then only
+    splices in its transaction IDs, so polling these costs no JSON
+    encoding. The output is identical to :py:class:`PropertyResponse`.
+    """
+    def __init__(self, value):
+        """Initialize a ``StaticPropertyResponse`` object.
+
+        Args:
+            value:  The value of the property, a scalar, list or object
+        """
+        self.Value = value
+        self._logmsg = str(brief(value))
+        self._tail = json.dumps({'Value': value, 'ErrorNumber': 0, 'ErrorMessage': ''},
+                                default=lambda o: o.__dict__)[1:]
+
+    def text(self, req: Request) -> str:
+        """Return the JSON for one request
+
+        Notes:
+            * Bumps the ServerTransactionID value and returns it in sequence
+        """
+        ctid = int(get_request_field('ClientTransactionID', req, False, 0))
+        logger.info('%s <- %s', req.remote_addr, self._logmsg)
+        return f'{{"ServerTransactionID": {getNextTransId()}, "ClientTransactionID": {ctid}, {self._tail}'
 
 # --------------
 # MethodResponse
@@ -270,7 +400,7 @@ class MethodResponse():
         self.ClientTransactionID = int(get_request_field('ClientTransactionID', req, False, 0))
         if err.Number == 0 and not value is None:
             self.Value = value
-            logger.info(f'{req.remote_addr} <- {str(value)}')
+            logger.info('%s <- %s', req.remote_addr, brief(value))
         self.ErrorNumber = err.Number
         self.ErrorMessage = err.Message
 
@@ -279,8 +409,172 @@ class MethodResponse():
     def json(self) -> str:
         """Return the JSON for the Method Response"""
         # Simple scalars here so no need for fancy conversion
-        return json.dumps(self.__dict__)
+        return dumps(self.__dict__)
+
+
+# ---------------------------------------------
+# ImageArrayResponse (ImageBytes or legacy JSON)
+# ---------------------------------------------
+IMAGEBYTES_MIME = 'application/imagebytes'
+
+# ImageBytes metadata version 1: 11 little-endian 32-bit fields, 44 bytes
+_imagebytes_header = struct.Struct('<iiIIiiiiiii')
+
+# numpy dtype (kind + itemsize) to ASCOM ImageArrayElementTypes value
+_element_types = {
+    'i2': 1,    # Int16
+    'i4': 2,    # Int32
+    'f8': 3,    # Double
+    'f4': 4,    # Single
+    'u8': 5,    # UInt64
+    'u1': 6,    # Byte
+    'i8': 7,    # Int64
+    'u2': 8     # UInt16
+}
+
+def accepts_imagebytes(req: Request) -> bool:
+    """True if the client asked for ``application/imagebytes``
+
+    Only an explicit mention counts. Falcon's ``client_accepts()`` would
+    also say yes for ``*/*``, which every legacy JSON client sends.
+    """
+    return IMAGEBYTES_MIME in (req.get_header('Accept') or '').lower()
+
+class ImageArrayResponse():
+    """ImageBytes or JSON response for an Alpaca ImageArray (GET) Request"""
+    def __init__(self, image, req: Request, err = Success()):
+        """Initialize an ``ImageArrayResponse`` object.
+
+        Args:
+            image:  2D (mono) or 3D (color planes) numpy array in ASCOM order,
+                that is ``image[x][y]``, or None if there was an exception.
+            req: The Falcon Request property that was provided to the responder.
+            err: An Alpaca exception class as defined in the exceptions
+                or defaults to :py:class:`~exceptions.Success`
+
+        Notes:
+            * Bumps the ServerTransactionID value and returns it in sequence
+            * The image is never stringified for the log, only its shape.
+        """
+        self.ServerTransactionID = getNextTransId()
+        self.ClientTransactionID = int(get_request_field('ClientTransactionID', req, False, 0))
+        self.image = None
+        if err.Number == 0 and not image is None:
+            self.image = image
+            logger.info('%s <- image %s %s', req.remote_addr, image.shape, image.dtype)
+        self.ErrorNumber = err.Number
+        self.ErrorMessage = err.Message
+
+    @property
+    def imagebytes(self) -> bytes:
+        """Return the ImageBytes body: 44 byte header then the pixels
+
+        The pixel buffer is copied exactly once, straight from the numpy
+        array's memory into the response bytes. On error the data part
+        is the UTF-8 error message.
+        """
+        if self.image is None:
+            return self._error_imagebytes()
+        header, pixels = self._imagebytes_parts()
+        return b''.join((header, pixels))
+
+    def imagestream(self, chunk_size: int, release = None, shuffle: bool = False) -> 'ImageBytesStream':
+        """Return the ImageBytes body as a stream for ``resp.stream``
+
+        Args:
+            chunk_size: Bytes of pixels per chunk handed to the WSGI server
+            release: Called once when the server is done with the body,
+                sent or not, to give back the image's buffer.
+            shuffle: Byte-shuffle each chunk of pixels, see :py:class:`ImageBytesStream`
+        """
+        if self.image is None:
+            return ImageBytesStream(self._error_imagebytes(), memoryview(b''), chunk_size, release)
+        header, pixels = self._imagebytes_parts()
+        itemsize = self.image.dtype.itemsize if shuffle else 1
+        return ImageBytesStream(header, pixels, chunk_size, release, itemsize)
+
+    def _error_imagebytes(self) -> bytes:
+        return _imagebytes_header.pack(1, self.ErrorNumber,
+                    self.ClientTransactionID, self.ServerTransactionID,
+                    _imagebytes_header.size, 0, 0, 0, 0, 0, 0) + \
+                self.ErrorMessage.encode('utf-8')
+
+    def _imagebytes_parts(self) -> tuple:
+        """The ImageBytes header, and the pixels as a byte view of the image"""
+        img = self.image
+        if img.dtype.byteorder == '>' or not img.flags['C_CONTIGUOUS']:
+            img = img.astype(img.dtype.newbyteorder('<'), order='C')
+        ttype = _element_types[f'{img.dtype.kind}{img.dtype.itemsize}']
+        dims = list(img.shape) + [0] * (3 - img.ndim)
+        header = _imagebytes_header.pack(1, 0,
+                    self.ClientTransactionID, self.ServerTransactionID,
+                    _imagebytes_header.size,
+                    2,                                  # ImageArray is Int32 per ICamera
+                    ttype, img.ndim, *dims)
+        return header, memoryview(img).cast('B')
+
+    @property
+    def json(self) -> str:
+        """Return the legacy JSON for the ImageArray Response (slow, old clients only)"""
+        resp = {
+            'Type': 2,                                  # Int32
+            'Rank': 0 if self.image is None else self.image.ndim,
+            'ClientTransactionID': self.ClientTransactionID,
+            'ServerTransactionID': self.ServerTransactionID,
+            'ErrorNumber': self.ErrorNumber,
+            'ErrorMessage': self.ErrorMessage
+        }
+        if not self.image is None:
+            resp['Value'] = self.image.tolist()
+        return dumps(resp)
+
+class ImageBytesStream():
+    """WSGI body for ImageBytes: the header, then the pixels in chunks
+
+    Each chunk is copied out of the image as it is sent (the WSGI server
+    takes only ``bytes``), so the response never holds a second copy of
+    the whole frame and the first bytes go out at once. The server calls
+    ``close()`` when the response is finished or abandoned.
+
+    With ``itemsize`` > 1 each chunk is byte-shuffled: all first bytes of
+    its pixels, then all second bytes and so on. For 16-bit data that
+    puts the slowly varying high bytes together and helps compression.
+    The client undoes it chunk by chunk, every chunk but the last is
+    ``chunk_size`` bytes.
+    """
+    __slots__ = ('_header', '_pixels', '_chunk_size', '_release', '_itemsize')
+
+    def __init__(self, header: bytes, pixels: memoryview, chunk_size: int, release = None,
+                 itemsize: int = 1):
+        self._header = header
+        self._pixels = pixels
+        self._chunk_size = chunk_size - chunk_size % itemsize
+        self._release = release
+        self._itemsize = itemsize
+
+    @property
+    def chunk_size(self) -> int:
+        return self._chunk_size
+
+    def __len__(self) -> int:
+        """Content length in bytes"""
+        return len(self._header) + self._pixels.nbytes
+
+    def __iter__(self):
+        yield self._header
+        pixels = self._pixels
+        size = self._chunk_size
+        n = self._itemsize
+        for offset in range(0, pixels.nbytes, size):
+            chunk = bytes(pixels[offset:offset + size])
+            yield chunk if n == 1 else b''.join([chunk[i::n] for i in range(n)])
 
+    def close(self):
+        """Drop the pixel view and give the buffer back"""
+        self._pixels.release()
+        if self._release is not None:
+            release, self._release = self._release, None
+            release()
 
 # -------------------------------
 # Thread-safe ServerTransactionID
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# simulator.py - Simulated Fujifilm camera speaking PTP
+# -----------------------------------------------------------------------------
+#
+# ASCOM Camera driver for Fujifilm Mirrorless Camera
+#
+# Description:	Implements ASCOM driver for Fujifilm Mirrorless camera.
+#				Communicates using USB connection.
+#
+# Implements:	ASCOM Standard iCamera V4 interface
+# Author:		(2025) Tony Veinberg <tony.veinberg@gmail.com>
+#
+# Python Compatibility: Requires Python 3.7 or later
+# GitHub: https://github.com/tonyveinberg/alpaca-fujifilm-cameras
+#
+# ---------------------------------------------------------------------------------
+# MIT License
+#
+# Copyright (c) 2024
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# ----------------------------------------------------------------------------------
+
+import time
+import queue
+import random
+import struct
+import threading
+from collections import deque
+from logging import Logger
+import numpy as np
+from config import Config
+import ptp
+import raf
+from sensors import SENSORS
+
+# Bulk-in payload MB/s and the turnaround between synchronous transfers
+USB_LINKS = {
+    'usb2': (40.0, 0.5e-3),         # High speed, 480 Mbit/s
+    'usb3': (400.0, 0.1e-3)         # SuperSpeed, 5 Gbit/s
+}
+
+class SimulatedCamera:
+    """A simulated Fujifilm camera with the USB transport's interface
+
+    Answers PTP commands with the same command/data/response container
+    framing as a real body, including multi-transfer data phases and
+    events on a separate (interrupt) pipe, so the whole driver stack runs
+    without hardware. Selected with ``transport = 'simulator'`` in
+    ``config.toml``. Settings in the ``[simulator]`` section:
+
+    * ``model``: key into :py:data:`sensors.SENSORS`, sets the frame size.
+    * ``readout_time``: seconds from shutter close to the frame being ready.
+    * ``usb_link``: ``'usb2'`` or ``'usb3'`` models that link, its bulk
+      bandwidth and the turnaround latency of each transfer (paid for
+      every transfer, the driver has one in flight), see :py:data:`USB_LINKS`.
+      Empty to use ``usb_mbps``.
+    * ``usb_mbps``: bulk-in bandwidth in MB/s, no per-transfer latency.
+      Zero for unlimited.
+    * ``fault_rate``: probability (0..1) that an operation answers
+      ``DeviceBusy`` instead of running.
+    * ``disconnect_after``: after this many operations the camera
+      "drops off the bus" and every I/O call raises. Zero for never.
+    """
+    def __init__(self, logger: Logger, model: str = None, readout_time: float = None,
+                 usb_mbps: float = None, fault_rate: float = None, disconnect_after: int = None,
+                 serial: str = '', usb_link: str = None):
+        self.logger = logger
+        self.serial = serial or 'SIM00001'
+        self.model = model or Config.sim_model
+        self.readout_time = Config.sim_readout_time if readout_time is None else readout_time
+        self.usb_link = Config.sim_usb_link if usb_link is None else usb_link
+        if self.usb_link:
+            self.usb_mbps, self.usb_latency = USB_LINKS[self.usb_link]
+        else:
+            self.usb_mbps = Config.sim_usb_mbps if usb_mbps is None else usb_mbps
+            self.usb_latency = 0.0
+        self.fault_rate = Config.sim_fault_rate if fault_rate is None else fault_rate
+        self.disconnect_after = Config.sim_disconnect_after if disconnect_after is None else disconnect_after
+        sensor = SENSORS[self.model]
+        self.width, self.height, self.pixel_size = sensor.width, sensor.height, sensor.pixel_size
+        self.props = {
+            ptp.DPC_BATTERY_LEVEL: (100, 'B'),
+            ptp.DPC_EXPOSURE_TIME: (10000, 'I'),
+            ptp.DPC_EXPOSURE_INDEX: (800, 'H')
+        }
+        self._lock = threading.Lock()
+        self._bulk_in = deque()                 # Containers waiting to be read
+        self._events = queue.Queue()
+        self._objects = {}
+        self._next_handle = 1
+        self._pending = None                    # Command waiting for its data phase
+        self._ops = 0
+        self._open = False
+        self._frame: bytes = None               # Built once, every capture reuses it
+        self._liveview_frames = 0
+
+    # -------------------
+    # Transport interface
+    # -------------------
+    def open(self):
+        self._open = True
+        self._ops = 0
+        self.logger.info(f'Simulated {self.model} {self.width}x{self.height} ({self.serial}) opened, '
+                         f'{self.usb_link or "link"} {self.usb_mbps} MB/s, readout {self.readout_time} sec')
+
+    def close(self):
+        self._open = False
+        self._bulk_in.clear()
+
+    def write(self, data: bytes):
+        self._check_link()
+        length, ctype, code, tid = ptp.unpack_header(data)
+        if ctype == ptp.CONTAINER_DATA:
+            cmd, self._pending = self._pending, None
+            self._run(cmd[0], cmd[1], cmd[2], bytes(data[ptp.HEADER_SIZE:length]))
+            return
+        params = struct.unpack_from(f'<{(length - ptp.HEADER_SIZE) // 4}I', data, ptp.HEADER_SIZE)
+        if code == ptp.OC_SET_DEVICE_PROP_VALUE:
+            self._pending = (code, tid, params)     # Data phase follows
+            return
+        self._run(code, tid, params, None)
+
+    def read(self, size: int) -> bytes:
+        """One bulk-in transfer: up to size bytes, never past the current container"""
+        self._check_link()
+        if not self._bulk_in:
+            raise TimeoutError('Simulated camera: bulk read with nothing to send')
+        buf = self._bulk_in[0]
+        if len(buf) <= size:
+            self._bulk_in.popleft()
+            chunk = buf
+        else:
+            chunk = buf[:size]
+            self._bulk_in[0] = buf[size:]
+        self._wire(len(chunk), 1.0)
+        return bytes(chunk)
+
+    def readinto(self, buffer) -> int:
+        """Bulk-in transfers straight into buffer, never past the current container"""
+        self._check_link()
+        if not self._bulk_in:
+            raise TimeoutError('Simulated camera: bulk read with nothing to send')
+        view = memoryview(buffer).cast('B')
+        buf = self._bulk_in[0]
+        n = min(len(view), len(buf))
+        view[:n] = buf[:n]
+        if n == len(buf):
+            self._bulk_in.popleft()
+        else:
+            self._bulk_in[0] = buf[n:]
+        transfers = -(-n // Config.usb_transfer_size)
+        self._wire(n, transfers)
+        return n
+
+    def _wire(self, nbytes: int, turnarounds: float):
+        """Sleep for the time the link takes to move nbytes"""
+        seconds = turnarounds * self.usb_latency
+        if self.usb_mbps > 0:
+            seconds += nbytes / (self.usb_mbps * 1e6)
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def read_event(self, timeout: float):
+        self._check_link()
+        try:
+            return self._events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _check_link(self):
+        if not self._open:
+            raise IOError('Simulated camera is not open')
+        if self.disconnect_after and self._ops >= self.disconnect_after:
+            raise IOError('Simulated camera dropped off the bus')
+
+    # -------------
+    # PTP responder
+    # -------------
+    def _respond(self, tid: int, rcode: int = ptp.RC_OK, params = (), data: bytes = None, code: int = 0):
+        if not data is None:
+            # memoryview so large frames are sliced into transfers without copying
+            self._bulk_in.append(memoryview(ptp.pack_container(ptp.CONTAINER_DATA, code, tid, (), data)))
+        self._bulk_in.append(memoryview(ptp.pack_container(ptp.CONTAINER_RESPONSE, rcode, tid, params)))
+
+    def _run(self, code: int, tid: int, params, data):
+        self._ops += 1
+        if code not in (ptp.OC_OPEN_SESSION, ptp.OC_CLOSE_SESSION) and random.random() < self.fault_rate:
+            self._respond(tid, ptp.RC_DEVICE_BUSY)
+            return
+        if code == ptp.OC_OPEN_SESSION or code == ptp.OC_CLOSE_SESSION:
+            self._respond(tid)
+        elif code == ptp.OC_GET_DEVICE_INFO:
+            info = struct.pack('<HIH', 100, 0x0E, 100) + ptp.pack_string('') + struct.pack('<H', 0)
+            info += struct.pack('<I', 0) * 5
+            for s in ('FUJIFILM', self.model, '1.00', self.serial):
+                info += ptp.pack_string(s)
+            self._respond(tid, data=info, code=code)
+        elif code == ptp.OC_GET_DEVICE_PROP_VALUE:
+            if not params[0] in self.props:
+                self._respond(tid, ptp.RC_OPERATION_NOT_SUPPORTED)
+                return
+            value, fmt = self.props[params[0]]
+            self._respond(tid, data=struct.pack(f'<{fmt}', value), code=code)
+        elif code == ptp.OC_SET_DEVICE_PROP_VALUE:
+            value, fmt = self.props[params[0]]
+            self.props[params[0]] = (struct.unpack(f'<{fmt}', data)[0], fmt)
+            self._respond(tid)
+            self._events.put(ptp.pack_container(ptp.CONTAINER_EVENT, ptp.EC_DEVICE_PROP_CHANGED, 0, (params[0],)))
+        elif code == ptp.OC_INITIATE_OPEN_CAPTURE:
+            self._respond(tid)
+        elif code == ptp.OC_TERMINATE_OPEN_CAPTURE:
+            self._respond(tid)
+            threading.Timer(self.readout_time, self._readout_done).start()
+        elif code == ptp.OC_GET_OBJECT_INFO:
+            obj = self._objects.get(params[0])
+            if obj is None:
+                self._respond(tid, ptp.RC_GENERAL_ERROR)
+                return
+            info = struct.pack('<IHHI', 0x10001, 0xB103, 0, len(obj)) + bytes(40)
+            info += ptp.pack_string(f'DSCF{params[0]:04d}.RAF')
+            self._respond(tid, data=info, code=code)
+        elif code == ptp.OC_GET_OBJECT and params[0] == ptp.LIVEVIEW_HANDLE:
+            self._liveview_frames += 1
+            self._respond(tid, data=_liveview_jpeg(f'{self.model} live view {self._liveview_frames}'), code=code)
+        elif code == ptp.OC_GET_OBJECT:
+            obj = self._objects.get(params[0])
+            if obj is None:
+                self._respond(tid, ptp.RC_GENERAL_ERROR)
+                return
+            self._respond(tid, data=obj, code=code)
+        elif code == ptp.OC_GET_PARTIAL_OBJECT:
+            obj = self._objects.get(params[0])
+            if obj is None:
+                self._respond(tid, ptp.RC_GENERAL_ERROR)
+                return
+            part = memoryview(obj)[params[1]:params[1] + params[2]]
+            self._respond(tid, params=(len(part),), data=part, code=code)
+        elif code == ptp.OC_DELETE_OBJECT:
+            with self._lock:
+                self._objects.pop(params[0], None)
+            self._respond(tid)
+        else:
+            self._respond(tid, ptp.RC_OPERATION_NOT_SUPPORTED)
+
+    def _readout_done(self):
+        """Sensor readout finished, the RAF is now an object on the camera"""
+        if self._frame is None:
+            self._frame = raf.make(self.model, self.width, self.height, self._pixels())
+        with self._lock:
+            handle = self._next_handle
+            self._next_handle += 1
+            self._objects[handle] = self._frame
+        self._events.put(ptp.pack_container(ptp.CONTAINER_EVENT, ptp.EC_OBJECT_ADDED, 0, (handle,)))
+
+    def _pixels(self) -> bytes:
+        """Synthetic 14-bit star field: bias, noise and a sprinkle of stars"""
+        rng = np.random.default_rng(1)
+        img = rng.integers(1000, 1064, size=(self.height, self.width), dtype=np.uint16)
+        n = self.width * self.height // 20000
+        img[rng.integers(0, self.height, n), rng.integers(0, self.width, n)] = \
+            rng.integers(4000, 16383, n, dtype=np.uint16)
+        return img.astype('<u2').tobytes()
+
+def _liveview_jpeg(comment: str) -> bytes:
+    """A valid 8x8 mid-grey baseline JPEG carrying a comment, for live view"""
+    seg = lambda marker, body: struct.pack('>HH', marker, len(body) + 2) + body
+    huffman = bytes([1] + [0] * 15 + [0])              # One 1-bit code, symbol 0
+    return b''.join((
+        b'\xff\xd8',                                    # SOI
+        seg(0xFFDB, b'\x00' + b'\x01' * 64),            # Quantization table, all 1
+        seg(0xFFC0, struct.pack('>BHHB', 8, 8, 8, 1) + b'\x01\x11\x00'),
+        seg(0xFFC4, b'\x00' + huffman),                 # DC: difference 0
+        seg(0xFFC4, b'\x10' + huffman),                 # AC: end of block
+        seg(0xFFFE, comment.encode('ascii')),
+        seg(0xFFDA, b'\x01\x01\x00\x00\x3f\x00'),
+        b'\x3f',                                        # DC 0, EOB, padded with 1s
+        b'\xff\xd9'))                                   # EOI
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# spool.py - On-disk spool for frames waiting to be downloaded
+# -----------------------------------------------------------------------------
+#
+# ASCOM Camera driver for Fujifilm Mirrorless Camera
+#
+# Description:	Implements ASCOM driver for Fujifilm Mirrorless camera.
+#				Communicates using USB connection.
+#
+# Implements:	ASCOM Standard iCamera V4 interface
+# Author:		(2025) Tony Veinberg <tony.veinberg@gmail.com>
+#
+# Python Compatibility: Requires Python 3.7 or later
+# GitHub: https://github.com/tonyveinberg/alpaca-fujifilm-cameras
+#
+# ---------------------------------------------------------------------------------
+# MIT License
+#
+# Copyright (c) 2024
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# ----------------------------------------------------------------------------------
+
+import os
+import glob
+from collections import OrderedDict
+from threading import Lock
+from logging import Logger
+import numpy as np
+
+class SpoolEntry:
+    """One spooled frame: a ``.npy`` file and a read-only memory map of it
+
+    Reference counted like :py:class:`~bufpool.FrameBuffer`, so a
+    :py:class:`~fujifilm.Frame` can hold either. The file goes when the
+    last reference is released. Only a frame the client has been served
+    (``FrameSpool.served()``) may be evicted.
+    """
+    __slots__ = ('spool', 'path', 'image', 'nbytes', 'refs', 'served')
+
+    def __init__(self, spool: 'FrameSpool', path: str, image: np.memmap):
+        self.spool = spool
+        self.path = path
+        self.image = image
+        self.nbytes = image.nbytes
+        self.refs = 1
+        self.served = False
+
+    def acquire(self) -> 'SpoolEntry':
+        self.spool._acquire(self)
+        return self
+
+    def release(self):
+        self.spool._release(self)
+
+class FrameSpool:
+    """Decoded frames on disk, served from memory maps
+
+    Frames waiting for ImageArray are written to ``directory`` as
+    ``.npy`` files and read back through ``numpy.memmap``, so their
+    pixels live in the kernel's page cache, which gives them up under
+    memory pressure, rather than in the driver's memory.
+
+    The spool holds at most ``max_bytes``. Adding a frame past that
+    evicts the least recently used frames (written or served longest
+    ago) that have been served and are not being sent right now, and
+    ``on_evict(entry)`` is called for each so its owner can drop it.
+    Called without the spool's lock held. A frame nobody has downloaded
+    yet is never evicted, the owner checks ``room()`` before it takes
+    another frame, and a frame spooled regardless goes over the cap.
+    """
+    def __init__(self, logger: Logger, directory: str, max_bytes: int, on_evict = None):
+        self.logger = logger
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self._lock = Lock()
+        self._entries = OrderedDict()   # path -> SpoolEntry, least recently used first
+        self._bytes = 0
+        self._seq = 0
+        os.makedirs(directory, exist_ok=True)
+        for stale in glob.glob(os.path.join(directory, 'frame-*.npy')):
+            os.remove(stale)            # Left by a previous run
+
+    def put(self, image: np.ndarray) -> SpoolEntry:
+        """Spool a copy of image, return its entry holding one reference"""
+        evicted = self._make_room(image.nbytes)
+        for entry in evicted:
+            self.logger.warning(f'Frame spool full, evicted {os.path.basename(entry.path)}')
+            if not self.on_evict is None:
+                self.on_evict(entry)
+        with self._lock:
+            self._seq += 1
+            path = os.path.join(self.directory, f'frame-{self._seq:06d}.npy')
+        np.save(path, image)
+        entry = SpoolEntry(self, path, np.load(path, mmap_mode='r'))
+        with self._lock:
+            self._entries[path] = entry
+            self._bytes += entry.nbytes
+        return entry
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def served(self, entry: SpoolEntry):
+        """The client has downloaded this frame, it may be evicted from now on"""
+        with self._lock:
+            entry.served = True
+
+    def room(self) -> int:
+        """Bytes that can be spooled without going over the cap, counting
+        what evicting the served frames would free"""
+        with self._lock:
+            free = self.max_bytes - self._bytes
+            for entry in self._entries.values():
+                if entry.served and entry.refs == 1:
+                    free += entry.nbytes
+            return free
+
+    def _make_room(self, nbytes: int) -> list:
+        """Pick the frames to evict so nbytes more fit"""
+        with self._lock:
+            over = self._bytes + nbytes - self.max_bytes
+            evicted = []
+            for entry in self._entries.values():
+                if over <= 0:
+                    break
+                if entry.served and entry.refs == 1:    # Only its frame holds it, not being sent
+                    evicted.append(entry)
+                    over -= entry.nbytes
+            if over > 0:
+                self.logger.warning(f'Frame spool over its {self.max_bytes >> 20} MiB cap, '
+                                    f'the other frames are in use or not downloaded yet')
+            return evicted
+
+    def _acquire(self, entry: SpoolEntry):
+        with self._lock:
+            entry.refs += 1
+            self._entries.move_to_end(entry.path)
+
+    def _release(self, entry: SpoolEntry):
+        with self._lock:
+            entry.refs -= 1
+            if entry.refs > 0:
+                return
+            del self._entries[entry.path]
+            self._bytes -= entry.nbytes
+        entry.image = None              # Drop our map of it
+        try:
+            os.remove(entry.path)
+        except OSError as ex:
+            self.logger.warning(f'Frame spool could not remove {entry.path}: {ex}')
+
+    def close(self):
+        """Remove every spooled frame, whoever still holds it"""
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+            self._bytes = 0
+        for entry in entries:
+            entry.image = None
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
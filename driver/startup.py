@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# startup.py - Startup time breakdown and background preloading
+# -----------------------------------------------------------------------------
+#
+# ASCOM Camera driver for Fujifilm Mirrorless Camera
+#
+# Description:	Implements ASCOM driver for Fujifilm Mirrorless camera.
+#				Communicates using USB connection.
+#
+# Implements:	ASCOM Standard iCamera V4 interface
+# Author:		(2025) Tony Veinberg <tony.veinberg@gmail.com>
+#
+# Python Compatibility: Requires Python 3.7 or later
+# GitHub: https://github.com/tonyveinberg/alpaca-fujifilm-cameras
+#
+# ---------------------------------------------------------------------------------
+# MIT License
+#
+# Copyright (c) 2024
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# ----------------------------------------------------------------------------------
+
+
+import time
+import importlib
+from logging import Logger
+
+# Heavy modules left out of the startup path (numpy comes with them),
+# loaded in the background once the server is answering
+PRELOAD = ('imaging', 'raf')
+
+_t0 = time.perf_counter()               # main.py imports this first
+_last = _t0
+_phases = []                            # (phase, seconds)
+
+def mark(phase: str):
+    """End a startup phase, the next starts now"""
+    global _last
+    now = time.perf_counter()
+    _phases.append((phase, now - _last))
+    _last = now
+
+def elapsed() -> float:
+    return _last - _t0
+
+def report(logger: Logger):
+    phases = ', '.join(f'{phase} {seconds * 1000:.0f}' for phase, seconds in _phases)
+    logger.info(f'==STARTUP== First response possible {elapsed() * 1000:.0f} ms after start ({phases} ms)')
+
+def preload(logger: Logger):
+    """Import the PRELOAD modules (run on a background thread), so the
+    first exposure doesn't wait for them"""
+    t0 = time.perf_counter()
+    for name in PRELOAD:
+        importlib.import_module(name)
+    logger.info(f'==STARTUP== Preloaded {", ".join(PRELOAD)} in {(time.perf_counter() - t0) * 1000:.0f} ms')
@@ -0,0 +1,17 @@
+# Tests run against the driver modules as the driver itself imports them,
+# from the driver directory (config.toml is found next to config.py).
+import os
+import sys
+import logging
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def logger():
+    import exceptions
+    import shr
+    lgr = logging.getLogger('tests')
+    exceptions.logger = lgr
+    shr.logger = lgr
+    return lgr
@@ -0,0 +1,57 @@
+import pytest
+from bufpool import BufferPool, MiB
+
+@pytest.fixture
+def pool(logger):
+    pool = BufferPool(logger)
+    yield pool
+    pool.close()
+
+def test_get_holds_one_reference(pool):
+    fb = pool.get(1000)
+    assert fb.refs == 1
+    assert fb.capacity == MiB                   # Rounded up
+    assert pool.usage() == {'busy': (1, MiB), 'idle': (0, 0)}
+    fb.release()
+    assert pool.usage() == {'busy': (0, 0), 'idle': (1, MiB)}
+
+def test_buffer_is_free_after_last_release(pool):
+    fb = pool.get(MiB)
+    fb.acquire()
+    fb.release()
+    assert pool.usage()['busy'] == (1, MiB)
+    fb.release()
+    assert pool.usage()['busy'] == (0, 0)
+    assert pool.get(MiB) is fb                  # Reused, not reallocated
+
+def test_busy_buffer_is_not_handed_out(pool):
+    fb = pool.get(MiB)
+    other = pool.get(MiB)
+    assert other is not fb
+    other.release()
+    fb.release()
+
+def test_smallest_free_buffer_that_fits(pool):
+    pool.reserve({MiB: 1, 4 * MiB: 1})
+    big = pool.get(2 * MiB)
+    assert big.capacity == 4 * MiB
+    small = pool.get(100)
+    assert small.capacity == MiB
+    small.release()
+    big.release()
+
+def test_reserve_frees_idle_buffers_of_other_sizes(pool):
+    pool.reserve({MiB: 2})
+    busy = pool.get(MiB)
+    pool.reserve({2 * MiB: 1})
+    assert pool.usage() == {'busy': (1, MiB), 'idle': (1, 2 * MiB)}
+    busy.release()
+
+def test_array_views_the_buffer(pool):
+    import numpy as np
+    fb = pool.get(64)
+    a = fb.array((4, 8), np.uint16)
+    a[...] = 7
+    assert bytes(fb.buf[:4]) == b'\x07\x00\x07\x00'
+    del a
+    fb.release()
@@ -0,0 +1,142 @@
+"""Connect, expose and download through the Alpaca API, on the simulated camera"""
+import time
+import struct
+import asyncio
+import threading
+from urllib.parse import urlencode
+import pytest
+from falcon import App, testing
+from config import Config
+
+@pytest.fixture
+def engine(logger, monkeypatch):
+    """A Fujifilm device engine on a simulated TINY camera, in its own event loop"""
+    from fujifilm import Fujifilm
+    from simulator import SimulatedCamera
+    monkeypatch.setattr(Config, 'pipeline', False)
+    monkeypatch.setattr(Config, 'spool_dir', '')
+    monkeypatch.setattr(Config, 'save_frames', False)
+    cam = Fujifilm(logger, lambda logger, serial='': SimulatedCamera(
+        logger, model='TINY', readout_time=0.05, usb_mbps=0, fault_rate=0, disconnect_after=0, usb_link=''))
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    async def start():
+        return asyncio.ensure_future(cam.client())
+    client = asyncio.run_coroutine_threadsafe(start(), loop).result()
+    yield cam
+    async def stop():                               # The engine disconnects on the way out
+        client.cancel()
+        await asyncio.gather(client, return_exceptions=True)
+    asyncio.run_coroutine_threadsafe(stop(), loop).result(30)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(10)
+    loop.close()
+
+@pytest.fixture
+def api(engine, logger, monkeypatch):
+    """A test client for the camera's Alpaca routes, device 0 is engine"""
+    import app
+    import camera
+    monkeypatch.setattr(camera, 'logger', logger)
+    monkeypatch.setattr(camera, 'cameras', [engine])
+    falc_app = App()
+    app.init_routes(falc_app, 'camera', camera)
+    return testing.TestClient(falc_app)
+
+URL = '/api/v1/camera/0'
+
+def put(api, method: str, **fields) -> dict:
+    """An Alpaca PUT, fields form encoded, return the JSON response"""
+    return api.simulate_put(f'{URL}/{method}', body=urlencode(fields),
+                            content_type='application/x-www-form-urlencoded').json
+
+def wait_for(api, prop: str, timeout: float = 10.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        value = api.simulate_get(f'{URL}/{prop}').json['Value']
+        if value:
+            return value
+        time.sleep(0.05)
+    pytest.fail(f'{prop} still false after {timeout} sec')
+
+def test_expose_and_download(api):
+    assert put(api, 'connect')['ErrorNumber'] == 0
+    wait_for(api, 'connected')
+    assert api.simulate_get(f'{URL}/cameraxsize').json['Value'] == 640
+    assert api.simulate_get(f'{URL}/imageready').json['Value'] is False
+    assert put(api, 'startexposure', Duration=0.1, Light='true')['ErrorNumber'] == 0
+    wait_for(api, 'imageready')
+    resp = api.simulate_get(f'{URL}/imagearray', params={'ClientTransactionID': 3},
+                            headers={'Accept': 'application/imagebytes'})
+    assert resp.headers['Content-Type'] == 'application/imagebytes'
+    body = resp.content
+    fields = struct.unpack('<iiIIiiiiiii', body[:44])
+    assert fields[:3] == (1, 0, 3)
+    assert fields[5:] == (2, 8, 2, 640, 480, 0)
+    assert len(body) == 44 + 640 * 480 * 2
+    assert put(api, 'connected', Connected='false')['ErrorNumber'] == 0
+
+def test_binned_subframe(api, engine):
+    put(api, 'connect')
+    wait_for(api, 'connected')
+    full_scale = (1 << engine.sensor.bits) - 1
+    assert api.simulate_get(f'{URL}/maxadu').json['Value'] == full_scale
+    for prop, value in (('BinX', 2), ('BinY', 2), ('NumX', 100), ('NumY', 50), ('StartX', 10)):
+        assert put(api, prop.lower(), **{prop: value})['ErrorNumber'] == 0
+    assert api.simulate_get(f'{URL}/maxadu').json['Value'] == 4 * full_scale     # Binned pixels are sums
+    put(api, 'startexposure', Duration=0.1, Light='false')
+    wait_for(api, 'imageready')
+    body = api.simulate_get(f'{URL}/imagearray', headers={'Accept': 'application/imagebytes'}).content
+    assert struct.unpack_from('<iiiii', body, 20) == (2, 2, 2, 100, 50)
+    assert len(body) == 44 + 100 * 50 * 4
+
+def test_imagearray_before_any_exposure(api):
+    put(api, 'connect')
+    wait_for(api, 'connected')
+    resp = api.simulate_get(f'{URL}/imagearray')
+    assert resp.json['ErrorNumber'] == 0x40B        # InvalidOperation
+
+def test_failed_pipelined_download_fails_its_imagearray(api, engine, monkeypatch):
+    monkeypatch.setattr(Config, 'pipeline', True)
+    put(api, 'connect')
+    wait_for(api, 'connected')
+    session = engine._session
+    real = session.get_partial_object_into
+    calls = []
+    def fail_first(*args):
+        calls.append(len(calls))                    # Not args, they view the download buffer
+        if len(calls) == 1:
+            raise IOError('simulated USB stall')
+        return real(*args)
+    monkeypatch.setattr(session, 'get_partial_object_into', fail_first)
+    for _ in range(2):
+        assert put(api, 'startexposure', Duration=0.1, Light='true')['ErrorNumber'] == 0
+        while engine.camera_state != 0:                 # CAMERA_IDLE
+            time.sleep(0.02)
+    deadline = time.monotonic() + 10
+    while engine._downloads_pending and time.monotonic() < deadline:
+        time.sleep(0.02)
+    first = api.simulate_get(f'{URL}/imagearray')
+    assert first.json['ErrorNumber'] == 0x500
+    assert 'simulated USB stall' in first.json['ErrorMessage']
+    second = api.simulate_get(f'{URL}/imagearray', headers={'Accept': 'application/imagebytes'})
+    assert len(second.content) == 44 + 640 * 480 * 2
+
+def test_stopexposure_does_not_wait_for_the_download(api, engine, monkeypatch):
+    put(api, 'connect')
+    wait_for(api, 'connected')
+    session = engine._session
+    real = session.get_object_into
+    def slow(*args):
+        time.sleep(1.0)                             # A long RAF over USB 2
+        return real(*args)
+    monkeypatch.setattr(session, 'get_object_into', slow)
+    assert put(api, 'startexposure', Duration=60, Light='true')['ErrorNumber'] == 0
+    t0 = time.monotonic()
+    assert put(api, 'stopexposure')['ErrorNumber'] == 0
+    assert time.monotonic() - t0 < 0.5
+    assert api.simulate_get(f'{URL}/imageready').json['Value'] is False
+    wait_for(api, 'imageready')
+    body = api.simulate_get(f'{URL}/imagearray', headers={'Accept': 'application/imagebytes'}).content
+    assert len(body) == 44 + 640 * 480 * 2
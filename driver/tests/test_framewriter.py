@@ -0,0 +1,83 @@
+import io
+import xml.etree.ElementTree as ET
+import numpy as np
+from framewriter import FITS_BLOCK, FITS_CARD, XISF_CREATOR, write_fits, write_xisf
+
+XISF_NS = {'x': 'http://www.pixinsight.com/xisf'}
+
+def read_fits(data: bytes) -> tuple:
+    """The header cards {key: value text} and the data bytes of a FITS file"""
+    cards = {}
+    pos = 0
+    while True:
+        block = data[pos:pos + FITS_BLOCK]
+        pos += FITS_BLOCK
+        for i in range(0, FITS_BLOCK, FITS_CARD):
+            card = block[i:i + FITS_CARD].decode('ascii')
+            key = card[:8].strip()
+            if key == 'END':
+                return cards, data[pos:]
+            if card[8:10] == '= ':
+                cards[key] = card[10:].split(' / ')[0].strip()
+
+def test_uint16_round_trip():
+    image = np.array([[0, 1, 32767], [32768, 65534, 65535]], dtype=np.uint16)    # ASCOM [x][y]
+    f = io.BytesIO()
+    write_fits(f, image, [('EXPTIME', 2.5, '[s] exposure time'), ('INSTRUME', "X-T5 'a'", ''),
+                          ('ISOSPEED', None, 'left out')])
+    data = f.getvalue()
+    assert len(data) % FITS_BLOCK == 0
+    cards, pixels = read_fits(data)
+    assert cards['BITPIX'] == '16'
+    assert (cards['NAXIS1'], cards['NAXIS2']) == ('2', '3')
+    assert cards['BZERO'] == '32768'
+    assert float(cards['EXPTIME']) == 2.5
+    assert cards['INSTRUME'] == "'X-T5 ''a'''"
+    assert 'ISOSPEED' not in cards
+    stored = np.frombuffer(pixels[:image.nbytes], dtype='>i2').reshape(3, 2)   # FITS rows, x fastest
+    assert np.array_equal(stored.astype(np.int32) + 32768, image.T)
+    assert pixels[image.nbytes:] == b'\0' * (len(pixels) - image.nbytes)
+
+def test_int32_has_no_bzero():
+    image = np.array([[-5, 0], [1 << 20, 7]], dtype=np.int32)
+    f = io.BytesIO()
+    write_fits(f, image, [])
+    cards, pixels = read_fits(f.getvalue())
+    assert cards['BITPIX'] == '32'
+    assert 'BZERO' not in cards
+    assert np.array_equal(np.frombuffer(pixels[:image.nbytes], dtype='>i4').reshape(2, 2), image.T)
+
+def test_rows_span_several_bands(monkeypatch):
+    import framewriter
+    monkeypatch.setattr(framewriter, 'BAND_BYTES', 64)
+    image = np.arange(20 * 9, dtype=np.uint16).reshape(20, 9)
+    f = io.BytesIO()
+    write_fits(f, image, [])
+    _, pixels = read_fits(f.getvalue())
+    stored = np.frombuffer(pixels[:image.nbytes], dtype='>u2').reshape(9, 20) ^ 0x8000
+    assert np.array_equal(stored, image.T)
+
+def test_xisf_round_trip():
+    image = np.array([[0, 1, 32767], [32768, 65534, 65535]], dtype=np.uint16)    # ASCOM [x][y]
+    f = io.BytesIO()
+    write_xisf(f, image, [('EXPTIME', 2.5, '[s] exposure time'), ('ISOSPEED', None, 'left out')])
+    data = f.getvalue()
+    assert data[:8] == b'XISF0100'
+    length = int.from_bytes(data[8:12], 'little')
+    root = ET.fromstring(data[16:16 + length])
+    img = root.find('x:Image', XISF_NS)
+    assert img.get('geometry') == '2:3:1'
+    assert img.get('sampleFormat') == 'UInt16'
+    keywords = {k.get('name'): k.get('value') for k in img.findall('x:FITSKeyword', XISF_NS)}
+    assert list(keywords) == ['EXPTIME']
+    assert float(keywords['EXPTIME']) == 2.5
+    props = {p.get('id'): p for p in root.findall('x:Metadata/x:Property', XISF_NS)}
+    assert props['XISF:CreationTime'].get('type') == 'TimePoint'
+    assert props['XISF:CreationTime'].get('value').endswith('Z')
+    assert props['XISF:CreatorApplication'].get('value') == XISF_CREATOR
+    _, position, nbytes = img.get('location').split(':')
+    position, nbytes = int(position), int(nbytes)
+    assert position % 4096 == 0 and position >= 16 + length
+    assert nbytes == image.nbytes == len(data) - position
+    stored = np.frombuffer(data[position:], dtype='<u2').reshape(3, 2)          # Rows, x fastest
+    assert np.array_equal(stored, image.T)
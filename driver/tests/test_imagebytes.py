@@ -0,0 +1,49 @@
+import struct
+import numpy as np
+from falcon import testing
+from exceptions import InvalidOperationException
+from shr import ImageArrayResponse
+
+def response(image, err=None):
+    req = testing.create_req(query_string='ClientTransactionID=7')
+    if err is None:
+        return ImageArrayResponse(image, req)
+    return ImageArrayResponse(image, req, err)
+
+def test_header_fields(logger):
+    image = np.arange(12, dtype=np.uint16).reshape(4, 3)
+    ir = response(image)
+    body = ir.imagebytes
+    fields = struct.unpack('<iiIIiiiiiii', body[:44])
+    assert fields == (1, 0, 7, ir.ServerTransactionID, 44, 2, 8, 2, 4, 3, 0)
+    assert body[44:] == image.astype('<u2').tobytes()
+
+def test_int32_element_type(logger):
+    image = np.zeros((2, 5), dtype=np.int32)
+    body = response(image).imagebytes
+    assert struct.unpack_from('<iii', body, 20) == (2, 2, 2)
+    assert len(body) == 44 + image.nbytes
+
+def test_big_endian_image_goes_out_little_endian(logger):
+    image = np.arange(6, dtype='>u2').reshape(3, 2)
+    body = response(image).imagebytes
+    assert body[44:] == np.arange(6, dtype='<u2').tobytes()
+
+def test_error_body(logger):
+    ir = response(None, InvalidOperationException('No image available.'))
+    body = ir.imagebytes
+    fields = struct.unpack('<iiIIiiiiiii', body[:44])
+    assert fields[:5] == (1, ir.ErrorNumber, 7, ir.ServerTransactionID, 44)
+    assert ir.ErrorNumber != 0
+    assert fields[5:] == (0,) * 6
+    assert body[44:].decode() == ir.ErrorMessage
+
+def test_stream_matches_body(logger):
+    image = np.arange(1000, dtype=np.uint16).reshape(40, 25)
+    ir = response(image)
+    released = []
+    stream = ir.imagestream(64, release=lambda: released.append(True))
+    body = b''.join(stream)
+    stream.close()
+    assert body[44:] == image.tobytes()
+    assert released == [True]
@@ -0,0 +1,50 @@
+import numpy as np
+from imaging import check_subframe, subframe, subframe_dtype
+
+def test_full_frame_is_not_copied():
+    image = np.arange(12, dtype=np.uint16).reshape(4, 3)
+    assert subframe(image, 0, 0, 4, 3) is image
+
+def test_crop_keeps_uint16():
+    image = np.arange(48, dtype=np.uint16).reshape(8, 6)
+    out = subframe(image, 2, 1, 3, 4)
+    assert out.dtype == np.uint16
+    assert np.array_equal(out, image[2:5, 1:5])
+
+def test_binning_sums_into_int32():
+    image = np.full((8, 6), 65535, dtype=np.uint16)        # Sums overflow 16 bits
+    image[0, 0] = 1
+    out = subframe(image, 0, 0, 4, 2, 2, 3)
+    assert out.dtype == np.int32 == subframe_dtype(2, 3)
+    assert out.shape == (4, 2)
+    assert out[0, 0] == 1 + 5 * 65535
+    assert np.all(out.flat[1:] == 6 * 65535)
+
+def test_binned_subframe_start_is_in_binned_pixels():
+    image = np.arange(64, dtype=np.uint16).reshape(8, 8)
+    out = subframe(image, 1, 2, 2, 1, 2, 2)
+    expect = image[2:6, 4:6].reshape(2, 2, 1, 2).sum(axis=(1, 3))
+    assert np.array_equal(out, expect)
+
+def test_subframe_into_out():
+    image = np.ones((4, 4), dtype=np.uint16)
+    out = np.zeros((2, 2), dtype=subframe_dtype(2, 2))
+    assert subframe(image, 0, 0, 2, 2, 2, 2, out=out) is out
+    assert np.all(out == 4)
+
+def test_check_subframe():
+    assert check_subframe(100, 80, 0, 0, 100, 80, 1, 1) == ''
+    assert check_subframe(100, 80, 0, 0, 50, 40, 2, 2) == ''
+    assert 'binned width' in check_subframe(100, 80, 1, 0, 50, 40, 2, 2)
+    assert 'at least 1' in check_subframe(100, 80, 0, 0, 10, 10, 0, 1)
+
+def test_2x3_binning_against_hand_sums():
+    image = np.array([[1, 2, 3, 4, 5, 6],
+                      [7, 8, 9, 10, 11, 12],
+                      [13, 14, 15, 16, 17, 18],
+                      [19, 20, 21, 22, 23, 24]], dtype=np.uint16)    # [x][y], 4 x 6
+    out = subframe(image, 0, 0, 2, 2, 2, 3)
+    # x 0-1 / y 0-2: 1+2+3+7+8+9    x 0-1 / y 3-5: 4+5+6+10+11+12
+    # x 2-3 / y 0-2: 13+14+15+19+20+21    x 2-3 / y 3-5: 16+17+18+22+23+24
+    assert out.dtype == np.int32
+    assert out.tolist() == [[30, 48], [102, 120]]
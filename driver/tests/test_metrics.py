@@ -0,0 +1,46 @@
+import threading
+import pytest
+import metrics
+
+@pytest.fixture(autouse=True)
+def registry():
+    """Metrics made by a test are left out of /metrics afterwards"""
+    before = list(metrics._registry)
+    yield
+    metrics._registry[:] = before
+
+def run_threads(n: int, fn):
+    threads = [threading.Thread(target=fn) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+def test_counter_keeps_counts_of_threads_that_ended():
+    counter = metrics.Counter('test_requests_total', 'Test counter', ('method',))
+    run_threads(50, lambda: counter.inc(('GET',), 2))
+    counter.inc(('PUT',))
+    assert len(counter._shards) == 1                    # Only this thread's is left
+    lines = counter.exposition()
+    assert 'test_requests_total{method="GET"} 100' in lines
+    assert 'test_requests_total{method="PUT"} 1' in lines
+
+def test_histogram_keeps_observations_of_threads_that_ended():
+    hist = metrics.Histogram('test_seconds', 'Test histogram', (), buckets=(0.1, 1.0))
+    run_threads(20, lambda: hist.observe(0.5))
+    run_threads(10, lambda: hist.observe(5.0))
+    assert len(hist._shards) == 0
+    lines = hist.exposition()
+    assert 'test_seconds_bucket{le="0.1"} 0' in lines
+    assert 'test_seconds_bucket{le="1.0"} 20' in lines
+    assert 'test_seconds_bucket{le="+Inf"} 30' in lines
+    assert 'test_seconds_count 30' in lines
+
+def test_timed_body_reports_once_after_it_is_sent():
+    sent = []
+    body = metrics.TimedBody(iter([b'a', b'b']), lambda: sent.append(True))
+    assert b''.join(body) == b'ab'
+    assert sent == []                                   # Not until the server closes it
+    body.close()
+    body.close()
+    assert sent == [True]
@@ -0,0 +1,35 @@
+import time
+from urllib.parse import urlencode
+import pytest
+from falcon import App, testing
+
+@pytest.fixture
+def api(logger, monkeypatch):
+    import management
+    monkeypatch.setattr(management, 'logger', logger)
+    falc_app = App()
+    falc_app.add_route('/management/v1/profile', management.profile())
+    return testing.TestClient(falc_app)
+
+def put(api, **fields):
+    return api.simulate_put('/management/v1/profile', body=urlencode(fields),
+                            content_type='application/x-www-form-urlencoded')
+
+def test_profile_runs_in_the_background(api):
+    t0 = time.monotonic()
+    resp = put(api, Duration=0.5)
+    assert time.monotonic() - t0 < 0.4                      # Did not wait for the samples
+    assert resp.status_code == 202
+    profile_id = resp.json['Id']
+    assert resp.headers['Location'].endswith(f'/management/v1/profile?Id={profile_id}')
+    assert put(api, Duration=0.5).status_code == 409        # One at a time
+    assert api.simulate_get('/management/v1/profile', params={'Id': profile_id}).status_code == 202
+    time.sleep(0.7)
+    resp = api.simulate_get('/management/v1/profile', params={'Id': profile_id})
+    assert resp.status_code == 200
+    assert 'MainThread;' in resp.text
+    assert api.simulate_get('/management/v1/profile', params={'Id': profile_id + 1}).status_code == 404
+
+def test_bad_duration(api):
+    assert put(api, Duration=1e9).status_code == 400
+    assert put(api, Duration='soon').status_code == 400
@@ -0,0 +1,64 @@
+from collections import deque
+import pytest
+from ptp import (PTPSession, pack_container, CONTAINER_DATA, CONTAINER_RESPONSE, RC_OK,
+                 OC_GET_OBJECT)
+
+class ScriptedTransport:
+    """Bulk in transfers from a script, each read or readinto takes (part of) the next one"""
+    def __init__(self, transfers: list):
+        self.transfers = deque(transfers)
+        self.written = []
+
+    def write(self, data: bytes):
+        self.written.append(data)
+
+    def read(self, size: int) -> bytes:
+        data = self.transfers.popleft()
+        assert len(data) <= size
+        return data
+
+    def readinto(self, buffer) -> int:
+        data = self.transfers.popleft()
+        n = min(len(data), len(buffer))
+        buffer[:n] = data[:n]
+        if n < len(data):
+            self.transfers.appendleft(data[n:])
+        return n
+
+def get_object(transfers: list, buffer) -> tuple:
+    session = PTPSession(ScriptedTransport(transfers))
+    return session.get_object_into(7, buffer), session
+
+def response(tid: int = 1) -> bytes:
+    return pack_container(CONTAINER_RESPONSE, RC_OK, tid)
+
+def test_data_phase_into_buffer():
+    payload = bytes(range(200))
+    data = pack_container(CONTAINER_DATA, OC_GET_OBJECT, 1, (), payload)
+    buffer = bytearray(256)
+    size, _ = get_object([data[:100], data[100:], response()], buffer)
+    assert size == 200
+    assert buffer[:200] == payload
+
+def test_zero_length_packet_is_skipped():
+    payload = b'x' * 500
+    data = pack_container(CONTAINER_DATA, OC_GET_OBJECT, 1, (), payload)    # 512 bytes, one full packet
+    buffer = bytearray(500)
+    size, session = get_object([data, b'', response()], buffer)
+    assert size == 500 and buffer == payload
+    assert not session.transport.transfers
+
+def test_only_empty_transfers_is_an_error():
+    session = PTPSession(ScriptedTransport([b''] * 10))
+    with pytest.raises(IOError):
+        session.get_object_into(7, bytearray(10))
+
+def test_object_larger_than_buffer():
+    payload = b'y' * 300
+    data = pack_container(CONTAINER_DATA, OC_GET_OBJECT, 1, (), payload)
+    buffer = bytearray(100)
+    session = PTPSession(ScriptedTransport([data[:64], data[64:], response()]))
+    with pytest.raises(ValueError, match='300 bytes'):
+        session.get_object_into(7, buffer)
+    assert buffer == bytearray(100)                 # Untouched
+    assert not session.transport.transfers          # Pipe drained for the next transaction
@@ -0,0 +1,50 @@
+import struct
+import numpy as np
+import pytest
+import raf
+
+def cfa_tiff(endian: str, bits: int, data: bytes) -> bytes:
+    """A CFA block as cameras write it: a TIFF whose IFD points to the Fuji raw IFD"""
+    entries = [(raf.TAG_BITS_PER_SAMPLE, 3, bits), (raf.TAG_STRIP_OFFSET, 4, 64),
+               (raf.TAG_STRIP_BYTES, 4, len(data))]
+    def entry(tag, ftype, value):
+        if ftype == 3:                                  # SHORT, left-justified in the field
+            return struct.pack(endian + 'HHIHH', tag, ftype, 1, value, 0)
+        return struct.pack(endian + 'HHII', tag, ftype, 1, value)
+    tiff = (b'MM' if endian == '>' else b'II') + struct.pack(endian + 'HI', 42, 8)
+    tiff += struct.pack(endian + 'H', 1) + entry(raf.TAG_FUJI_IFD, 4, 26) + struct.pack(endian + 'I', 0)
+    tiff += struct.pack(endian + 'H', len(entries)) + b''.join(entry(*e) for e in entries)
+    return tiff.ljust(64, b'\0') + data
+
+def make(width: int, height: int, cfa: bytes) -> bytes:
+    """A RAF around the given CFA block"""
+    header = raf.make('X-T5', width, height, b'')
+    fields = list(raf._raf_header.unpack_from(header))
+    fields[-1] = len(cfa)                                       # CFA length
+    return raf._raf_header.pack(*fields) + header[raf._raf_header.size:] + cfa
+
+def test_simulator_raf_round_trip():
+    pixels = np.arange(6 * 4, dtype='<u2').reshape(4, 6)       # Rows of 6
+    data = raf.make('TINY', 6, 4, pixels.tobytes())
+    info = raf.parse(data)
+    assert (info.width, info.height, info.compressed) == (6, 4, False)
+    assert np.array_equal(raf.decode(data), pixels.T)
+
+@pytest.mark.parametrize('endian', ['>', '<'])
+def test_16_bit_samples_at_the_strip_offset(endian):
+    pixels = np.arange(8 * 3, dtype='<u2').reshape(3, 8) * 100
+    data = make(8, 3, cfa_tiff(endian, 14, pixels.tobytes() + b'\xff' * 32))   # Trailing padding
+    info = raf.parse(data)
+    assert (info.bits, info.compressed) == (14, False)
+    assert np.array_equal(raf.decode(data), pixels.T)
+
+def test_packed_14_bit_goes_to_libraw(monkeypatch):
+    npix = 8 * 4
+    packed = bytes(npix * 14 // 8)
+    data = make(8, 4, cfa_tiff('>', 14, packed) + bytes(npix))   # CFA block is still >= 2 bytes/pixel
+    info = raf.parse(data)
+    assert info.compressed
+    calls = []
+    monkeypatch.setattr(raf, '_decode_libraw', lambda buf, out: calls.append(len(buf)))
+    raf.decode(data)
+    assert calls == [len(data)]
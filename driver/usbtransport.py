@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# usbtransport.py - USB bulk transport for PTP (pyusb)
+# -----------------------------------------------------------------------------
+#
+# ASCOM Camera driver for Fujifilm Mirrorless Camera
+#
+# Description:	Implements ASCOM driver for Fujifilm Mirrorless camera.
+#				Communicates using USB connection.
+#
+# Implements:	ASCOM Standard iCamera V4 interface
+# Author:		(2025) Tony Veinberg <tony.veinberg@gmail.com>
+#
+# Python Compatibility: Requires Python 3.7 or later
+# GitHub: https://github.com/tonyveinberg/alpaca-fujifilm-cameras
+#
+# ---------------------------------------------------------------------------------
+# MIT License
+#
+# Copyright (c) 2024
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+# ----------------------------------------------------------------------------------
+
+import queue
+import threading
+from logging import Logger
+from config import Config
+
+FUJIFILM_VENDOR_ID = 0x04CB
+USB_CLASS_STILL_IMAGE = 6
+
+# (bus, address) of the cameras open in this process
+_claimed = set()
+_claimed_lock = threading.Lock()
+
+class USBTransport:
+    """PTP over USB bulk pipes to a Fujifilm camera
+
+    Uses the optional ``pyusb`` package (and libusb underneath), imported
+    only when a camera is actually opened. Selected with
+    ``transport = 'usb'`` in the ``[device]`` section of ``config.toml``.
+    With several cameras attached, ``serial`` picks one by its USB serial
+    number, else the first one not already open is used.
+    """
+    def __init__(self, logger: Logger, serial: str = ''):
+        self.logger = logger
+        self.serial = serial
+        self._dev = None
+        self._intf = None
+        self._ep_in = None
+        self._ep_out = None
+        self._ep_int = None
+        self._staging = []                  # Bulk in read-ahead buffers, usb_queue_depth of them
+
+    def open(self):
+        try:
+            import usb.core
+            import usb.util
+        except ImportError:
+            raise RuntimeError('USB camera transport needs the pyusb package (pip install pyusb)')
+        with _claimed_lock:
+            dev = self._find(usb)
+            _claimed.add((dev.bus, dev.address))
+        try:
+            self._claim(usb, dev)
+        except Exception:
+            with _claimed_lock:
+                _claimed.discard((dev.bus, dev.address))
+            raise
+
+    def _find(self, usb):
+        """The camera to open, by serial number or else the first free one"""
+        found = False
+        for dev in usb.core.find(find_all=True, idVendor=FUJIFILM_VENDOR_ID):
+            found = True
+            if (dev.bus, dev.address) in _claimed:
+                continue
+            if not self.serial:
+                return dev
+            try:
+                if usb.util.get_string(dev, dev.iSerialNumber) == self.serial:
+                    return dev
+            except (ValueError, usb.core.USBError):
+                pass                                # No access to its strings, not ours
+        if not found:
+            raise RuntimeError('No Fujifilm camera found on USB. Is it on and in USB tether mode?')
+        if self.serial:
+            raise RuntimeError(f'No Fujifilm camera with serial number {self.serial} found on USB')
+        raise RuntimeError('Every Fujifilm camera on USB is already open')
+
+    def _claim(self, usb, dev):
+        cfg = dev.get_active_configuration()
+        intf = usb.util.find_descriptor(cfg, bInterfaceClass=USB_CLASS_STILL_IMAGE)
+        if intf is None:
+            raise RuntimeError('Fujifilm camera has no PTP (still image) interface')
+        try:
+            if dev.is_kernel_driver_active(intf.bInterfaceNumber):
+                dev.detach_kernel_driver(intf.bInterfaceNumber)
+        except (NotImplementedError, usb.core.USBError):
+            pass                                    # Not on Windows/macOS
+        usb.util.claim_interface(dev, intf)
+
+        def ep(direction, xfer):
+            return usb.util.find_descriptor(intf, custom_match=lambda e:
+                        usb.util.endpoint_direction(e.bEndpointAddress) == direction and
+                        usb.util.endpoint_type(e.bmAttributes) == xfer)
+        self._ep_in = ep(usb.util.ENDPOINT_IN, usb.util.ENDPOINT_TYPE_BULK)
+        self._ep_out = ep(usb.util.ENDPOINT_OUT, usb.util.ENDPOINT_TYPE_BULK)
+        self._ep_int = ep(usb.util.ENDPOINT_IN, usb.util.ENDPOINT_TYPE_INTR)
+        # Whole packets per transfer, the camera ends a container with a short one
+        packet = self._ep_in.wMaxPacketSize
+        transfer = max(packet, Config.usb_transfer_size // packet * packet)
+        self._staging = [usb.util.create_buffer(transfer) for _ in range(max(1, Config.usb_queue_depth))]
+        self._dev = dev
+        self._intf = intf
+        self.logger.info(f'USB camera {dev.idVendor:04x}:{dev.idProduct:04x} '
+                         f'on bus {dev.bus} address {dev.address} opened')
+
+    def close(self):
+        if self._dev is None:
+            return
+        import usb.util
+        try:
+            usb.util.release_interface(self._dev, self._intf)
+        finally:
+            usb.util.dispose_resources(self._dev)
+            with _claimed_lock:
+                _claimed.discard((self._dev.bus, self._dev.address))
+            self._dev = None
+
+    def write(self, data: bytes):
+        self._ep_out.write(data, Config.usb_timeout_ms)
+
+    def read(self, size: int) -> bytes:
+        """One bulk transfer of up to size bytes"""
+        return self._ep_in.read(size, Config.usb_timeout_ms).tobytes()
+
+    def readinto(self, buffer) -> int:
+        """Bulk transfers straight into buffer, until it is full or the container ends
+
+        Each transfer is ``usb_transfer_size`` bytes. pyusb only reads into
+        an ``array``, so a transfer lands in a preallocated staging array and
+        is copied once into buffer, small chunks are never joined. With
+        ``usb_queue_depth`` > 1 this is read-ahead buffering: a reader thread
+        fills up to that many staging arrays ahead of the copy, so the next
+        transfer starts while the last one is copied. pyusb reads are
+        synchronous, so there is still only one transfer in flight.
+        Returns the bytes read.
+        """
+        view = memoryview(buffer).cast('B')
+        if len(self._staging) > 1 and len(view) > len(self._staging[0]):
+            return self._readinto_queued(view)
+        got = 0
+        while got < len(view):
+            want = len(view) - got
+            staging, n = self._transfer(self._staging[0], want)
+            view[got:got + n] = memoryview(staging)[:n]
+            got += n
+            if n < min(want, len(staging)):
+                break                               # Short transfer, end of the container
+        return got
+
+    def _readinto_queued(self, view: memoryview) -> int:
+        free = queue.Queue()
+        filled = queue.Queue()
+        for staging in self._staging:
+            free.put(staging)
+
+        def reader():
+            try:
+                left = len(view)
+                while left > 0:
+                    staging = free.get()
+                    if staging is None:
+                        return                      # Copier gave up
+                    staging, n = self._transfer(staging, left)
+                    filled.put((staging, n))
+                    if n < min(left, len(staging)):
+                        break                       # Short transfer, end of the container
+                    left -= n
+                filled.put((None, 0))
+            except Exception as ex:
+                filled.put((ex, 0))
+
+        thread = threading.Thread(target=reader, name='USBBulkIn', daemon=True)
+        thread.start()
+        got = 0
+        try:
+            while True:
+                staging, n = filled.get()
+                if staging is None:
+                    return got
+                if isinstance(staging, Exception):
+                    raise staging
+                view[got:got + n] = memoryview(staging)[:n]
+                got += n
+                free.put(staging)
+        finally:
+            free.put(None)
+            thread.join()
+
+    def _transfer(self, staging, want: int) -> tuple:
+        """One bulk transfer of up to want bytes, return (array, bytes read)"""
+        if want >= len(staging):
+            return staging, self._ep_in.read(staging, Config.usb_timeout_ms)
+        tail = self._ep_in.read(want, Config.usb_timeout_ms)   # Never past the container
+        return tail, len(tail)
+
+    def read_event(self, timeout: float):
+        """Read an event container from the interrupt pipe, None on timeout"""
+        import usb.core
+        try:
+            return self._ep_int.read(self._ep_int.wMaxPacketSize, max(1, int(timeout * 1000))).tobytes()
+        except usb.core.USBTimeoutError:
+            return None